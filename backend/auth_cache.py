@@ -0,0 +1,148 @@
+"""Caches that keep per-request authentication cheap.
+
+``TokenCache`` remembers tokens whose signature was already verified, keyed
+by a digest of the token, until the token's own expiry. ``UserRepository``
+reads users from the ``users`` collection and keeps them in memory for a
+short TTL, with explicit invalidation when a user is disabled.
+
+Invalidation only reaches the process that disabled the user; every other
+worker re-reads the user from MongoDB once its cached copy is ``ttl``
+seconds old, so a disabled user is rejected everywhere within that time.
+Cached tokens do not outlive this: each request still loads its user.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from pymongo import ASCENDING, IndexModel
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens: digest -> (username, expiry epoch)."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[str]:
+        digest = token_digest(token)
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        username, expires_at = entry
+        if time.time() >= expires_at:
+            self._discard(digest)
+            return None
+        self._entries.move_to_end(digest)
+        return username
+
+    def put(self, token: str, username: str, expires_at: float) -> None:
+        digest = token_digest(token)
+        self._entries[digest] = (username, expires_at)
+        self._entries.move_to_end(digest)
+        self._by_user.setdefault(username, set()).add(digest)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+
+    def invalidate_user(self, username: str) -> None:
+        for digest in list(self._by_user.get(username, ())):
+            self._discard(digest)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_user.clear()
+
+    def _discard(self, digest: str) -> None:
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        digests = self._by_user.get(entry[0])
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[entry[0]]
+
+
+class UserRepository:
+    """Users stored in MongoDB, served from memory for ``ttl`` seconds (LRU of ``max_entries``)."""
+
+    def __init__(self, collection, model: Callable[..., Any], *, ttl: float = 60.0, max_entries: int = 10000,
+                 on_invalidate: Optional[Callable[[str], None]] = None):
+        self.collection = collection
+        self.model = model
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.on_invalidate = on_invalidate
+        self._cache: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0}
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_indexes([IndexModel([("username", ASCENDING)], name="username_unique", unique=True)])
+
+    async def seed(self, users: Iterable[Dict[str, Any]]) -> None:
+        """Insert users that do not exist yet; existing documents only get the fields they lack."""
+        for user in users:
+            stored = await self.collection.find_one({"username": user["username"]}, {"_id": 0})
+            if stored is None:
+                await self.collection.update_one(
+                    {"username": user["username"]}, {"$setOnInsert": user}, upsert=True
+                )
+                continue
+            # e.g. a flag added to the seed after the user was first stored
+            missing = {key: value for key, value in user.items() if key not in stored}
+            if missing:
+                await self.collection.update_one({"username": user["username"]}, {"$set": missing})
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def cached(self, username: str) -> Optional[Any]:
+        entry = self._cache.get(username)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[1]:
+            del self._cache[username]
+            return None
+        self._cache.move_to_end(username)
+        return entry[0]
+
+    def remember(self, user: Any) -> None:
+        self._cache[user.username] = (user, time.monotonic() + self.ttl)
+        self._cache.move_to_end(user.username)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def get(self, username: str) -> Optional[Any]:
+        user = self.cached(username)
+        if user is not None:
+            self.counters["hits"] += 1
+            return user
+        self.counters["misses"] += 1
+        document = await self.collection.find_one({"username": username}, {"_id": 0})
+        if document is None:
+            self._cache.pop(username, None)
+            return None
+        user = self.model(**document)
+        self.remember(user)
+        return user
+
+    def invalidate(self, username: str) -> None:
+        self._cache.pop(username, None)
+        if self.on_invalidate is not None:
+            self.on_invalidate(username)
+
+    async def set_disabled(self, username: str, disabled: bool = True) -> bool:
+        """Enable or disable a user; cached user and tokens are dropped at once."""
+        result = await self.collection.update_one({"username": username}, {"$set": {"disabled": disabled}})
+        self.invalidate(username)
+        return result.matched_count > 0
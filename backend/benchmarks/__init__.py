@@ -0,0 +1,106 @@
+"""Benchmarks for the backend; run from the backend directory, e.g.
+
+    python -m benchmarks.bench_auth
+
+``bench_search`` and ``bench_load`` save their results as baselines under
+``benchmarks/baselines`` (``--save-baseline``) and flag regressions against
+them (``--compare``).
+"""
+import json
+import logging
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+# Differences below this many milliseconds are noise, whatever the ratio
+NOISE_FLOOR_MS = 0.5
+# p99 of a few hundred samples is a handful of outliers, so it is reported but not compared
+UNCOMPARED = {"p99_ms"}
+
+
+def load_server(mock_db: bool = False):
+    """Import the FastAPI app module; Motor connects lazily so no database is needed.
+
+    With ``mock_db`` the app talks to an in-memory mongomock database instead
+    (``mongomock-motor``, pinned in requirements.txt for the tests).
+    """
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "benchmarks")
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    if mock_db:
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+    import server
+    # Per-request INFO logs would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    return server
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    """p50 / p95 / p99 / mean of a list of latencies in milliseconds."""
+    ordered = sorted(latencies_ms)
+    if not ordered:
+        return {}
+
+    def percentile(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    return {
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "count": len(ordered),
+    }
+
+
+def save_baseline(name: str, results: Dict[str, Any]) -> Path:
+    BASELINE_DIR.mkdir(exist_ok=True)
+    path = BASELINE_DIR / f"{name}.json"
+    document = {
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    path.write_text(json.dumps(document, indent=2, sort_keys=True) + "\n")
+    return path
+
+
+def compare_baseline(name: str, results: Dict[str, Any], tolerance: float = 0.25) -> bool:
+    """Print every timing more than ``tolerance`` slower than the saved baseline; False on regressions.
+
+    Keys ending in ``_ms`` or ``_s`` are lower-is-better timings, keys ending in
+    ``_per_s`` are higher-is-better throughputs; p99 is not compared.
+    """
+    path = BASELINE_DIR / f"{name}.json"
+    if not path.exists():
+        print(f"no baseline at {path}; run with --save-baseline first")
+        return True
+    baseline = json.loads(path.read_text())["results"]
+    regressions = []
+    for group, values in results.items():
+        for key, value in values.items():
+            before = baseline.get(group, {}).get(key)
+            if key in UNCOMPARED or not isinstance(before, (int, float)) or not isinstance(value, (int, float)):
+                continue
+            if key.endswith("_per_s"):
+                regressed = value < before * (1 - tolerance)
+            elif key.endswith("_ms") or key.endswith("_s"):
+                floor = NOISE_FLOOR_MS if key.endswith("_ms") else NOISE_FLOOR_MS / 1000
+                regressed = value > before * (1 + tolerance) and value - before > floor
+            else:
+                continue
+            if regressed:
+                regressions.append(f"{group}.{key}: {before} -> {value}")
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    print(f"{len(regressions)} regression(s) against {path.name} (tolerance {tolerance:.0%})")
+    return not regressions
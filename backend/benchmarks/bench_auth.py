@@ -0,0 +1,57 @@
+"""Per-request authentication overhead, before and after the auth caches.
+
+"Before" replays the original path: ``jwt.decode`` on every request and a
+fresh ``UserInDB`` built from ``fake_users_db``. "After" is the cached path
+used by ``get_current_user`` once a token and its user have been seen.
+
+    cd backend && python -m benchmarks.bench_auth
+"""
+import asyncio
+import time
+from datetime import timedelta
+
+from benchmarks import load_server
+
+
+def measure(label, func, iterations):
+    func()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - started
+    per_call = elapsed / iterations * 1e6
+    print(f"{label:<40} {per_call:8.2f} us/request")
+    return per_call
+
+
+def main(iterations: int = 20000):
+    server = load_server()
+    token = server.create_access_token({"sub": "admin"}, expires_delta=timedelta(minutes=30))
+    user_dict = server.fake_users_db["admin"]
+
+    def before():
+        payload = server.jwt.decode(token, server.SECRET_KEY, algorithms=[server.ALGORITHM])
+        return server.UserInDB(**server.fake_users_db[payload["sub"]])
+
+    # Prime both caches the way a first authenticated request would
+    server.user_repository.remember(server.UserInDB(**user_dict))
+    loop = asyncio.new_event_loop()
+
+    def after():
+        return loop.run_until_complete(server.get_current_user(token))
+
+    loop.run_until_complete(server.get_current_user(token))
+
+    def after_without_loop():
+        username = server.token_cache.get(token)
+        return server.user_repository.cached(username)
+
+    base = measure("jwt.decode + UserInDB (before)", before, iterations)
+    cached = measure("get_current_user, cached (after)", after, iterations)
+    measure("  of which cache lookups", after_without_loop, iterations)
+    print(f"speed-up: {base / cached:.1f}x (event-loop dispatch included in 'after')")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Bytes per entity: a list of ``Company`` models vs the columnar catalog store.
+
+Synthetic companies look like the mock data (address with coordinates,
+phone, two registration numbers, ranking info). Memory is measured with
+``tracemalloc`` around building each representation.
+
+    cd backend && python -m benchmarks.bench_catalog_memory [companies]
+"""
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks import load_server
+from columnar import CompanyColumns
+
+COUNTRIES = [("United States", "North America", "CA"), ("France", "Europe", "IDF"),
+             ("Germany", "Europe", "BY"), ("Japan", "Asia", "13"), ("Brazil", "South America", "SP")]
+CITIES = ["Springfield", "Riverside", "Franklin", "Greenville", "Bristol", "Clinton", "Fairview", "Salem"]
+
+
+def make_companies(server, count: int):
+    rng = random.Random(7)
+    companies = []
+    for index in range(count):
+        country, continent, state = rng.choice(COUNTRIES)
+        companies.append(server.Company(
+            duns=f"{100000000 + index}",
+            company_name=f"Company {index} {rng.choice(['Holdings', 'Industries', 'Systems'])} Inc.",
+            legal_name=f"Company {index} Incorporated",
+            operating_status="Active",
+            address=server.Address(
+                street=f"{rng.randint(1, 9999)} Main Street",
+                city=rng.choice(CITIES), state=state, postal_code=f"{rng.randint(10000, 99999)}",
+                country=country, continent=continent,
+                latitude=rng.uniform(-60, 70), longitude=rng.uniform(-170, 170),
+            ),
+            phone=f"+1 {rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}",
+            website=f"www.company{index}.com",
+            industry="Technology",
+            employee_count=rng.randint(1, 100000),
+            year_started=rng.randint(1900, 2024),
+            legal_form="Corporation",
+            registration_numbers=[
+                server.RegistrationNumber(type="Federal Taxpayer Identification Number", number=f"{index:09d}"),
+                server.RegistrationNumber(type="Registration Number", number=f"C{index:07d}"),
+            ],
+            ranking_info=server.RankingInfo(confidence_code=rng.randint(1, 10), match_quality="Good"),
+            data_source="Mock Data",
+        ))
+    return companies
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def main(count: int = 50000):
+    server = load_server()
+    companies, models_bytes, models_seconds = measure(lambda: make_companies(server, count))
+    columns, columns_bytes, columns_seconds = measure(lambda: CompanyColumns(companies, server.Company))
+
+    print(f"{count} companies")
+    print(f"Company models     {models_bytes / count:8.0f} bytes/entity  (built in {models_seconds:.1f} s)")
+    print(f"columnar store     {columns_bytes / count:8.0f} bytes/entity  (built in {columns_seconds:.1f} s, "
+          f"column payload {columns.nbytes / count:.0f} bytes/entity)")
+    print(f"reduction          {models_bytes / columns_bytes:8.1f}x")
+
+    rows = random.Random(1).sample(range(count), 1000)
+    started = time.perf_counter()
+    for row in rows:
+        columns.company(row)
+    print(f"materialize        {(time.perf_counter() - started) / len(rows) * 1e6:8.1f} us/company")
+    started = time.perf_counter()
+    for row in rows:
+        columns.view(row)
+    print(f"row view           {(time.perf_counter() - started) / len(rows) * 1e6:8.1f} us/row")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,63 @@
+"""Radius and bounding-box search latency on a large synthetic catalog.
+
+Points are clustered around a few hundred "cities" the way company
+addresses are. The grid results are checked against a brute-force
+haversine scan of all points.
+
+    cd backend && python -m benchmarks.bench_geo [points]
+"""
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from geo import GeoGrid, haversine_km
+
+
+def main(size: int = 2_000_000, queries: int = 200):
+    rng = np.random.default_rng(42)
+    cities = np.column_stack([rng.uniform(-55, 70, 500), rng.uniform(-170, 170, 500)])
+    picks = rng.integers(0, len(cities), size)
+    latitudes = np.clip(cities[picks, 0] + rng.normal(0, 0.3, size), -90, 90)
+    longitudes = np.clip(cities[picks, 1] + rng.normal(0, 0.3, size), -180, 180)
+
+    started = time.perf_counter()
+    grid = GeoGrid(zip(latitudes.tolist(), longitudes.tolist()))
+    print(f"built grid over {size} points in {time.perf_counter() - started:.1f} s")
+
+    centers = cities[rng.integers(0, len(cities), queries)]
+    for radius_km in (10, 50, 250):
+        latencies, found = [], []
+        for latitude, longitude in centers:
+            started = time.perf_counter()
+            rows, _ = grid.radius(latitude, longitude, radius_km)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found.append(len(rows))
+        latencies.sort()
+        print(
+            f"radius {radius_km:>4} km   p50={statistics.median(latencies):7.2f} ms  "
+            f"p99={latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms  median hits={int(statistics.median(found))}"
+        )
+
+    latencies = []
+    for latitude, longitude in centers:
+        bbox = [longitude - 0.5, latitude - 0.5, longitude + 0.5, latitude + 0.5]
+        started = time.perf_counter()
+        grid.bbox(bbox)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(f"bbox 1x1 deg     p50={statistics.median(latencies):7.2f} ms  p99={latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms")
+
+    # Correctness against a full scan for a few queries
+    for latitude, longitude in centers[:5]:
+        rows, _ = grid.radius(latitude, longitude, 50)
+        expected = np.flatnonzero(haversine_km(latitude, longitude, latitudes, longitudes) <= 50)
+        assert set(rows.tolist()) == set(expected.tolist())
+    started = time.perf_counter()
+    haversine_km(centers[0][0], centers[0][1], latitudes, longitudes)
+    print(f"full scan for comparison: {(time.perf_counter() - started) * 1000:.1f} ms per query")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
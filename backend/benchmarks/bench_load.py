@@ -0,0 +1,215 @@
+"""Async load driver for the API: throughput and p50/p95/p99 latency under concurrency.
+
+By default the app runs in-process behind ``httpx.ASGITransport`` with its
+startup and shutdown hooks and a synthetic catalog (see
+``benchmarks.synthetic``); client and server then share one event loop, so
+the numbers are the server's own CPU cost per request. The database is a
+local mongod with ``--mongo-url``, else in-memory mongomock
+(``mongomock_motor`` must be installed), whose unindexed writes make
+search persistence, and so searches, far slower than on MongoDB. With
+``--url`` the requests go to a running server instead (e.g. ``uvicorn
+server:app``), sampling DUNS and names from its own catalog.
+
+The request mix is weighted like the UI's: name and DUNS searches, geo
+searches, hierarchy views and the recently searched list.
+
+    cd backend && python -m benchmarks.bench_load [--size 10000] [--concurrency 32] [--requests 2000]
+    cd backend && python -m benchmarks.bench_load --mongo-url mongodb://localhost:27017
+    cd backend && python -m benchmarks.bench_load --url http://localhost:8001
+
+Baselines are kept per size and database in ``benchmarks/baselines/load-<size>-<database>.json``.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks import compare_baseline, latency_summary, load_server, save_baseline
+from benchmarks.synthetic import generate_companies
+
+# scenario -> relative weight
+SCENARIO_WEIGHTS = {
+    "search_name": 30,
+    "search_duns": 15,
+    "search_radius": 10,
+    "hierarchy": 20,
+    "subtree": 10,
+    "children": 5,
+    "cached_companies": 10,
+}
+
+
+class Targets:
+    """DUNS, names and coordinates the scenarios pick from."""
+
+    def __init__(self, duns: List[str], names: List[str], points: List[Tuple[float, float]], roots: List[str]):
+        self.duns = duns
+        self.names = names
+        self.points = points
+        self.roots = roots or duns
+
+    @classmethod
+    def from_companies(cls, companies: List[Any]) -> "Targets":
+        return cls(
+            [company.duns for company in companies],
+            [company.company_name for company in companies],
+            [(company.address.latitude, company.address.longitude) for company in companies
+             if company.address and company.address.latitude is not None],
+            [company.duns for company in companies if company.corporate_hierarchy.familyTreeMembers],
+        )
+
+    @classmethod
+    async def from_api(cls, client: httpx.AsyncClient) -> "Targets":
+        companies = []
+        for continent in ("North America", "Europe", "Asia", "South America", "Oceania", "Africa"):
+            response = await client.post("/api/unified-search?view=list", json={"continent": continent})
+            response.raise_for_status()
+            companies.extend(response.json()["results"])
+        if not companies:
+            raise SystemExit("the server's catalog is empty")
+        return cls(
+            [company["duns"] for company in companies],
+            [company["company_name"] for company in companies],
+            [(company["address"]["latitude"], company["address"]["longitude"]) for company in companies
+             if (company.get("address") or {}).get("latitude") is not None],
+            [],
+        )
+
+
+def build_request(scenario: str, targets: Targets, rng: random.Random) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    if scenario == "search_name":
+        return "POST", "/api/unified-search?view=list", {"company_name": rng.choice(targets.names)}
+    if scenario == "search_duns":
+        return "POST", "/api/unified-search?view=list", {"duns": rng.choice(targets.duns)}
+    if scenario == "search_radius":
+        latitude, longitude = rng.choice(targets.points) if targets.points else (37.33, -122.01)
+        return "POST", "/api/unified-search?view=list", {"latitude": latitude, "longitude": longitude, "radius_km": 5}
+    if scenario == "hierarchy":
+        return "GET", f"/api/company-hierarchy/{rng.choice(targets.duns)}", None
+    if scenario == "subtree":
+        return "GET", f"/api/company-hierarchy/{rng.choice(targets.roots)}/subtree?depth=2", None
+    if scenario == "children":
+        return "GET", f"/api/company-hierarchy/{rng.choice(targets.roots)}/children?limit=100", None
+    if scenario == "cached_companies":
+        return "GET", "/api/cached-companies?limit=50", None
+    raise ValueError(f"Unknown scenario {scenario}")
+
+
+async def drive(client: httpx.AsyncClient, targets: Targets, concurrency: int, requests: int,
+                seed: int) -> Dict[str, Dict[str, float]]:
+    rng = random.Random(seed)
+    scenarios = rng.choices(list(SCENARIO_WEIGHTS), weights=list(SCENARIO_WEIGHTS.values()), k=requests)
+    plan = [(scenario, *build_request(scenario, targets, rng)) for scenario in scenarios]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    position = 0
+
+    async def worker():
+        nonlocal position
+        while position < len(plan):
+            scenario, method, path, body = plan[position]
+            position += 1
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            elapsed = (time.perf_counter() - started) * 1000
+            latencies[scenario].append(elapsed)
+            latencies["all"].append(elapsed)
+            # A hierarchy that is not in the catalog is a legitimate 404
+            if response.status_code >= 500 or response.status_code in (401, 403, 422):
+                errors[scenario] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = {"all": {**latency_summary(latencies.pop("all")), "requests_per_s": round(requests / elapsed, 1),
+                       "errors": sum(errors.values())}}
+    for scenario in SCENARIO_WEIGHTS:
+        if latencies[scenario]:
+            results[scenario] = {**latency_summary(latencies[scenario]), "errors": errors[scenario]}
+    return results
+
+
+@asynccontextmanager
+async def in_process_client(size: int, seed: int, mongo_url: Optional[str]):
+    """Client for the app with its lifespan running and the synthetic catalog loaded."""
+    if mongo_url:
+        os.environ["MONGO_URL"] = mongo_url
+    server = load_server(mock_db=not mongo_url)
+    companies = generate_companies(server, size, seed)
+    async with server.app.router.lifespan_context(server.app):
+        server.company_catalog.reload(companies)
+        server.company_cache.clear()
+        server.response_cache.clear()
+        await server.rebuild_hierarchy_graph()
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client, Targets.from_companies(companies)
+
+
+@asynccontextmanager
+async def remote_client(url: str):
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        yield client, None
+
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    clients = remote_client(args.url) if args.url else in_process_client(args.size, args.seed, args.mongo_url)
+    async with clients as (client, targets):
+        response = await client.post("/api/login", json={"username": args.username, "password": args.password})
+        response.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        if targets is None:
+            targets = await Targets.from_api(client)
+        # Warm up so the first requests don't pay for imports and cold caches alone
+        await drive(client, targets, args.concurrency, min(200, args.requests), args.seed + 1)
+        return await drive(client, targets, args.concurrency, args.requests, args.seed)
+
+
+def report(results: Dict[str, Dict[str, float]]) -> None:
+    overall = results["all"]
+    print(f"{overall['count']} requests, {overall['requests_per_s']} req/s, {overall['errors']} errors")
+    print(f"{'scenario':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, values in results.items():
+        print(f"{name:<20}{values['count']:8}{values['p50_ms']:10.2f}{values['p95_ms']:10.2f}"
+              f"{values['p99_ms']:10.2f}{values['errors']:8}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--mongo-url", help="MongoDB for the in-process app (default: mongomock)")
+    parser.add_argument("--size", type=int, default=10_000, help="synthetic companies for the in-process app")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="D&B2025Secure!")
+    parser.add_argument("--save-baseline", action="store_true", help="record these results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="exit 1 when slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a regression")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    report(results)
+
+    if args.url:
+        name = "load-remote"
+    else:
+        name = f"load-{args.size}-{'mongod' if args.mongo_url else 'mongomock'}"
+    if args.save_baseline:
+        print(f"saved baseline {save_baseline(name, results)}")
+    if args.compare and not compare_baseline(name, results, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Latency of a cheap authenticated endpoint while a login storm is running.
+
+Requests go through the ASGI app in-process. The probe endpoint is the
+cached company hierarchy, so neither phase needs a database. The storm is
+run twice: with bcrypt on the worker pool (current code) and with bcrypt
+called inline on the event loop (the old behaviour), to show the stall.
+
+    cd backend && python -m benchmarks.bench_login_storm
+"""
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from benchmarks import load_server
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def probe(client, headers, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        # Measured from when the request should have been sent, so time spent
+        # waiting for a blocked event loop counts as latency
+        scheduled = time.perf_counter() + 0.005
+        await asyncio.sleep(0.005)
+        response = await client.get("/api/company-hierarchy/804735132", headers=headers)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+    return latencies
+
+
+async def storm(client, duration, concurrency):
+    async def one_user():
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            await client.post("/api/login", json={"username": "admin", "password": "D&B2025Secure!"})
+
+    await asyncio.gather(*(one_user() for _ in range(concurrency)))
+
+
+def report(label, latencies):
+    print(
+        f"{label:<28} n={len(latencies):5d}  p50={statistics.median(latencies):7.2f} ms  "
+        f"p99={percentile(latencies, 0.99):8.2f} ms  max={max(latencies):8.2f} ms"
+    )
+
+
+async def run(server, duration=3.0, concurrency=8):
+    server.company_catalog.reload(server.load_catalog_companies())
+    server.company_cache.put(server.company_catalog.get("804735132"))
+    server.user_repository.ttl = 3600
+    server.user_repository.remember(server.UserInDB(**server.fake_users_db["admin"]))
+    token = server.create_access_token({"sub": "admin"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        report("idle", await probe(client, headers, duration))
+
+        latencies, _ = await asyncio.gather(probe(client, headers, duration), storm(client, duration, concurrency))
+        report("login storm, worker pool", latencies)
+
+        offloaded = server.verify_password_async
+
+        async def inline(plain_password, hashed_password):
+            return server.verify_password(plain_password, hashed_password)
+
+        server.verify_password_async = inline
+        try:
+            latencies, _ = await asyncio.gather(probe(client, headers, duration), storm(client, duration, concurrency))
+            report("login storm, inline bcrypt", latencies)
+        finally:
+            server.verify_password_async = offloaded
+
+
+def main():
+    asyncio.run(run(load_server()))
+
+
+if __name__ == "__main__":
+    main()
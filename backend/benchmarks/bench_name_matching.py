@@ -0,0 +1,67 @@
+"""Fuzzy name matching latency on a large synthetic catalog.
+
+Builds a ``NameMatcher`` over generated company names and times top-25
+queries: exact names, names with a different legal form, and typos.
+
+    cd backend && python -m benchmarks.bench_name_matching [names]
+"""
+import random
+import statistics
+import sys
+import time
+
+from name_matching import NameMatcher
+
+WORDS = (
+    "acme global north south east west united general national american european "
+    "pacific atlantic digital systems solutions technologies industries holdings "
+    "partners capital energy power foods pharma medical logistics transport retail "
+    "consulting software networks micro data cloud green blue red star sun river "
+    "mountain valley bay harbor metro urban alpha beta gamma delta omega nova "
+    "quantum fusion vector apex summit pioneer frontier heritage legacy crown royal"
+).split()
+SUFFIXES = ("Inc.", "Corporation", "LLC", "Ltd", "S.A.", "GmbH", "SARL", "Co.", "PLC", "")
+
+
+def company_name(rng: random.Random) -> str:
+    words = [rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 3))]
+    words.append(f"{rng.randint(1, 99999)}")
+    return " ".join(words + [rng.choice(SUFFIXES)]).strip()
+
+
+def with_typo(name: str, rng: random.Random) -> str:
+    position = rng.randrange(1, max(2, len(name) - 1))
+    return name[:position] + name[position + 1:position + 2] + name[position] + name[position + 2:]
+
+
+def main(size: int = 1_000_000, queries: int = 200):
+    rng = random.Random(42)
+    names = [company_name(rng) for _ in range(size)]
+
+    started = time.perf_counter()
+    matcher = NameMatcher(names)
+    print(f"built index over {size} names in {time.perf_counter() - started:.1f} s")
+
+    samples = rng.sample(names, queries)
+    cases = {
+        "exact name": samples,
+        "other legal form": [name.rsplit(" ", 1)[0] + " Incorporated" for name in samples],
+        "typo": [with_typo(name, rng) for name in samples],
+    }
+    for label, batch in cases.items():
+        latencies = []
+        hits = 0
+        for query, expected in zip(batch, samples):
+            started = time.perf_counter()
+            matches = matcher.match(query, limit=25)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += any(names[row] == expected for row, _ in matches)
+        latencies.sort()
+        print(
+            f"{label:<18} p50={statistics.median(latencies):6.2f} ms  "
+            f"p99={latencies[int(len(latencies) * 0.99) - 1]:6.2f} ms  recall@25={hits / len(batch):.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
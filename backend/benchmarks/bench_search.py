@@ -0,0 +1,176 @@
+"""Microbenchmarks of each unified_search strategy, autocomplete, hierarchy building and serialization.
+
+Loads a synthetic catalog (see ``benchmarks.synthetic``) into the server's
+catalog and times, per strategy, planning plus materializing the matches
+the way ``unified_search`` does (without the MongoDB write), then
+``/api/suggest`` prefix completion, then the hierarchy graph build and queries, then encoding search and hierarchy
+responses. Reports p50/p95/p99 per case. DUNS searches read through the
+company cache, backed here by mongomock (``mongomock_motor`` must be installed).
+
+    cd backend && python -m benchmarks.bench_search [--size 10000] [--save-baseline | --compare]
+
+Baselines are kept per size in ``benchmarks/baselines/search-<size>.json``.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks import compare_baseline, latency_summary, load_server, save_baseline
+from benchmarks.bench_name_matching import with_typo
+from benchmarks.synthetic import generate_companies
+from hierarchy import HierarchyGraph
+from responses import encode_json
+
+# Strategies matching hundreds of companies (thousands at 1M) run a tenth of the queries
+BROAD_STRATEGIES = {"city_country", "continent_has_fax", "state_scan"}
+
+
+def timed_cases(cases: List[Any], run: Callable[[Any], Any]) -> Dict[str, float]:
+    run(cases[0])
+    latencies = []
+    for case in cases:
+        started = time.perf_counter()
+        run(case)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latency_summary(latencies)
+
+
+def search_cases(companies: List[Any], rng: random.Random, queries: int) -> Dict[str, List[Dict[str, Any]]]:
+    """Criteria per strategy, built from companies known to be in the catalog."""
+    samples = [rng.choice(companies) for _ in range(queries)]
+    return {
+        "duns": [{"duns": company.duns} for company in samples],
+        "local_identifier": [{"local_identifier": company.registration_numbers[0].number} for company in samples],
+        "name_exact": [{"company_name": company.company_name, "exact_match": True} for company in samples],
+        "name_fuzzy": [{"company_name": company.company_name} for company in samples],
+        "name_typo": [{"company_name": with_typo(company.company_name, rng)} for company in samples],
+        "postal_code": [{"postal_code": company.address.postal_code} for company in samples],
+        "phone_fax": [{"phone_fax": company.phone[-8:]} for company in samples],
+        "radius": [{"latitude": company.address.latitude, "longitude": company.address.longitude,
+                    "radius_km": 10} for company in samples],
+        "bbox": [{"bbox": [company.address.longitude - 0.1, company.address.latitude - 0.1,
+                           company.address.longitude + 0.1, company.address.latitude + 0.1]} for company in samples],
+        "city_country": [{"city": company.address.city, "country": company.address.country} for company in samples],
+        "continent_has_fax": [{"continent": company.address.continent, "has_fax": True} for company in samples],
+        # state has no index, so this is the full scan fallback
+        "state_scan": [{"state": company.address.state} for company in samples],
+    }
+
+
+def bench_strategies(server, companies: List[Any], rng: random.Random, queries: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    loop = asyncio.new_event_loop()
+    try:
+        for name, cases in search_cases(companies, rng, queries).items():
+            if name in BROAD_STRATEGIES:
+                cases = cases[:max(5, queries // 10)]
+            criteria = [server.CompanySearchCriteria(**case) for case in cases]
+            counts = []
+
+            def run(criterion):
+                plan = loop.run_until_complete(server.plan_search(criterion))
+                counts.append(len(list(server.iter_plan_results(criterion, plan))))
+
+            summary = timed_cases(criteria, run)
+            summary["mean_results"] = round(sum(counts) / len(counts), 1)
+            results[f"search.{name}"] = summary
+    finally:
+        loop.close()
+    return results
+
+
+def bench_suggest(server, companies: List[Any], rng: random.Random, queries: int) -> Dict[str, Dict[str, float]]:
+    """Prefixes as typed, one to twelve characters of a catalog name."""
+    prefixes = []
+    for company in (rng.choice(companies) for _ in range(queries)):
+        prefixes.append(company.company_name[:rng.randint(1, 12)])
+    return {"suggest": timed_cases(prefixes, lambda prefix: server.company_catalog.suggest(prefix, 10))}
+
+
+def bench_hierarchy(companies: List[Any], rng: random.Random, queries: int) -> Dict[str, Dict[str, float]]:
+    graph = HierarchyGraph()
+    started = time.perf_counter()
+    for company in companies:
+        graph.add_company(company)
+    results = {"hierarchy.build": {"total_s": round(time.perf_counter() - started, 3), "nodes": len(graph)}}
+
+    # Ultimates of the largest families are the worst case for tree views
+    ultimates = sorted((company for company in companies if company.corporate_hierarchy.familyTreeMembers),
+                       key=lambda company: len(company.corporate_hierarchy.familyTreeMembers), reverse=True)
+    roots = [ultimate.duns for ultimate in ultimates[:queries]] or [companies[0].duns]
+    leaves = [rng.choice(companies).duns for _ in range(queries)]
+    results["hierarchy.subtree"] = timed_cases(roots, lambda duns: graph.subtree(duns, max_depth=2, max_nodes=1000))
+    results["hierarchy.children"] = timed_cases(roots, lambda duns: graph.children(duns, limit=100))
+    results["hierarchy.ancestors"] = timed_cases(leaves, graph.ancestors)
+    return results
+
+
+def bench_serialization(server, companies: List[Any], rng: random.Random, queries: int) -> Dict[str, Dict[str, float]]:
+    pages = [rng.sample(companies, 200) for _ in range(max(1, queries // 10))]
+    largest = max(companies, key=lambda company: len(company.corporate_hierarchy.familyTreeMembers))
+
+    def list_view(page):
+        encode_json([company.model_dump(mode="json", by_alias=True, exclude=server.LIST_VIEW_EXCLUDE)
+                     for company in page])
+
+    return {
+        "encode.search_full_200": timed_cases(pages, lambda page: encode_json({"results": page, "count": len(page)})),
+        "encode.search_list_200": timed_cases(pages, list_view),
+        "encode.hierarchy_largest": timed_cases(
+            [largest] * len(pages), lambda company: encode_json(company.corporate_hierarchy.model_dump())
+        ),
+    }
+
+
+def report(results: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'case':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'results':>10}")
+    for name, values in results.items():
+        if "p50_ms" in values:
+            print(f"{name:<28}{values['p50_ms']:10.3f}{values['p95_ms']:10.3f}{values['p99_ms']:10.3f}"
+                  f"{values.get('mean_results', ''):>10}")
+        else:
+            print(f"{name:<28}" + "  ".join(f"{key}={value}" for key, value in values.items()))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10_000, help="synthetic companies (10000, 100000, 1000000)")
+    parser.add_argument("--queries", type=int, default=200, help="queries per strategy")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-baseline", action="store_true", help="record these results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="exit 1 when slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a regression")
+    args = parser.parse_args(argv)
+
+    # DUNS searches read through the company cache, which needs a database
+    server = load_server(mock_db=True)
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    companies = generate_companies(server, args.size, args.seed)
+    print(f"generated {len(companies)} companies in {time.perf_counter() - started:.1f} s")
+    started = time.perf_counter()
+    server.company_catalog.reload(companies)
+    print(f"built catalog in {time.perf_counter() - started:.1f} s")
+
+    results = {
+        "catalog": {"size": len(companies), "reload_s": round(time.perf_counter() - started, 3)},
+        **bench_strategies(server, companies, rng, args.queries),
+        **bench_suggest(server, companies, rng, args.queries),
+        **bench_hierarchy(companies, rng, args.queries),
+        **bench_serialization(server, companies, rng, args.queries),
+    }
+    report(results)
+
+    name = f"search-{args.size}"
+    if args.save_baseline:
+        print(f"saved baseline {save_baseline(name, results)}")
+    if args.compare and not compare_baseline(name, results, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Encode time and payload size of search and hierarchy responses.
+
+Compares FastAPI's default path (``jsonable_encoder`` then ``json.dumps``)
+with ``responses.encode_json`` (orjson when installed, else the standard
+library), the ``?view=list`` trimmed results and gzip compression, over the
+mock companies repeated to a realistic result count.
+
+    cd backend && python -m benchmarks.bench_serialization [results]
+"""
+import gzip
+import json
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+import responses
+from benchmarks import load_server
+
+
+def default_encode(payload) -> bytes:
+    """What FastAPI does for an endpoint returning ``payload``."""
+    return json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def stdlib_encode(payload) -> bytes:
+    available = responses.ORJSON_AVAILABLE
+    responses.ORJSON_AVAILABLE = False
+    try:
+        return responses.encode_json(payload)
+    finally:
+        responses.ORJSON_AVAILABLE = available
+
+
+def timed(encode, payload, repeat: int):
+    encode(payload)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        body = encode(payload)
+    return (time.perf_counter() - started) / repeat * 1000, body
+
+
+def main(count: int = 200, repeat: int = 50):
+    server = load_server()
+    mock = [server.create_mock_company_data(duns) for duns in server.MOCK_COMPANY_DUNS]
+    results = [mock[index % len(mock)].model_copy(update={"duns": f"{100000000 + index}"}) for index in range(count)]
+
+    def list_view(payload) -> bytes:
+        # Trimming is part of the cost, as in unified_search
+        listed = [company.model_dump(mode="json", by_alias=True, exclude=server.LIST_VIEW_EXCLUDE)
+                  for company in payload["results"]]
+        return responses.encode_json({"results": listed, "count": len(listed)})
+
+    payloads = {
+        f"search ({count} results)": {"results": results, "count": len(results)},
+        "search view=list": {"results": results, "count": len(results)},
+        "hierarchy": {"duns": mock[0].duns, "hierarchy": mock[0].corporate_hierarchy.model_dump(),
+                      "data_source": mock[0].data_source, "last_updated": mock[0].last_updated.isoformat()},
+    }
+
+    print(f"orjson available: {responses.ORJSON_AVAILABLE}")
+    print(f"{'payload':<26}{'encoder':<10}{'ms':>9}{'bytes':>10}{'gzip':>9}{'gzip ms':>9}")
+    for name, payload in payloads.items():
+        encoders = [("default", default_encode), ("stdlib", stdlib_encode), ("fast", responses.encode_json)]
+        if name.endswith("view=list"):
+            encoders = [("fast", list_view)]
+        for label, encode in encoders:
+            elapsed, body = timed(encode, payload, repeat)
+            started = time.perf_counter()
+            compressed = gzip.compress(body, compresslevel=6)
+            gzip_ms = (time.perf_counter() - started) * 1000
+            print(f"{name:<26}{label:<10}{elapsed:9.2f}{len(body):10}{len(compressed):9}{gzip_ms:9.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,183 @@
+"""Synthetic catalogs shaped like the mock companies, at benchmark scale.
+
+``generate_companies`` scales the four companies of
+``create_mock_company_data`` up to any size (10k, 100k, 1M): every
+synthetic company copies the industry, SIC/NAICS codes and legal form of
+one of them and gets its own name, address with coordinates, phone (and
+sometimes fax) and registration numbers. Companies come in corporate
+families whose sizes are heavily skewed (most are single sites, a few
+have thousands of members) with trees up to ``MAX_DEPTH`` levels deep.
+Each company carries a hierarchy snapshot like the mock data: global
+ultimate, parent, direct subsidiaries, and for ultimates the whole family
+tree in depth-first order, so ``HierarchyGraph`` builds the same trees
+from the catalog that it would from D&B.
+
+The output only depends on ``count`` and ``seed``.
+"""
+import random
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.bench_name_matching import company_name
+
+# Largest family and deepest tree generated; D&B's largest trees are bigger,
+# but the hierarchy endpoints page and depth-limit them anyway
+MAX_FAMILY = 2000
+MAX_DEPTH = 6
+# Direct subsidiaries listed on a company's own snapshot
+MAX_SUBSIDIARIES = 100
+FIRST_DUNS = 200000000
+
+# city, state, country, continent, latitude, longitude, phone prefix
+CITIES: List[Tuple[str, str, str, str, float, float, str]] = [
+    ("Cupertino", "CA", "United States", "North America", 37.3230, -122.0322, "+1 408"),
+    ("Redmond", "WA", "United States", "North America", 47.6740, -122.1215, "+1 425"),
+    ("Mountain View", "CA", "United States", "North America", 37.3861, -122.0839, "+1 650"),
+    ("Austin", "TX", "United States", "North America", 30.2672, -97.7431, "+1 512"),
+    ("New York", "NY", "United States", "North America", 40.7128, -74.0060, "+1 212"),
+    ("Chicago", "IL", "United States", "North America", 41.8781, -87.6298, "+1 312"),
+    ("Atlanta", "GA", "United States", "North America", 33.7490, -84.3880, "+1 404"),
+    ("Toronto", "ON", "Canada", "North America", 43.6532, -79.3832, "+1 416"),
+    ("Mexico City", "CMX", "Mexico", "North America", 19.4326, -99.1332, "+52 55"),
+    ("London", "ENG", "United Kingdom", "Europe", 51.5074, -0.1278, "+44 20"),
+    ("Paris", "IDF", "France", "Europe", 48.8566, 2.3522, "+33 1"),
+    ("Lyon", "ARA", "France", "Europe", 45.7640, 4.8357, "+33 4"),
+    ("Munich", "BY", "Germany", "Europe", 48.1351, 11.5820, "+49 89"),
+    ("Berlin", "BE", "Germany", "Europe", 52.5200, 13.4050, "+49 30"),
+    ("Madrid", "MD", "Spain", "Europe", 40.4168, -3.7038, "+34 91"),
+    ("Milan", "LOM", "Italy", "Europe", 45.4642, 9.1900, "+39 02"),
+    ("Amsterdam", "NH", "Netherlands", "Europe", 52.3676, 4.9041, "+31 20"),
+    ("Tokyo", "13", "Japan", "Asia", 35.6762, 139.6503, "+81 3"),
+    ("Osaka", "27", "Japan", "Asia", 34.6937, 135.5023, "+81 6"),
+    ("Shanghai", "SH", "China", "Asia", 31.2304, 121.4737, "+86 21"),
+    ("Singapore", "SG", "Singapore", "Asia", 1.3521, 103.8198, "+65 6"),
+    ("Bangalore", "KA", "India", "Asia", 12.9716, 77.5946, "+91 80"),
+    ("Sydney", "NSW", "Australia", "Oceania", -33.8688, 151.2093, "+61 2"),
+    ("São Paulo", "SP", "Brazil", "South America", -23.5505, -46.6333, "+55 11"),
+    ("Buenos Aires", "C", "Argentina", "South America", -34.6037, -58.3816, "+54 11"),
+    ("Johannesburg", "GP", "South Africa", "Africa", -26.2041, 28.0473, "+27 11"),
+]
+STREETS = ("Main Street", "Park Avenue", "Market Street", "Industrial Way", "Commerce Drive",
+           "Harbor Road", "Station Road", "Rue de la Paix", "Hauptstrasse", "Via Roma")
+DIVISIONS = ("Services", "Holdings", "Manufacturing", "Retail", "Distribution", "Research", "Finance", "Sales")
+TEMPLATE_FIELDS = ("business_type", "primary_sic_code", "primary_sic_description", "naics_code",
+                   "naics_description", "industry", "legal_form")
+
+
+def family_sizes(count: int, rng: random.Random) -> List[int]:
+    """Pareto-distributed family sizes adding up to ``count``."""
+    sizes = []
+    remaining = count
+    while remaining > 0:
+        size = min(remaining, MAX_FAMILY, int(rng.paretovariate(1.1)))
+        sizes.append(size)
+        remaining -= size
+    return sizes
+
+
+def family_tree(size: int, rng: random.Random) -> List[int]:
+    """Parent position of each member (-1 for the ultimate), parents before children."""
+    parents = [-1]
+    depths = [1]
+    for position in range(1, size):
+        # Recent members are preferred as parents, which deepens the tree
+        parent = position - 1 - int(rng.random() ** 3 * position)
+        while depths[parent] >= MAX_DEPTH:
+            parent = parents[parent]
+        parents.append(parent)
+        depths.append(depths[parent] + 1)
+    return parents
+
+
+def generate_companies(server, count: int, seed: int = 42) -> List[Any]:
+    """``count`` synthetic ``server.Company`` models in corporate families."""
+    rng = random.Random(seed)
+    templates = [server.create_mock_company_data(duns) for duns in server.MOCK_COMPANY_DUNS]
+    last_updated = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    companies = []
+    next_duns = FIRST_DUNS
+
+    for size in family_sizes(count, rng):
+        parents = family_tree(size, rng)
+        template = rng.choice(templates)
+        base = company_name(rng).rsplit(" ", 1)[0]
+        home = rng.choice(CITIES)
+        records: List[Dict[str, Any]] = []
+        members = []
+        children: List[List[int]] = [[] for _ in range(size)]
+        depths: List[int] = []
+
+        for position, parent in enumerate(parents):
+            duns = f"{next_duns:09d}"
+            next_duns += 1
+            depths.append(1 if parent < 0 else depths[parent] + 1)
+            if parent >= 0:
+                children[parent].append(position)
+            # Most subsidiaries stay in the home country
+            city = home if parent < 0 or rng.random() < 0.7 else rng.choice(CITIES)
+            name_city, state, country, continent, latitude, longitude, phone_prefix = city
+            if parent < 0:
+                name = f"{base} Inc."
+            else:
+                name = f"{base} {rng.choice(DIVISIONS)} {country if city is not home else name_city} {position}"
+            address = server.Address(
+                street=f"{rng.randint(1, 9999)} {rng.choice(STREETS)}",
+                city=name_city, state=state, country=country, continent=continent,
+                postal_code=f"{rng.randint(10000, 99999)}",
+                latitude=round(latitude + rng.uniform(-0.3, 0.3), 5),
+                longitude=round(longitude + rng.uniform(-0.3, 0.3), 5),
+            )
+            phone = f"{phone_prefix} {rng.randint(200, 999)}-{rng.randint(1000, 9999)}"
+            records.append({
+                "duns": duns,
+                "company_name": name,
+                "legal_name": name,
+                "operating_status": "Active" if rng.random() < 0.95 else "Inactive",
+                "address": address,
+                "phone": phone,
+                "fax": f"{phone_prefix} {rng.randint(200, 999)}-{rng.randint(1000, 9999)}" if rng.random() < 0.3 else None,
+                "website": f"https://www.{base.lower().replace(' ', '')}.com",
+                "employee_count": max(1, int(rng.lognormvariate(4, 1.8))),
+                "annual_revenue": f"${rng.uniform(0.1, 900):.1f}M USD",
+                "year_started": rng.randint(1900, 2024),
+                "registration_numbers": [
+                    server.RegistrationNumber(type="Federal Tax ID", number=f"{rng.randint(10, 99)}-{rng.randint(1000000, 9999999)}",
+                                              is_preferred=True),
+                    server.RegistrationNumber(type="State Registration", number=f"C{rng.randint(1000000, 9999999)}",
+                                              location=state),
+                ],
+                "ranking_info": server.RankingInfo(confidence_code=rng.randint(5, 10)),
+                "data_source": "Synthetic",
+                "last_updated": last_updated,
+                **{field: getattr(template, field) for field in TEMPLATE_FIELDS},
+            })
+            # One shared member per company, referenced from every snapshot that lists it
+            members.append(server.HierarchyMember(
+                duns=duns,
+                primaryName=name,
+                legalName=name,
+                operatingStatus=records[-1]["operating_status"],
+                address=server.Address(city=name_city, state=state, country=country),
+                relationshipCode=None if parent < 0 else "SUB",
+                relationshipDescription=None if parent < 0 else "Wholly Owned Subsidiary",
+                hierarchyLevel=depths[-1],
+            ))
+
+        depth_first = []
+        stack = [0]
+        while stack:
+            position = stack.pop()
+            depth_first.append(members[position])
+            stack.extend(reversed(children[position]))
+
+        for position, record in enumerate(records):
+            parent = parents[position]
+            record["corporate_hierarchy"] = server.CorporateHierarchy(
+                globalUltimate=members[0],
+                domesticUltimate=members[0],
+                parent=members[parent] if parent >= 0 else None,
+                subsidiaries=[members[child] for child in children[position][:MAX_SUBSIDIARIES]],
+                familyTreeMembers=depth_first if position == 0 and size > 1 else [],
+            )
+            companies.append(server.Company(**record))
+    return companies
@@ -0,0 +1,207 @@
+"""Bulk resolution of DUNS / SIREN / SIRET lists.
+
+Identifiers are normalized and deduplicated. Cache hits are answered with
+one ``$in`` query, and the misses fan out to a resolver with bounded
+concurrency and a per-batch rate limit. Results are yielded as they
+complete so the endpoint can stream them as NDJSON.
+
+A 9-digit number may be a DUNS or a SIREN. With ``identifier_type``
+"duns" or "siren" it is only matched as that; with "auto" it is matched as
+either, and the resolver decides how far to look for it.
+"""
+import asyncio
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from catalog import normalize_registration
+from persistence import DOCUMENT_PROJECTION
+
+# D-U-N-S and SIREN are 9 digits, SIRET is 14 (SIREN + 5-digit establishment number)
+IDENTIFIER_LENGTHS = {9, 14}
+IDENTIFIER_TYPES = ("auto", "duns", "siren", "siret")
+
+
+def may_be_duns(identifier: str, identifier_type: str = "auto") -> bool:
+    return len(identifier) == 9 and identifier_type in ("auto", "duns")
+
+
+def may_be_registration(identifier_type: str = "auto") -> bool:
+    return identifier_type != "duns"
+
+
+def normalize_identifier(raw: Any) -> Optional[str]:
+    """Strip formatting from an identifier; None when it cannot be valid."""
+    value = normalize_registration(str(raw or ""))
+    if not value.isdigit() or len(value) not in IDENTIFIER_LENGTHS:
+        return None
+    return value
+
+
+def parse_identifiers_csv(text: str) -> List[str]:
+    """First non-empty cell of every row; a non-numeric header row is skipped."""
+    identifiers = []
+    for line_number, row in enumerate(csv.reader(io.StringIO(text))):
+        cell = next((cell.strip() for cell in row if cell.strip()), None)
+        if cell is None:
+            continue
+        if line_number == 0 and not any(char.isdigit() for char in cell):
+            continue
+        identifiers.append(cell)
+    return identifiers
+
+
+def deduplicate(raw_identifiers: Iterable[Any]) -> Tuple[List[str], List[Any], int]:
+    """Returns (unique valid identifiers in input order, invalid inputs, duplicate count)."""
+    seen: Set[str] = set()
+    unique: List[str] = []
+    invalid: List[Any] = []
+    duplicates = 0
+    for raw in raw_identifiers:
+        identifier = normalize_identifier(raw)
+        if identifier is None:
+            invalid.append(raw)
+        elif identifier in seen:
+            duplicates += 1
+        else:
+            seen.add(identifier)
+            unique.append(identifier)
+    return unique, invalid, duplicates
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` acquisitions per second with bursts of ``burst``."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def find_cached(collection, identifiers: List[str], identifier_type: str = "auto") -> Dict[str, Dict[str, Any]]:
+    """Resolve identifiers against ``cached_companies`` in a single query.
+
+    Registration numbers are matched on their normalized ``registration_keys``.
+    """
+    duns = [identifier for identifier in identifiers if may_be_duns(identifier, identifier_type)]
+    registrations = identifiers if may_be_registration(identifier_type) else []
+    clauses = []
+    if duns:
+        clauses.append({"duns": {"$in": duns}})
+    if registrations:
+        clauses.append({"registration_keys": {"$in": registrations}})
+    if not clauses:
+        return {}
+    wanted_duns = set(duns)
+    wanted_registrations = set(registrations)
+    found: Dict[str, Dict[str, Any]] = {}
+    async for document in collection.find({"$or": clauses}, DOCUMENT_PROJECTION):
+        if document["duns"] in wanted_duns:
+            found.setdefault(document["duns"], document)
+        for registration in document.get("registration_numbers") or []:
+            key = normalize_registration(registration.get("number"))
+            if key in wanted_registrations:
+                found.setdefault(key, document)
+    return found
+
+
+async def resolve_identifiers(
+    raw_identifiers: Iterable[Any],
+    *,
+    collection,
+    resolver: Callable[[str, str], Awaitable[Optional[Dict[str, Any]]]],
+    identifier_type: str = "auto",
+    concurrency: int = 16,
+    rate_limit: float = 50.0,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield one status record per identifier, then a final summary record.
+
+    ``resolver(identifier, identifier_type)`` looks up the cache misses.
+    """
+    started = time.monotonic()
+    unique, invalid, duplicates = deduplicate(raw_identifiers)
+    counts = {"found": 0, "not_found": 0, "invalid": len(invalid), "error": 0}
+
+    for raw in invalid:
+        yield {"identifier": str(raw), "status": "invalid"}
+
+    cached = await find_cached(collection, unique, identifier_type)
+    for identifier in unique:
+        if identifier in cached:
+            counts["found"] += 1
+            yield {"identifier": identifier, "status": "found", "source": "cache", "company": cached[identifier]}
+
+    misses: asyncio.Queue = asyncio.Queue()
+    for identifier in unique:
+        if identifier not in cached:
+            misses.put_nowait(identifier)
+
+    # A small output queue keeps workers from racing ahead of a slow client
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    limiter = RateLimiter(rate_limit)
+
+    async def worker():
+        while True:
+            try:
+                identifier = misses.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await limiter.acquire()
+            try:
+                company = await resolver(identifier, identifier_type)
+            except Exception as e:
+                await results.put({"identifier": identifier, "status": "error", "error": str(e)})
+                continue
+            if company is None:
+                await results.put({"identifier": identifier, "status": "not_found"})
+            else:
+                await results.put({"identifier": identifier, "status": "found", "source": "lookup", "company": company})
+
+    pending = misses.qsize()
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(concurrency, pending))]
+    try:
+        for _ in range(pending):
+            record = await results.get()
+            counts[record["status"]] += 1
+            yield record
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    yield {
+        "summary": {
+            **counts,
+            "requested": len(unique) + len(invalid) + duplicates,
+            "unique": len(unique),
+            "duplicates": duplicates,
+            "cache_hits": len(cached),
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        }
+    }
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def ndjson_line(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, default=_json_default) + "\n").encode("utf-8")
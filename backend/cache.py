@@ -0,0 +1,249 @@
+"""Read-through company cache: in-process LRU in front of ``cached_companies``.
+
+Lookups go memory -> MongoDB -> source. Entries are fresh while their
+``last_updated`` is younger than the TTL. Stale entries are still served,
+up to ``max_stale`` seconds old, while a background task refreshes them
+from the source; older ones are refreshed before they are served. When the
+source has nothing for a company we already hold, or fails, the stored copy
+is kept and the refresh retried after ``negative_ttl``. Only DUNS that are
+not in MongoDB either are cached negatively, for a short time so repeated
+404s do not reach the source.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from persistence import DOCUMENT_PROJECTION, bulk_upsert_companies
+
+logger = logging.getLogger(__name__)
+
+# Marks a negative (not found) entry in the LRU
+_MISSING = object()
+
+
+def _timestamp(value: Any) -> float:
+    """Epoch seconds for a ``last_updated`` value; Mongo returns naive UTC datetimes."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, str):
+        return _timestamp(datetime.fromisoformat(value))
+    return 0.0
+
+
+class _Entry:
+    __slots__ = ("value", "updated_at", "expires_at", "retry_at")
+
+    def __init__(self, value: Any, updated_at: float, expires_at: float = 0.0):
+        self.value = value
+        self.updated_at = updated_at
+        self.expires_at = expires_at
+        # No refresh is attempted before this time (after one came back empty)
+        self.retry_at = 0.0
+
+
+class TieredCompanyCache:
+    def __init__(
+        self,
+        collection,
+        loader: Callable[[str], Awaitable[Optional[Any]]],
+        model: Callable[..., Any],
+        *,
+        max_entries: int = 10000,
+        ttl: float = 24 * 3600,
+        max_stale: float = 7 * 24 * 3600,
+        negative_ttl: float = 300,
+    ):
+        self.collection = collection
+        self.loader = loader
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.negative_ttl = negative_ttl
+
+        self._lru: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Set[asyncio.Task] = set()
+        self.counters = {
+            "memory_hits": 0,
+            "mongo_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "refreshes": 0,
+            "refresh_misses": 0,
+            "refresh_errors": 0,
+            "evictions": 0,
+            "warmed": 0,
+        }
+
+    # ----- public API -----
+
+    async def get(self, duns: str) -> Optional[Any]:
+        now = time.time()
+        entry = self._lru.get(duns)
+        if entry is not None:
+            if entry.value is _MISSING:
+                if now < entry.expires_at:
+                    self._lru.move_to_end(duns)
+                    self.counters["negative_hits"] += 1
+                    return None
+                del self._lru[duns]
+            else:
+                age = now - entry.updated_at
+                if age < self.max_stale or now < entry.retry_at:
+                    self._lru.move_to_end(duns)
+                    self.counters["memory_hits"] += 1
+                    if age >= self.ttl and now >= entry.retry_at:
+                        self.counters["stale"] += 1
+                        self._revalidate(duns, entry)
+                    return entry.value
+                del self._lru[duns]
+
+        doc = await self.collection.find_one({"duns": duns}, DOCUMENT_PROJECTION)
+        if doc is not None:
+            updated_at = _timestamp(doc.get("last_updated"))
+            age = now - updated_at
+            stored = _Entry(self.model(**doc), updated_at)
+            if age < self.max_stale:
+                self._remember(duns, stored)
+                self.counters["mongo_hits"] += 1
+                if age >= self.ttl:
+                    self.counters["stale"] += 1
+                    self._revalidate(duns, stored)
+                return stored.value
+            # Too old to serve as is, but still better than a 404 if the source has nothing
+            self.counters["misses"] += 1
+            return await self._load(duns, stored)
+
+        self.counters["misses"] += 1
+        return await self._load(duns)
+
+    def put(self, company: Any) -> None:
+        """Record a company fetched elsewhere (e.g. a search) as fresh."""
+        self._remember(company.duns, _Entry(company, time.time()))
+
+    async def warm(self, limit: int) -> List[Any]:
+        """Preload the ``limit`` most recently updated companies from MongoDB into memory.
+
+        Returns the companies loaded; those older than ``max_stale`` are skipped.
+        """
+        limit = min(limit, self.max_entries)
+        if limit <= 0:
+            return []
+        documents = await self.collection.find({}, DOCUMENT_PROJECTION).sort(
+            [("last_updated", -1), ("duns", -1)]
+        ).limit(limit).to_list(limit)
+        now = time.time()
+        companies = []
+        # Oldest first, so the most recent end up as the most recently used
+        for doc in reversed(documents):
+            updated_at = _timestamp(doc.get("last_updated"))
+            if now - updated_at >= self.max_stale or doc["duns"] in self._lru:
+                continue
+            company = self.model(**doc)
+            self._remember(company.duns, _Entry(company, updated_at))
+            companies.append(company)
+        self.counters["warmed"] += len(companies)
+        return companies
+
+    def invalidate(self, duns: str) -> None:
+        self._lru.pop(duns, None)
+
+    def clear(self) -> None:
+        self._lru.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = sum(self.counters[key] for key in ("memory_hits", "mongo_hits", "negative_hits", "misses"))
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "size": len(self._lru),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "max_stale_seconds": self.max_stale,
+            "negative_ttl_seconds": self.negative_ttl,
+            "hit_ratio": hits / lookups if lookups else None,
+            "refreshing": len(self._refreshing),
+        }
+
+    async def close(self) -> None:
+        """Cancel pending background refreshes; call on shutdown."""
+        for task in list(self._refreshing):
+            task.cancel()
+        if self._refreshing:
+            await asyncio.gather(*self._refreshing, return_exceptions=True)
+
+    # ----- internals -----
+
+    def _remember(self, duns: str, entry: _Entry) -> None:
+        self._lru[duns] = entry
+        self._lru.move_to_end(duns)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def _load(self, duns: str, stored: Optional[_Entry] = None) -> Optional[Any]:
+        """Fetch from the source once per DUNS, however many callers are waiting."""
+        pending = self._inflight.get(duns)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch_and_store(duns, stored))
+            self._inflight[duns] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(duns, None))
+        return await asyncio.shield(pending)
+
+    async def _fetch_and_store(self, duns: str, stored: Optional[_Entry] = None) -> Optional[Any]:
+        """Load ``duns`` from the source; ``stored`` is the copy already held, kept if the source has none."""
+        try:
+            company = await self.loader(duns)
+        except Exception as e:
+            if stored is None:
+                raise
+            self.counters["refresh_errors"] += 1
+            logger.warning(f"Refresh of {duns} failed: {str(e)}")
+            return self._keep(duns, stored)
+        now = time.time()
+        if company is None:
+            if stored is None:
+                self._remember(duns, _Entry(_MISSING, now, now + self.negative_ttl))
+                return None
+            self.counters["refresh_misses"] += 1
+            return self._keep(duns, stored)
+        # The source just confirmed this data, so it is fresh as of now
+        self._remember(duns, _Entry(company, now))
+        document = company.model_dump(exclude={"search_criteria"})
+        document["last_updated"] = datetime.fromtimestamp(now, timezone.utc)
+        await bulk_upsert_companies(self.collection, [document], fetched=True)
+        if stored is not None:
+            self.counters["refreshes"] += 1
+        return company
+
+    def _keep(self, duns: str, stored: _Entry) -> Any:
+        """Go on serving ``stored``, and leave the source alone for ``negative_ttl``."""
+        stored.retry_at = time.time() + self.negative_ttl
+        # Unless something fresher was recorded in the meantime
+        current = self._lru.get(duns)
+        if current is None or current is stored or current.value is _MISSING:
+            self._remember(duns, stored)
+            return stored.value
+        return current.value
+
+    def _revalidate(self, duns: str, stored: _Entry) -> None:
+        if duns in self._inflight:
+            return
+
+        async def refresh():
+            try:
+                await self._load(duns, stored)
+            except Exception as e:
+                self.counters["refresh_errors"] += 1
+                logger.warning(f"Background refresh of {duns} failed: {str(e)}")
+
+        task = asyncio.ensure_future(refresh())
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
@@ -0,0 +1,541 @@
+"""In-memory company catalog with lookup indexes for unified search.
+
+The catalog is built once (at startup or on reload) and every search
+strategy becomes a lookup into one of its indexes instead of a scan over
+all companies. Indexes store row ids; callers materialize the matching
+companies with ``CompanyCatalog.companies``.
+"""
+import bisect
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from columnar import CompanyColumns, RowView
+from geo import GeoGrid
+from name_matching import NameMatcher
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Lowercase and collapse whitespace so keys and queries compare equal."""
+    if not value:
+        return ""
+    return " ".join(value.lower().split())
+
+
+# Continent names as the search form or older clients may send them, by the
+# name D&B data uses (keys normalized)
+CONTINENT_ALIASES = {
+    "amérique du nord": "north america",
+    "amérique du sud": "south america",
+    "asie": "asia",
+    "afrique": "africa",
+    "océanie": "oceania",
+    "antarctique": "antarctica",
+}
+
+
+def normalize_continent(name: Optional[str]) -> str:
+    """Continent key: "Amérique du Nord" and "North America" both give "north america"."""
+    key = normalize_text(name)
+    return CONTINENT_ALIASES.get(key, key)
+
+
+_REGISTRATION_SEPARATORS = re.compile(r"[\s\-./]")
+
+
+def normalize_registration(number: Optional[str]) -> str:
+    """Registration number without formatting, e.g. "94-2404110" -> "942404110"."""
+    return _REGISTRATION_SEPARATORS.sub("", number or "").upper()
+
+
+# Country calling codes for countries whose numbers may come without one;
+# keys are normalized country names and ISO 3166 alpha-2 codes
+CALLING_CODES = {
+    "united states": "1", "us": "1", "usa": "1", "canada": "1", "ca": "1",
+    "france": "33", "fr": "33", "united kingdom": "44", "gb": "44", "uk": "44",
+    "germany": "49", "de": "49", "spain": "34", "es": "34", "italy": "39", "it": "39",
+    "belgium": "32", "be": "32", "netherlands": "31", "nl": "31", "switzerland": "41", "ch": "41",
+    "luxembourg": "352", "lu": "352", "ireland": "353", "ie": "353", "portugal": "351", "pt": "351",
+    "japan": "81", "jp": "81", "china": "86", "cn": "86", "india": "91", "in": "91",
+    "australia": "61", "au": "61", "brazil": "55", "br": "55", "mexico": "52", "mx": "52",
+}
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(number: Optional[str], country: Optional[str] = None) -> Optional[str]:
+    """E.164 form of a phone or fax number, e.g. "+1 408-996-1010" -> "+14089961010".
+
+    Numbers without an international prefix get the calling code of
+    ``country`` with the national trunk "0" dropped; when the country is
+    unknown too, None is returned.
+    """
+    if not number:
+        return None
+    stripped = number.strip()
+    digits = _NON_DIGITS.sub("", stripped)
+    if not digits:
+        return None
+    if stripped.startswith("+"):
+        return f"+{digits}"
+    if digits.startswith("00"):
+        return f"+{digits[2:]}"
+    calling_code = CALLING_CODES.get(normalize_text(country))
+    if calling_code is None:
+        return None
+    national = digits[1:] if digits.startswith("0") else digits
+    if calling_code == "1" and len(digits) == 11 and digits.startswith("1"):
+        national = digits[1:]
+    return f"+{calling_code}{national}"
+
+
+def trigrams(value: str) -> Set[str]:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class SubstringIndex:
+    """Maps keys to row ids and answers exact, prefix and substring lookups.
+
+    Substring lookups go through trigram posting lists over the distinct
+    keys, so their cost depends on the number of candidate keys rather than
+    on the number of rows. Queries shorter than a trigram fall back to a
+    scan of the key vocabulary.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+        self._sorted_keys: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def add(self, key: str, row: int) -> None:
+        if not key:
+            return
+        if key not in self._postings:
+            for gram in trigrams(key):
+                self._grams[gram].add(key)
+        self._postings[key].add(row)
+
+    def freeze(self) -> None:
+        """Finish building; must be called before prefix lookups."""
+        self._sorted_keys = sorted(self._postings)
+
+    def exact(self, key: str) -> Set[int]:
+        return set(self._postings.get(key, ()))
+
+    def prefix_keys(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._sorted_keys, prefix)
+        keys = []
+        for key in self._sorted_keys[start:]:
+            if not key.startswith(prefix):
+                break
+            keys.append(key)
+        return keys
+
+    def prefix(self, prefix: str) -> Set[int]:
+        return self._union(self.prefix_keys(prefix))
+
+    def contains_keys(self, fragment: str) -> List[str]:
+        if not fragment:
+            return []
+        if len(fragment) < 3:
+            return [key for key in self._postings if fragment in key]
+        candidate_sets = []
+        for gram in trigrams(fragment):
+            keys = self._grams.get(gram)
+            if not keys:
+                return []
+            candidate_sets.append(keys)
+        candidate_sets.sort(key=len)
+        candidates = set(candidate_sets[0])
+        for keys in candidate_sets[1:]:
+            candidates &= keys
+            if not candidates:
+                return []
+        # Trigram overlap is necessary but not sufficient for a substring match
+        return [key for key in candidates if fragment in key]
+
+    def contains(self, fragment: str) -> Set[int]:
+        return self._union(self.contains_keys(fragment))
+
+    def _union(self, keys: Iterable[str]) -> Set[int]:
+        rows: Set[int] = set()
+        for key in keys:
+            rows |= self._postings[key]
+        return rows
+
+
+class PrefixIndex:
+    """Top-ranked rows whose key starts with a prefix, for search-as-you-type.
+
+    Keys (a row can have several, e.g. its trading and legal names) are kept
+    in one sorted list; a prefix is the range between two bisections, and the
+    best ``limit`` rows of the range are picked with ``numpy.argpartition``
+    over the rows' scores. Short prefixes have the largest ranges, so their
+    answers are computed once when the index is built.
+    """
+
+    # Prefixes up to this length are answered from the precomputed table
+    PRECOMPUTED_LENGTH = 2
+    PRECOMPUTED_LIMIT = 25
+
+    def __init__(self, entries: Iterable[Tuple[str, int]], scores: np.ndarray):
+        pairs = sorted((key, row) for key, row in entries if key)
+        self._keys = [key for key, _ in pairs]
+        self._rows = np.array([row for _, row in pairs], dtype=np.int64)
+        self._scores = scores[self._rows] if len(self._rows) else np.zeros(0, dtype=scores.dtype)
+        self._precomputed: Dict[str, List[int]] = {}
+        for length in range(1, self.PRECOMPUTED_LENGTH + 1):
+            start = 0
+            while start < len(self._keys):
+                prefix = self._keys[start][:length]
+                if len(prefix) < length:
+                    # A key shorter than the prefix length sorts before its extensions
+                    start += 1
+                    continue
+                end = bisect.bisect_left(self._keys, prefix + "\uffff", start)
+                self._precomputed[prefix] = self._top(start, end, self.PRECOMPUTED_LIMIT)
+                start = end
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def top(self, prefix: str, limit: int) -> List[int]:
+        """Rows of up to ``limit`` keys starting with ``prefix``, best score first."""
+        if not prefix or limit <= 0:
+            return []
+        precomputed = self._precomputed.get(prefix) if limit <= self.PRECOMPUTED_LIMIT else None
+        if precomputed is not None:
+            return precomputed[:limit]
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + "\uffff", start)
+        return self._top(start, end, limit)
+
+    def _top(self, start: int, end: int, limit: int) -> List[int]:
+        # A row can match through more than one key, so take a few extra before deduplicating
+        wanted = min(end - start, limit * 2)
+        if wanted <= 0:
+            return []
+        scores = self._scores[start:end]
+        if wanted < end - start:
+            picked = np.argpartition(-scores, wanted - 1)[:wanted]
+        else:
+            picked = np.arange(end - start)
+        # Best score first, then alphabetical
+        picked = sorted(picked.tolist(), key=lambda offset: (-scores[offset], self._keys[start + offset]))
+        rows: List[int] = []
+        for offset in picked:
+            row = int(self._rows[start + offset])
+            if row not in rows:
+                rows.append(row)
+                if len(rows) == limit:
+                    break
+        return rows
+
+
+class PhoneIndex:
+    """E.164 numbers (without "+") -> row ids, with prefix and suffix lookups.
+
+    Both lookups bisect a sorted key list; suffixes use the reversed
+    numbers, so a local number typed without its country code is found
+    without scanning.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._sorted_keys: List[str] = []
+        self._sorted_reversed: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def add(self, number: Optional[str], row: int) -> None:
+        if number:
+            self._postings[number.lstrip("+")].add(row)
+
+    def freeze(self) -> None:
+        self._sorted_keys = sorted(self._postings)
+        self._sorted_reversed = sorted(key[::-1] for key in self._postings)
+
+    @staticmethod
+    def _range(keys: List[str], prefix: str) -> List[str]:
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + "\uffff", start)
+        return keys[start:end]
+
+    def prefix(self, digits: str) -> Set[int]:
+        return self._union(self._range(self._sorted_keys, digits))
+
+    def suffix(self, digits: str) -> Set[int]:
+        return self._union(key[::-1] for key in self._range(self._sorted_reversed, digits[::-1]))
+
+    def _union(self, keys: Iterable[str]) -> Set[int]:
+        rows: Set[int] = set()
+        for key in keys:
+            rows |= self._postings[key]
+        return rows
+
+
+def phone_query(fragment: str) -> Tuple[str, bool]:
+    """Digits of a searched (partial) number and whether it is international."""
+    stripped = fragment.strip()
+    digits = _NON_DIGITS.sub("", stripped)
+    if stripped.startswith("+"):
+        return digits, True
+    if digits.startswith("00"):
+        return digits[2:], True
+    return digits, False
+
+
+def phone_matches(query: Tuple[str, bool], number: Optional[str]) -> bool:
+    """Same semantics as the catalog phone lookup, for one E.164 number."""
+    digits, international = query
+    if not number or not digits:
+        return False
+    key = number.lstrip("+")
+    if international:
+        return key.startswith(digits)
+    return key.startswith(digits) or key.endswith(digits.lstrip("0") or digits)
+
+
+class _CatalogState:
+    """Immutable snapshot of the catalog rows (stored as columns) and their indexes.
+
+    Indexes are built from the columns alone, so a memory-mapped snapshot
+    file is indexed without materializing any company.
+    """
+
+    def __init__(self, columns: CompanyColumns):
+        self.columns = columns
+        self.duns: Dict[str, int] = {}
+        self.registration = SubstringIndex()
+        self.registration_exact: Dict[str, Set[int]] = defaultdict(set)
+        self.name = SubstringIndex()
+        self.continent: Dict[str, Set[int]] = defaultdict(set)
+        self.country = SubstringIndex()
+        self.city = SubstringIndex()
+        self.postal_code: Dict[str, Set[int]] = defaultdict(set)
+        self.phone = PhoneIndex()
+        with_phone: List[bool] = []
+        with_fax: List[bool] = []
+        names: List[str] = []
+        name_keys: List[Tuple[str, int]] = []
+
+        for row in range(len(columns)):
+            company = columns.view(row)
+            self.duns[company.duns] = row
+            for reg in company.registration_numbers:
+                self.registration.add(reg.number, row)
+                self.registration_exact[normalize_registration(reg.number)].add(row)
+            names.append(company.company_name)
+            key = normalize_text(company.company_name)
+            self.name.add(key, row)
+            name_keys.append((key, row))
+            legal_key = normalize_text(columns.text("legal_name", row))
+            if legal_key and legal_key != key:
+                name_keys.append((legal_key, row))
+            address = company.address
+            if address:
+                if address.continent:
+                    self.continent[normalize_continent(address.continent)].add(row)
+                self.country.add(normalize_text(address.country), row)
+                self.city.add(normalize_text(address.city), row)
+                if address.postal_code:
+                    self.postal_code[normalize_registration(address.postal_code)].add(row)
+            self.phone.add(company.phone_e164, row)
+            self.phone.add(company.fax_e164, row)
+            with_phone.append(bool(company.phone))
+            with_fax.append(bool(company.fax))
+
+        for index in (self.registration, self.name, self.country, self.city, self.phone):
+            index.freeze()
+        # Presence bitmaps, intersected with candidate rows without building sets
+        self.presence = {
+            "has_phone": np.array(with_phone, dtype=bool),
+            "has_fax": np.array(with_fax, dtype=bool),
+        }
+        self.name_matcher = NameMatcher(names)
+        self.name_prefix = PrefixIndex(name_keys, columns.suggestion_scores())
+        self.geo = GeoGrid(zip(columns.latitudes().tolist(), columns.longitudes().tolist()))
+
+    @classmethod
+    def build(cls, companies: Iterable[Any], model: Callable[..., Any]) -> "_CatalogState":
+        rows: List[Any] = []
+        seen: Set[str] = set()
+        for company in companies:
+            if company is None or company.duns in seen:
+                continue
+            seen.add(company.duns)
+            rows.append(company)
+        # Only the columns are kept; the input models can be released
+        return cls(CompanyColumns(rows, model))
+
+
+class CompanyCatalog:
+    """Company catalog that is built once and swapped atomically on reload.
+
+    Rows are kept in a ``CompanyColumns`` store; ``model`` builds the objects
+    handed out by ``get`` / ``companies`` for the rows actually returned.
+    """
+
+    def __init__(self, companies: Iterable[Any] = (), model: Callable[..., Any] = dict):
+        self.model = model
+        self._state = _CatalogState.build(companies, model)
+        self._reload_lock = threading.Lock()
+
+    def reload(self, companies: Iterable[Any]) -> int:
+        """Rebuild every index from ``companies`` and publish them at once.
+
+        In-flight lookups keep using the snapshot they started with.
+        """
+        with self._reload_lock:
+            state = _CatalogState.build(companies, self.model)
+            self._state = state
+        return len(state.columns)
+
+    def save(self, path: str) -> None:
+        """Write the current rows to a snapshot file for ``load`` (indexes are rebuilt on load)."""
+        self._state.columns.save(path)
+
+    def load(self, path: str) -> int:
+        """Publish the rows of a snapshot file, memory-mapped so processes share them."""
+        with self._reload_lock:
+            state = _CatalogState(CompanyColumns.open(path, self.model))
+            self._state = state
+        return len(state.columns)
+
+    def __len__(self) -> int:
+        return len(self._state.columns)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the row columns (indexes not included)."""
+        return self._state.columns.nbytes
+
+    def snapshot(self) -> "CompanyCatalog":
+        """View pinned to the current indexes, so multi-step queries see one consistent state."""
+        view = CompanyCatalog.__new__(CompanyCatalog)
+        view.model = self.model
+        view._state = self._state
+        view._reload_lock = self._reload_lock
+        return view
+
+    def get(self, duns: str) -> Optional[Any]:
+        state = self._state
+        row = state.duns.get(duns)
+        return state.columns.company(row) if row is not None else None
+
+    def company(self, row: int) -> Any:
+        return self._state.columns.company(row)
+
+    def hierarchy(self) -> Tuple[Iterator[Dict[str, Any]], Iterator[Tuple[str, str]]]:
+        """Family-tree members and (parent, child) edges of the catalog rows."""
+        return self._state.columns.hierarchy()
+
+    def companies(self, rows: Iterable[int]) -> List[Any]:
+        """Materialize rows in catalog order."""
+        columns = self._state.columns
+        return [columns.company(row) for row in sorted(rows)]
+
+    def iter_companies(self, rows: Iterable[int]) -> Iterator[Any]:
+        """Like ``companies`` but lazily, for streaming large result sets."""
+        columns = self._state.columns
+        for row in sorted(rows):
+            yield columns.company(row)
+
+    def view(self, row: int) -> RowView:
+        """Fields used by search filters for one row, without materializing it."""
+        return self._state.columns.view(row)
+
+    # ----- per-strategy lookups, each returning row ids -----
+
+    def lookup_duns(self, duns: str) -> Set[int]:
+        row = self._state.duns.get(duns)
+        return {row} if row is not None else set()
+
+    def lookup_registration(self, number: str, exact: bool = False) -> Set[int]:
+        if exact:
+            return set(self._state.registration_exact.get(normalize_registration(number), ()))
+        return self._state.registration.contains(number)
+
+    def lookup_name(self, name: str, exact: bool = False) -> Set[int]:
+        key = normalize_text(name)
+        if exact:
+            return self._state.name.exact(key)
+        return self._state.name.contains(key)
+
+    def match_name(self, name: str, limit: Optional[int] = 25, min_score: float = 0.3) -> List[Tuple[int, float]]:
+        """Fuzzy name matches as (row, score) pairs, best first."""
+        return self._state.name_matcher.match(name, limit, min_score)
+
+    def name_similarity(self, name: str, other: str) -> float:
+        return self._state.name_matcher.similarity(name, other)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Companies whose name or legal name starts with ``prefix``, most relevant first.
+
+        Each suggestion carries just what a typeahead shows: names, DUNS and location.
+        """
+        state = self._state
+        suggestions = []
+        for row in state.name_prefix.top(normalize_text(prefix), limit):
+            company = state.columns.view(row)
+            suggestions.append({
+                "duns": company.duns,
+                "company_name": company.company_name,
+                "legal_name": state.columns.text("legal_name", row),
+                "city": company.address.city if company.address else None,
+                "country": company.address.country if company.address else None,
+            })
+        return suggestions
+
+    def lookup_continent(self, continent: str) -> Set[int]:
+        return set(self._state.continent.get(normalize_continent(continent), ()))
+
+    def lookup_country(self, country: str) -> Set[int]:
+        return self._state.country.contains(normalize_text(country))
+
+    def lookup_city(self, city: str) -> Set[int]:
+        return self._state.city.contains(normalize_text(city))
+
+    def lookup_postal_code(self, postal_code: str) -> Set[int]:
+        return set(self._state.postal_code.get(normalize_registration(postal_code), ()))
+
+    def lookup_radius(self, latitude: float, longitude: float, radius_km: float) -> Dict[int, float]:
+        """Rows within ``radius_km`` of the point, mapped to their distance in km."""
+        rows, distances = self._state.geo.radius(latitude, longitude, radius_km)
+        return dict(zip(rows.tolist(), distances.tolist()))
+
+    def lookup_bbox(self, bbox: List[float], center: Optional[Tuple[float, float]] = None) -> Dict[int, float]:
+        """Rows inside [west, south, east, north], mapped to their distance in km from ``center``."""
+        rows, distances = self._state.geo.bbox(bbox, center)
+        return dict(zip(rows.tolist(), distances.tolist()))
+
+    def lookup_all(self) -> Set[int]:
+        return set(range(len(self._state.columns)))
+
+    def lookup_phone(self, fragment: str) -> Set[int]:
+        """Rows whose phone or fax starts with the number, or ends with it when
+        it has no international prefix (local number, national trunk "0" ignored)."""
+        digits, international = phone_query(fragment)
+        if not digits:
+            return set()
+        rows = self._state.phone.prefix(digits)
+        if not international:
+            rows |= self._state.phone.suffix(digits.lstrip("0") or digits)
+        return rows
+
+    def lookup_presence(self, flag: str) -> Set[int]:
+        return set(np.flatnonzero(self._state.presence[flag]).tolist())
+
+    def filter_presence(self, rows: Set[int], flag: str) -> Set[int]:
+        """``rows`` that have the ``has_phone`` / ``has_fax`` flag set."""
+        if not rows:
+            return set()
+        candidates = np.fromiter(rows, dtype=np.int64, count=len(rows))
+        return set(candidates[self._state.presence[flag][candidates]].tolist())
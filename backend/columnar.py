@@ -0,0 +1,414 @@
+"""Columnar storage for catalog companies.
+
+Instead of one Pydantic ``Company`` (plus nested models, a uuid string and
+a datetime) per entity, the catalog keeps one column per field:
+
+- free text (names, streets, phone numbers) is UTF-8 packed into a single
+  buffer with an offsets array,
+- low-cardinality text (country, state, city, status, ...) is dictionary
+  encoded into integer codes,
+- numbers (employee count, year started, coordinates, confidence code)
+  live in NumPy arrays,
+- everything else (hierarchy snapshot, registration details, ...) is kept
+  as packed compact JSON,
+- the family-tree members and (parent, child) edges of all the hierarchy
+  snapshots are kept once more as a graph, so the hierarchy graph is
+  rebuilt without parsing every row.
+
+Full ``Company`` models are only built for the rows a search returns.
+Filters that need a handful of fields use a light ``RowView`` instead.
+
+``CompanyColumns.save`` writes the columns to a snapshot file that
+``CompanyColumns.open`` memory-maps: every array is a read-only view of
+the mapping, so the worker processes of one host share a single copy of
+the catalog in the page cache.
+"""
+import json
+import mmap
+import os
+import struct
+import uuid
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from hierarchy import HierarchyGraph
+
+_INT_NULL = np.iinfo(np.int64).min
+# Snapshot file: magic, manifest length, JSON manifest, then the aligned array data
+SNAPSHOT_MAGIC = b"DNBCOLS2"
+_SNAPSHOT_ALIGNMENT = 64
+
+
+class StringColumn:
+    """Nullable strings packed into one UTF-8 buffer with row offsets."""
+
+    def __init__(self, values: Iterable[Optional[str]]):
+        chunks: List[bytes] = []
+        present: List[bool] = []
+        for value in values:
+            present.append(value is not None)
+            chunks.append(value.encode("utf-8") if value is not None else b"")
+        self._buffer = b"".join(chunks)
+        self._offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        np.cumsum([len(chunk) for chunk in chunks], out=self._offsets[1:])
+        self._present = np.array(present, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self._present)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        if not self._present[row]:
+            return None
+        # The buffer is bytes, or a memoryview of a mapped snapshot
+        return str(self._buffer[self._offsets[row]:self._offsets[row + 1]], "utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buffer) + self._offsets.nbytes + self._present.nbytes
+
+    def parts(self) -> Dict[str, Any]:
+        return {"buffer": self._buffer, "offsets": self._offsets, "present": self._present}
+
+    @classmethod
+    def from_parts(cls, parts: Dict[str, Any]) -> "StringColumn":
+        column = cls.__new__(cls)
+        column._buffer = parts["buffer"]
+        column._offsets = parts["offsets"]
+        column._present = parts["present"]
+        return column
+
+
+class DictionaryColumn:
+    """Nullable low-cardinality strings stored as integer codes into a value list."""
+
+    def __init__(self, values: Iterable[Optional[str]]):
+        self.values: List[str] = []
+        lookup: Dict[str, int] = {}
+        codes = []
+        for value in values:
+            if value is None:
+                codes.append(-1)
+                continue
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(self.values)
+                self.values.append(value)
+            codes.append(code)
+        dtype = np.int16 if len(self.values) < 2 ** 15 else np.int32
+        self.codes = np.array(codes, dtype=dtype)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        code = self.codes[row]
+        return self.values[code] if code >= 0 else None
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sum(len(value) + 49 for value in self.values)
+
+    def parts(self) -> Dict[str, Any]:
+        return {"codes": self.codes}
+
+    @classmethod
+    def from_parts(cls, parts: Dict[str, Any], values: List[str]) -> "DictionaryColumn":
+        column = cls.__new__(cls)
+        column.values = values
+        column.codes = parts["codes"]
+        return column
+
+
+class _RegistrationView:
+    __slots__ = ("number",)
+
+    def __init__(self, number: str):
+        self.number = number
+
+
+class _AddressView:
+    __slots__ = ("street", "city", "state", "postal_code", "country", "continent", "latitude", "longitude")
+
+
+class RowView:
+    """The fields search filters read, for one row, without building a ``Company``."""
+
+    __slots__ = ("duns", "company_name", "registration_numbers", "address",
+                 "phone", "fax", "phone_e164", "fax_e164")
+
+
+# Address fields and how each is stored
+_ADDRESS_TEXT = ("street",)
+_ADDRESS_CODED = ("city", "state", "postal_code", "country", "continent")
+_ADDRESS_FLOAT = ("latitude", "longitude")
+# Top-level fields and how each is stored
+_TEXT = ("duns", "company_name", "legal_name", "phone", "fax", "phone_e164", "fax_e164")
+_CODED = ("business_type", "operating_status", "industry", "legal_form", "data_source")
+_INTEGER = ("employee_count", "year_started")
+# Regenerated on every read (``last_updated``) or per search (``search_criteria``, ...)
+_NOT_STORED = {"id", "last_updated", "search_criteria", "distance_km"}
+_REGISTRATION_SEPARATOR = "\x1f"
+
+
+class CompanyColumns:
+    """Column store for a fixed list of companies; row id = position in the list."""
+
+    def __init__(self, companies: Sequence[Any], model: Callable[..., Any] = dict):
+        self.model = model
+        documents = [company.model_dump(by_alias=True) for company in companies]
+        addresses = [document.get("address") or {} for document in documents]
+        self.size = len(documents)
+
+        self._ids = b"".join(_id_bytes(document.get("id")) for document in documents)
+        self._text = {field: StringColumn(document.get(field) for document in documents) for field in _TEXT}
+        self._coded = {field: DictionaryColumn(document.get(field) for document in documents) for field in _CODED}
+        self._integers = {
+            field: np.array([_INT_NULL if document.get(field) is None else document[field] for document in documents],
+                            dtype=np.int64)
+            for field in _INTEGER
+        }
+        self._has_address = np.array([bool(document.get("address")) for document in documents], dtype=bool)
+        self._address_text = {field: StringColumn(address.get(field) for address in addresses)
+                              for field in _ADDRESS_TEXT}
+        self._address_coded = {field: DictionaryColumn(address.get(field) for address in addresses)
+                               for field in _ADDRESS_CODED}
+        self._address_floats = {
+            field: np.array([np.nan if address.get(field) is None else address[field] for address in addresses],
+                            dtype=np.float64)
+            for field in _ADDRESS_FLOAT
+        }
+        rankings = [document.get("ranking_info") or {} for document in documents]
+        self._confidence = np.array([ranking.get("confidence_code") or 0 for ranking in rankings], dtype=np.int8)
+        self._match_quality = DictionaryColumn(ranking.get("match_quality") for ranking in rankings)
+        self._has_ranking = np.array([bool(ranking) for ranking in rankings], dtype=bool)
+        self._registrations = StringColumn(
+            _REGISTRATION_SEPARATOR.join(reg["number"] for reg in document.get("registration_numbers") or [])
+            for document in documents
+        )
+        self._rest = StringColumn(json.dumps(_rest(document), separators=(",", ":"), default=str)
+                                  for document in documents)
+        graph = HierarchyGraph()
+        for company in companies:
+            graph.add_company(company)
+        members, edges = graph.export()
+        self._hierarchy_members = StringColumn(json.dumps(member, separators=(",", ":"), default=str)
+                                               for member in members)
+        self._hierarchy_parents = StringColumn(parent for parent, _ in edges)
+        self._hierarchy_children = StringColumn(child for _, child in edges)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        columns = [*self._text.values(), *self._coded.values(), *self._address_text.values(),
+                   *self._address_coded.values(), self._match_quality, self._registrations, self._rest,
+                   self._hierarchy_members, self._hierarchy_parents, self._hierarchy_children]
+        arrays = [*self._integers.values(), *self._address_floats.values(),
+                  self._has_address, self._confidence, self._has_ranking]
+        return len(self._ids) + sum(column.nbytes for column in columns) + sum(array.nbytes for array in arrays)
+
+    def latitudes(self) -> np.ndarray:
+        return self._address_floats["latitude"]
+
+    def longitudes(self) -> np.ndarray:
+        return self._address_floats["longitude"]
+
+    def suggestion_scores(self) -> np.ndarray:
+        """Per-row ranking of autocomplete suggestions: confidence code, then employee count."""
+        employees = np.clip(self._integers["employee_count"], 0, 10 ** 9 - 1)
+        return self._confidence.astype(np.int64) * 10 ** 9 + employees
+
+    def text(self, field: str, row: int) -> Optional[str]:
+        return self._text[field][row]
+
+    def registrations(self, row: int) -> List[str]:
+        numbers = self._registrations[row]
+        return numbers.split(_REGISTRATION_SEPARATOR) if numbers else []
+
+    def hierarchy(self) -> Tuple[Iterator[Dict[str, Any]], Iterator[Tuple[str, str]]]:
+        """Family-tree members and (parent, child) edges of every row, for ``HierarchyGraph.extend``."""
+        members = (json.loads(self._hierarchy_members[index]) for index in range(len(self._hierarchy_members)))
+        edges = ((self._hierarchy_parents[index], self._hierarchy_children[index])
+                 for index in range(len(self._hierarchy_parents)))
+        return members, edges
+
+    def view(self, row: int) -> RowView:
+        view = RowView()
+        for field in RowView.__slots__:
+            if field in self._text:
+                setattr(view, field, self._text[field][row])
+        numbers = self.registrations(row)
+        view.registration_numbers = [_RegistrationView(number) for number in numbers]
+        view.address = None
+        if self._has_address[row]:
+            address = _AddressView()
+            address.street = self._address_text["street"][row]
+            for field in _ADDRESS_CODED:
+                setattr(address, field, self._address_coded[field][row])
+            for field in _ADDRESS_FLOAT:
+                value = self._address_floats[field][row]
+                setattr(address, field, None if np.isnan(value) else float(value))
+            view.address = address
+        return view
+
+    def document(self, row: int) -> Dict[str, Any]:
+        """Stored fields of one row as a plain document (without ``last_updated``)."""
+        document = json.loads(self._rest[row])
+        document["id"] = str(uuid.UUID(bytes=bytes(self._ids[row * 16:row * 16 + 16])))
+        for field, column in self._text.items():
+            document[field] = column[row]
+        for field, column in self._coded.items():
+            document[field] = column[row]
+        for field, values in self._integers.items():
+            document[field] = None if values[row] == _INT_NULL else int(values[row])
+        if self._has_address[row]:
+            address = document.setdefault("address", {})
+            address["street"] = self._address_text["street"][row]
+            for field, column in self._address_coded.items():
+                address[field] = column[row]
+            for field, values in self._address_floats.items():
+                address[field] = None if np.isnan(values[row]) else float(values[row])
+        if self._has_ranking[row]:
+            document["ranking_info"] = {
+                "confidence_code": int(self._confidence[row]),
+                "match_quality": self._match_quality[row],
+            }
+        # Missing fields fall back to the model defaults
+        return {key: value for key, value in document.items() if value is not None}
+
+    def company(self, row: int) -> Any:
+        return self.model(**self.document(row))
+
+    # ----- snapshot files -----
+
+    def _columns(self) -> Dict[str, Any]:
+        """Every column by a stable name: StringColumn, DictionaryColumn, array or bytes."""
+        columns: Dict[str, Any] = {
+            "ids": self._ids,
+            "has_address": self._has_address,
+            "confidence": self._confidence,
+            "match_quality": self._match_quality,
+            "has_ranking": self._has_ranking,
+            "registrations": self._registrations,
+            "rest": self._rest,
+            "hierarchy_members": self._hierarchy_members,
+            "hierarchy_parents": self._hierarchy_parents,
+            "hierarchy_children": self._hierarchy_children,
+        }
+        for prefix, group in (("text", self._text), ("coded", self._coded), ("integers", self._integers),
+                              ("address_text", self._address_text), ("address_coded", self._address_coded),
+                              ("address_floats", self._address_floats)):
+            columns.update({f"{prefix}.{field}": column for field, column in group.items()})
+        return columns
+
+    def save(self, path: str) -> None:
+        """Write the columns to a snapshot file, atomically replacing ``path``."""
+        arrays: List[Tuple[str, np.ndarray]] = []
+        dictionaries: Dict[str, List[str]] = {}
+        for name, column in self._columns().items():
+            if isinstance(column, (StringColumn, DictionaryColumn)):
+                if isinstance(column, DictionaryColumn):
+                    dictionaries[name] = column.values
+                arrays.extend((f"{name}.{part}", value) for part, value in column.parts().items())
+            else:
+                arrays.append((name, column))
+
+        layout = {}
+        offset = 0
+        for name, value in arrays:
+            array = np.frombuffer(value, dtype=np.uint8) if isinstance(value, (bytes, memoryview)) else value
+            layout[name] = {"offset": offset, "dtype": array.dtype.str, "count": len(array),
+                            "raw": isinstance(value, (bytes, memoryview))}
+            offset += -(-array.nbytes // _SNAPSHOT_ALIGNMENT) * _SNAPSHOT_ALIGNMENT
+        manifest = json.dumps({"size": self.size, "arrays": layout, "dictionaries": dictionaries}).encode("utf-8")
+        header = SNAPSHOT_MAGIC + struct.pack("<Q", len(manifest)) + manifest
+        data_start = -(-len(header) // _SNAPSHOT_ALIGNMENT) * _SNAPSHOT_ALIGNMENT
+
+        # Processes that mapped the previous file keep reading it until they reopen
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(header.ljust(data_start, b"\0"))
+            for name, value in arrays:
+                file.seek(data_start + layout[name]["offset"])
+                file.write(value if isinstance(value, (bytes, memoryview)) else np.ascontiguousarray(value).tobytes())
+            file.truncate(data_start + offset)
+        os.replace(temporary, path)
+
+    @classmethod
+    def open(cls, path: str, model: Callable[..., Any] = dict) -> "CompanyColumns":
+        """Columns of a snapshot file, memory-mapped read-only instead of loaded."""
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        (length,) = struct.unpack_from("<Q", mapped, len(SNAPSHOT_MAGIC))
+        manifest_start = len(SNAPSHOT_MAGIC) + 8
+        manifest = json.loads(mapped[manifest_start:manifest_start + length])
+        data_start = -(-(manifest_start + length) // _SNAPSHOT_ALIGNMENT) * _SNAPSHOT_ALIGNMENT
+        view = memoryview(mapped)
+
+        parts: Dict[str, Any] = {}
+        for name, spec in manifest["arrays"].items():
+            start = data_start + spec["offset"]
+            if spec["raw"]:
+                parts[name] = view[start:start + spec["count"]]
+            else:
+                parts[name] = np.frombuffer(mapped, dtype=np.dtype(spec["dtype"]), count=spec["count"], offset=start)
+
+        def column(name: str) -> Any:
+            if name in manifest["dictionaries"]:
+                return DictionaryColumn.from_parts({"codes": parts[f"{name}.codes"]}, manifest["dictionaries"][name])
+            if f"{name}.buffer" in parts:
+                return StringColumn.from_parts({part: parts[f"{name}.{part}"] for part in ("buffer", "offsets", "present")})
+            return parts[name]
+
+        columns = cls.__new__(cls)
+        columns.model = model
+        columns.size = manifest["size"]
+        # The arrays are views of the mapping, which stays open as long as they do
+        columns._mapped = mapped
+        columns._ids = column("ids")
+        columns._text = {field: column(f"text.{field}") for field in _TEXT}
+        columns._coded = {field: column(f"coded.{field}") for field in _CODED}
+        columns._integers = {field: column(f"integers.{field}") for field in _INTEGER}
+        columns._has_address = column("has_address")
+        columns._address_text = {field: column(f"address_text.{field}") for field in _ADDRESS_TEXT}
+        columns._address_coded = {field: column(f"address_coded.{field}") for field in _ADDRESS_CODED}
+        columns._address_floats = {field: column(f"address_floats.{field}") for field in _ADDRESS_FLOAT}
+        columns._confidence = column("confidence")
+        columns._match_quality = column("match_quality")
+        columns._has_ranking = column("has_ranking")
+        columns._registrations = column("registrations")
+        columns._rest = column("rest")
+        columns._hierarchy_members = column("hierarchy_members")
+        columns._hierarchy_parents = column("hierarchy_parents")
+        columns._hierarchy_children = column("hierarchy_children")
+        return columns
+
+
+def _id_bytes(value: Any) -> bytes:
+    """16-byte form of a uuid id; ids that are not uuids are replaced."""
+    try:
+        return uuid.UUID(str(value)).bytes
+    except ValueError:
+        return uuid.uuid4().bytes
+
+
+def _rest(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields that have no column of their own."""
+    rest = {}
+    for key, value in document.items():
+        if key in _NOT_STORED or key in _TEXT or key in _CODED or key in _INTEGER or key == "ranking_info":
+            continue
+        if key == "address":
+            if value:
+                extra = {field: item for field, item in value.items()
+                         if field not in _ADDRESS_TEXT + _ADDRESS_CODED + _ADDRESS_FLOAT and item is not None}
+                if extra:
+                    rest["address"] = extra
+            continue
+        if value is not None and value != []:
+            rest[key] = value
+    return rest
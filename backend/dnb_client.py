@@ -0,0 +1,198 @@
+"""Async client for the D&B Direct+ API.
+
+One ``DnbClient`` owns a single pooled ``httpx.AsyncClient`` for the whole
+process. It caches the OAuth bearer token until shortly before it expires
+and coalesces identical in-flight requests (same DUNS, or same criteria
+search once normalized by ``search_key``), so a burst of users opening the
+same company results in one upstream call.
+"""
+import asyncio
+import importlib.util
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional ``h2`` package; fall back to HTTP/1.1 keep-alive
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+DEFAULT_COMPANY_BLOCKS = "companyinfo_L2_v1,hierarchyconnections_L1_v1"
+
+
+def search_key(payload: Dict[str, Any]) -> str:
+    """Coalescing key for a criteria search: keys sorted, text trimmed, unset values dropped."""
+    supplied = {}
+    for name, value in payload.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, "", []):
+            supplied[name] = value
+    return "search:" + json.dumps(supplied, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class DnbApiError(Exception):
+    """Raised when Direct+ answers with an unexpected status."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"D&B API error {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class DnbClient:
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        base_url: str,
+        token_url: str,
+        *,
+        timeout: float = 10.0,
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        token_refresh_margin: float = 300.0,
+    ):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url.rstrip("/")
+        self.token_url = token_url
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.token_refresh_margin = token_refresh_margin
+
+        self._http: Optional[httpx.AsyncClient] = None
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock: Optional[asyncio.Lock] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"upstream_requests": 0, "coalesced_requests": 0, "token_refreshes": 0}
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key and self.api_secret)
+
+    @property
+    def is_running(self) -> bool:
+        return self._http is not None
+
+    async def start(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        """Open the shared connection pool; call once at application startup."""
+        if self._http is not None:
+            return
+        self._token_lock = asyncio.Lock()
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=HTTP2_AVAILABLE and transport is None,
+            limits=self.limits,
+            timeout=self.timeout,
+            transport=transport,
+        )
+
+    async def close(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        self._token = None
+        self._token_expires_at = 0.0
+
+    # ----- authentication -----
+
+    def _token_is_fresh(self) -> bool:
+        return self._token is not None and time.monotonic() < self._token_expires_at - self.token_refresh_margin
+
+    async def _get_token(self, force_refresh: bool = False) -> str:
+        if not force_refresh and self._token_is_fresh():
+            return self._token
+        async with self._token_lock:
+            # Another coroutine may have refreshed it while we waited
+            if not force_refresh and self._token_is_fresh():
+                return self._token
+            response = await self._client.post(
+                self.token_url,
+                auth=(self.api_key, self.api_secret),
+                json={"grant_type": "client_credentials"},
+            )
+            if response.status_code != 200:
+                raise DnbApiError(response.status_code, response.text)
+            payload = response.json()
+            self._token = payload["access_token"]
+            self._token_expires_at = time.monotonic() + float(payload.get("expiresIn", 3600))
+            self.stats["token_refreshes"] += 1
+            logger.info("Refreshed D&B access token")
+            return self._token
+
+    # ----- request plumbing -----
+
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            raise RuntimeError("DnbClient.start() must be called before making requests")
+        return self._http
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        token = await self._get_token()
+        self.stats["upstream_requests"] += 1
+        response = await self._client.request(
+            method, path, headers={"Authorization": f"Bearer {token}"}, **kwargs
+        )
+        if response.status_code == 401:
+            # Token revoked or expired early: refresh once and retry
+            token = await self._get_token(force_refresh=True)
+            self.stats["upstream_requests"] += 1
+            response = await self._client.request(
+                method, path, headers={"Authorization": f"Bearer {token}"}, **kwargs
+            )
+        return response
+
+    async def _coalesce(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Share one upstream call between every concurrent caller of ``key``."""
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced_requests"] += 1
+            return await asyncio.shield(pending)
+        task = asyncio.ensure_future(call())
+        self._inflight[key] = task
+
+        def forget(done: asyncio.Future) -> None:
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+
+        task.add_done_callback(forget)
+        return await asyncio.shield(task)
+
+    # ----- Direct+ endpoints -----
+
+    async def get_company(self, duns: str, blocks: str = DEFAULT_COMPANY_BLOCKS) -> Optional[Dict[str, Any]]:
+        """Fetch data blocks for one DUNS; returns None when D&B does not know it."""
+
+        async def call():
+            response = await self._request("GET", f"/data/duns/{duns}", params={"blockIDs": blocks})
+            if response.status_code == 404:
+                return None
+            if response.status_code != 200:
+                raise DnbApiError(response.status_code, response.text)
+            return response.json()
+
+        return await self._coalesce(f"duns:{duns}:{blocks}", call)
+
+    async def search_criteria(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a criteria search (name, address, registration number, ...)."""
+
+        async def call():
+            response = await self._request("POST", "/search/criteria", json=payload)
+            if response.status_code == 404:
+                return {"searchCandidates": []}
+            if response.status_code != 200:
+                raise DnbApiError(response.status_code, response.text)
+            return response.json()
+
+        return await self._coalesce(search_key(payload), call)
@@ -0,0 +1,250 @@
+"""Streaming CSV / XLSX export of corporate hierarchies.
+
+Rows are produced by a generator that walks the family tree once: ancestors
+first (negative levels), then the company itself, then its descendants in
+breadth-first order, so rows come out sorted by level without a sort step.
+Members are deduplicated by DUNS with a set in the same pass.
+
+The XLSX writer streams worksheet XML straight into a zip entry on a
+spooled temporary file, so memory stays flat whatever the tree size.
+"""
+import csv
+import io
+import itertools
+import zipfile
+from collections import deque
+from datetime import datetime, timezone
+from tempfile import SpooledTemporaryFile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+EXPORT_COLUMNS = [
+    ("Level", 8),
+    ("Entity Type", 15),
+    ("D-U-N-S", 12),
+    ("Name", 30),
+    ("Legal Name", 30),
+    ("Operating Status", 15),
+    ("Address", 40),
+    ("Phone", 15),
+    ("Email", 25),
+    ("Website", 25),
+    ("Industry", 20),
+    ("Employee Count", 15),
+    ("Sales Volume", 15),
+    ("Year Started", 12),
+    ("Legal Form", 15),
+    ("National IDs", 30),
+    ("Relationship", 12),
+    ("Relationship Description", 25),
+]
+EXPORT_HEADERS = [name for name, _ in EXPORT_COLUMNS]
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _address_text(address: Optional[Dict[str, Any]]) -> str:
+    if not address:
+        return ""
+    return ", ".join(part for part in (address.get("street"), address.get("city"), address.get("country")) if part)
+
+
+def company_row(company: Any) -> List[Any]:
+    """Level-0 row for the exported company itself."""
+    address = company.address.model_dump() if company.address else None
+    national_ids = "; ".join(f"{reg.type}: {reg.number}" for reg in (company.registration_numbers or []))
+    return [
+        0, "Current Company", company.duns, company.company_name, company.legal_name or "",
+        company.operating_status or "", _address_text(address), company.phone or "",
+        company.email or "", company.website or "", company.industry or "",
+        company.employee_count or "", company.annual_revenue or "", company.year_started or "",
+        company.legal_form or "", national_ids, "Current Entity", "Selected Company",
+    ]
+
+
+def member_row(member: Dict[str, Any], level: int, entity_type: str) -> List[Any]:
+    return [
+        level, entity_type, member.get("duns", ""), member.get("primaryName", ""),
+        member.get("legalName", ""), member.get("operatingStatus", ""),
+        _address_text(member.get("address")), member.get("phone", ""), member.get("email", ""),
+        member.get("website", ""), member.get("industry", ""), member.get("employeeCount", ""),
+        member.get("salesVolume", ""), member.get("yearStarted", ""), member.get("legalForm", ""),
+        member.get("nationalIds", ""), member.get("relationshipCode", ""),
+        member.get("relationshipDescription", ""),
+    ]
+
+
+def hierarchy_rows(company: Any, graph, max_members: int) -> Iterator[List[Any]]:
+    """Export rows for ``company`` and its family tree, sorted by level, unique by DUNS."""
+    seen = {company.duns}
+
+    upward: List[List[Any]] = []
+    ancestors = graph.ancestors(company.duns)
+    for depth, ancestor in enumerate(ancestors, start=1):
+        if ancestor["duns"] in seen:
+            continue
+        seen.add(ancestor["duns"])
+        entity_type = "Global Ultimate" if depth == len(ancestors) else "Parent Direct" if depth == 1 else "Parent"
+        upward.append(member_row(ancestor, -depth, entity_type))
+
+    # Ultimates known only from the company's snapshot sit just above it
+    snapshot = company.corporate_hierarchy
+    if snapshot:
+        for member, entity_type in ((snapshot.globalUltimate, "Global Ultimate"),
+                                    (snapshot.domesticUltimate, "Domestic Ultimate")):
+            if member and member.duns not in seen:
+                seen.add(member.duns)
+                upward.append(member_row(member.model_dump(exclude_none=True), -1, entity_type))
+
+    yield from sorted(upward, key=lambda row: row[0])
+    yield company_row(company)
+
+    emitted = 0
+    queue = deque((child, 1) for child in graph.children(company.duns, 0, max_members)["items"])
+    while queue and emitted < max_members:
+        member, level = queue.popleft()
+        if member["duns"] in seen:
+            continue
+        seen.add(member["duns"])
+        emitted += 1
+        yield member_row(member, level, "Subsidiary" if level == 1 else "Family Tree Member")
+        if member.get("childCount"):
+            queue.extend((child, level + 1) for child in graph.children(member["duns"], 0, max_members)["items"])
+
+
+def iter_csv(rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """CSV lines, header first, encoded one row at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the UTF-8 file with the right encoding
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_HEADERS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+# ----- minimal streaming XLSX writer -----
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet2.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Corporate Hierarchy" sheetId="1" r:id="rId1"/>'
+    '<sheet name="Metadata" sheetId="2" r:id="rId2"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet2.xml"/>'
+    '</Relationships>'
+)
+_SHEET_OPEN = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+)
+
+
+def _cell(value: Any) -> str:
+    if value is None or value == "":
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def _row_xml(values: Sequence[Any]) -> str:
+    return "<row>" + "".join(_cell(value) for value in values) + "</row>"
+
+
+def _write_sheet(archive: zipfile.ZipFile, name: str, rows: Iterable[Sequence[Any]],
+                 widths: Optional[Sequence[int]] = None) -> int:
+    count = 0
+    with archive.open(name, "w", force_zip64=True) as sheet:
+        sheet.write(_SHEET_OPEN.encode("utf-8"))
+        if widths:
+            cols = "".join(
+                f'<col min="{index}" max="{index}" width="{width}" customWidth="1"/>'
+                for index, width in enumerate(widths, start=1)
+            )
+            sheet.write(f"<cols>{cols}</cols>".encode("utf-8"))
+        sheet.write(b"<sheetData>")
+        for row in rows:
+            sheet.write(_row_xml(row).encode("utf-8"))
+            count += 1
+        sheet.write(b"</sheetData></worksheet>")
+    return count
+
+
+def write_hierarchy_xlsx(target, rows: Iterable[Sequence[Any]], company: Any, data_source: str) -> None:
+    """Write the hierarchy workbook (data sheet + metadata sheet) into ``target``."""
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _WORKBOOK)
+        archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        header = [EXPORT_HEADERS]
+        # The header row counts as one of the written rows
+        total = _write_sheet(
+            archive, "xl/worksheets/sheet1.xml", itertools.chain(header, rows), [width for _, width in EXPORT_COLUMNS]
+        ) - 1
+        _write_sheet(archive, "xl/worksheets/sheet2.xml", [
+            ["Property", "Value"],
+            ["Company Name", company.company_name],
+            ["D-U-N-S Number", company.duns],
+            ["Export Date", datetime.now(timezone.utc).isoformat()],
+            ["Total Entities", total],
+            ["Data Source", data_source],
+            ["Instructions", "Use Level column to understand hierarchy. Negative levels = upward (parents), "
+                             "Positive levels = downward (subsidiaries)"],
+        ])
+
+
+def build_hierarchy_xlsx(rows: Iterable[Sequence[Any]], company: Any, data_source: str) -> SpooledTemporaryFile:
+    """Workbook in a spooled temp file (spills to disk past 8 MB), rewound for reading."""
+    target = SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    write_hierarchy_xlsx(target, rows, company, data_source)
+    target.seek(0)
+    return target
+
+
+def iter_file(handle, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    try:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        handle.close()
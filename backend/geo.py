@@ -0,0 +1,177 @@
+"""Radius and bounding-box search over company coordinates.
+
+``GeoGrid`` buckets coordinates into fixed-size latitude/longitude cells and
+keeps the row ids sorted by cell, so each latitude band of a query becomes a
+single contiguous slice found with ``searchsorted``. Candidates from those
+slices are filtered and ranked with vectorized haversine distances.
+
+Stored documents carry the same point as GeoJSON (``location``) for the
+``2dsphere`` index on ``cached_companies``.
+"""
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LATITUDE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def valid_coordinates(latitude: Optional[float], longitude: Optional[float]) -> bool:
+    return (
+        latitude is not None and longitude is not None
+        and -90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0
+    )
+
+
+def geojson_point(latitude: Optional[float], longitude: Optional[float]) -> Optional[Dict[str, Any]]:
+    """GeoJSON point (longitude first), or None for missing / out-of-range coordinates."""
+    if not valid_coordinates(latitude, longitude):
+        return None
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def bbox_polygon(bbox) -> Dict[str, Any]:
+    """Closed GeoJSON polygon for [west, south, east, north], for ``$geoWithin`` queries."""
+    min_longitude, min_latitude, max_longitude, max_latitude = bbox
+    ring = [
+        [min_longitude, min_latitude], [max_longitude, min_latitude], [max_longitude, max_latitude],
+        [min_longitude, max_latitude], [min_longitude, min_latitude],
+    ]
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def in_bbox(latitude: float, longitude: float, bbox) -> bool:
+    """Whether a point lies in a GeoJSON-ordered box [west, south, east, north]."""
+    west, south, east, north = bbox
+    if not south <= latitude <= north:
+        return False
+    if west <= east:
+        return west <= longitude <= east
+    # The box crosses the antimeridian
+    return longitude >= west or longitude <= east
+
+
+def bbox_center(bbox) -> Tuple[float, float]:
+    west, south, east, north = bbox
+    if east < west:
+        east += 360
+    return (south + north) / 2, ((west + east) / 2 + 180.0) % 360 - 180.0
+
+
+def distance_km(latitude: float, longitude: float, other_latitude: float, other_longitude: float) -> float:
+    """Great-circle distance between two points; scalar twin of ``haversine_km``."""
+    lat1, lat2 = math.radians(latitude), math.radians(other_latitude)
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin(math.radians(other_longitude - longitude) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from one point to arrays of points (degrees)."""
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoGrid:
+    """Grid index over (latitude, longitude) pairs; row id = position in the input."""
+
+    def __init__(self, points: Iterable[Tuple[Optional[float], Optional[float]]], cell_degrees: float = 0.5):
+        self.cell_degrees = cell_degrees
+        self._columns = int(math.ceil(360 / cell_degrees))
+        self._rows_count = int(math.ceil(180 / cell_degrees))
+        rows, latitudes, longitudes = [], [], []
+        for row, (latitude, longitude) in enumerate(points):
+            if valid_coordinates(latitude, longitude):
+                rows.append(row)
+                latitudes.append(latitude)
+                longitudes.append(longitude)
+        cells = self._cells(np.array(latitudes, dtype=np.float64), np.array(longitudes, dtype=np.float64))
+        order = np.argsort(cells, kind="stable")
+        self._cells_sorted = cells[order]
+        self._rows = np.array(rows, dtype=np.int64)[order]
+        self._latitudes = np.array(latitudes, dtype=np.float64)[order]
+        self._longitudes = np.array(longitudes, dtype=np.float64)[order]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _band(self, latitude) -> Any:
+        return np.clip(((np.asarray(latitude) + 90.0) // self.cell_degrees).astype(np.int64), 0, self._rows_count - 1)
+
+    def _column(self, longitude) -> Any:
+        return np.clip(((np.asarray(longitude) + 180.0) // self.cell_degrees).astype(np.int64), 0, self._columns - 1)
+
+    def _cells(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        return self._band(latitudes) * self._columns + self._column(longitudes)
+
+    def _candidates(self, min_latitude: float, max_latitude: float,
+                    longitude_ranges: List[Tuple[float, float]]) -> np.ndarray:
+        """Positions (into the sorted arrays) of every point in the covered cells."""
+        first_band, last_band = int(self._band(min_latitude)), int(self._band(max_latitude))
+        bands = np.arange(first_band, last_band + 1, dtype=np.int64)
+        slices = []
+        for west, east in longitude_ranges:
+            starts = np.searchsorted(self._cells_sorted, bands * self._columns + int(self._column(west)), "left")
+            ends = np.searchsorted(self._cells_sorted, bands * self._columns + int(self._column(east)), "right")
+            slices.extend(np.arange(start, end) for start, end in zip(starts, ends) if end > start)
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    @staticmethod
+    def _longitude_ranges(west: float, east: float) -> List[Tuple[float, float]]:
+        # A box crossing the antimeridian is split in two
+        if east - west >= 360:
+            return [(-180.0, 180.0)]
+        west = (west + 180.0) % 360 - 180.0
+        east = (east + 180.0) % 360 - 180.0
+        if west <= east:
+            return [(west, east)]
+        return [(west, 180.0), (-180.0, east)]
+
+    def radius(self, latitude: float, longitude: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, distances in km) within ``radius_km`` of the point, nearest first."""
+        if not len(self._rows) or not valid_coordinates(latitude, longitude):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        delta_latitude = radius_km / KM_PER_DEGREE_LATITUDE
+        min_latitude, max_latitude = max(-90.0, latitude - delta_latitude), min(90.0, latitude + delta_latitude)
+        # Near a pole (or for huge radii) every longitude is in range
+        widest = max(abs(min_latitude), abs(max_latitude))
+        if widest >= 89.9:
+            ranges = [(-180.0, 180.0)]
+        else:
+            delta_longitude = delta_latitude / math.cos(math.radians(widest))
+            ranges = self._longitude_ranges(longitude - delta_longitude, longitude + delta_longitude)
+        positions = self._candidates(min_latitude, max_latitude, ranges)
+        distances = haversine_km(latitude, longitude, self._latitudes[positions], self._longitudes[positions])
+        keep = distances <= radius_km
+        positions, distances = positions[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return self._rows[positions[order]], distances[order]
+
+    def bbox(self, bbox, center: Optional[Tuple[float, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, distances in km from ``center``) inside [west, south, east, north], nearest first.
+
+        ``center`` defaults to the middle of the box. A box whose west edge is
+        east of its east edge crosses the antimeridian.
+        """
+        if not len(self._rows):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        min_longitude, min_latitude, max_longitude, max_latitude = bbox
+        if max_longitude < min_longitude:
+            max_longitude += 360
+        ranges = self._longitude_ranges(min_longitude, max_longitude)
+        positions = self._candidates(min_latitude, max_latitude, ranges)
+        latitudes, longitudes = self._latitudes[positions], self._longitudes[positions]
+        inside_longitude = np.zeros(len(positions), dtype=bool)
+        for west, east in ranges:
+            inside_longitude |= (longitudes >= west) & (longitudes <= east)
+        keep = inside_longitude & (latitudes >= min_latitude) & (latitudes <= max_latitude)
+        positions = positions[keep]
+        center = center or bbox_center(bbox)
+        distances = haversine_km(center[0], center[1], self._latitudes[positions], self._longitudes[positions])
+        order = np.argsort(distances, kind="stable")
+        return self._rows[positions[order]], distances[order]
@@ -0,0 +1,269 @@
+"""Corporate family-tree engine.
+
+Family trees are stored as parent -> child edges, one document per child in
+the ``hierarchy_edges`` collection, and served from an in-memory adjacency
+graph. Queries are subtree (depth-limited), ancestor path, siblings and
+paged children, so a client can expand very large trees lazily.
+"""
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+HIERARCHY_EDGE_INDEXES = [
+    IndexModel([("child_duns", ASCENDING)], name="child_duns_unique", unique=True),
+    IndexModel([("parent_duns", ASCENDING), ("child_duns", ASCENDING)], name="parent_duns"),
+    IndexModel([("global_ultimate_duns", ASCENDING)], name="global_ultimate_duns"),
+]
+
+# Member fields kept on each node; the rest of a Company is not needed for tree views
+MEMBER_FIELDS = (
+    "duns", "primaryName", "legalName", "operatingStatus", "address", "phone",
+    "relationshipCode", "relationshipDescription", "hierarchyLevel",
+    "industry", "employeeCount", "salesVolume", "yearStarted", "legalForm",
+)
+
+
+def _member_dict(member: Any) -> Dict[str, Any]:
+    data = member.model_dump(exclude_none=True) if hasattr(member, "model_dump") else dict(member)
+    return {key: data[key] for key in MEMBER_FIELDS if key in data}
+
+
+def edges_from_company(company: Any) -> Tuple[List[Dict[str, Any]], List[Tuple[str, str]]]:
+    """Members and (parent, child) edges described by one company's hierarchy snapshot."""
+    members: List[Dict[str, Any]] = [{
+        "duns": company.duns,
+        "primaryName": company.company_name,
+        "legalName": company.legal_name,
+        "operatingStatus": company.operating_status,
+    }]
+    edges: List[Tuple[str, str]] = []
+    hierarchy = company.corporate_hierarchy
+    if not hierarchy:
+        return members, edges
+
+    if hierarchy.parent:
+        members.append(_member_dict(hierarchy.parent))
+        edges.append((hierarchy.parent.duns, company.duns))
+    for subsidiary in hierarchy.subsidiaries or []:
+        members.append(_member_dict(subsidiary))
+        edges.append((company.duns, subsidiary.duns))
+
+    # Flat family-tree listings come in depth-first order: a member's parent is
+    # the closest preceding member one level up
+    last_at_level: Dict[int, str] = {}
+    for member in hierarchy.familyTreeMembers or []:
+        members.append(_member_dict(member))
+        level = member.hierarchyLevel
+        if level is None:
+            continue
+        parent = last_at_level.get(level - 1)
+        if parent and parent != member.duns:
+            edges.append((parent, member.duns))
+        last_at_level[level] = member.duns
+    return members, edges
+
+
+class HierarchyGraph:
+    """In-memory adjacency graph of corporate family trees."""
+
+    def __init__(self):
+        self._members: Dict[str, Dict[str, Any]] = {}
+        self._parent: Dict[str, str] = {}
+        self._children: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def __contains__(self, duns: str) -> bool:
+        return duns in self._members
+
+    def clear(self) -> None:
+        self._members.clear()
+        self._parent.clear()
+        self._children.clear()
+
+    def replace(self, other: "HierarchyGraph") -> None:
+        """Take over the nodes and edges of ``other``, e.g. a graph rebuilt off the event loop."""
+        self._members, self._parent, self._children = other._members, other._parent, other._children
+
+    def add_member(self, member: Dict[str, Any]) -> None:
+        """Insert or enrich a node; fields already known are kept unless given again."""
+        existing = self._members.get(member["duns"])
+        if existing is None:
+            self._members[member["duns"]] = {key: value for key, value in member.items() if value is not None}
+        else:
+            existing.update({key: value for key, value in member.items() if value is not None})
+
+    def add_edge(self, parent: str, child: str) -> None:
+        if parent == child or self._parent.get(child) == parent:
+            return
+        if self._creates_cycle(parent, child):
+            logger.warning(f"Ignoring hierarchy edge {parent} -> {child}: it would create a cycle")
+            return
+        previous = self._parent.get(child)
+        if previous is not None:
+            self._children[previous].remove(child)
+        self._parent[child] = parent
+        self._children.setdefault(parent, []).append(child)
+        self._members.setdefault(parent, {"duns": parent})
+        self._members.setdefault(child, {"duns": child})
+
+    def remove_edge(self, parent: str, child: str) -> bool:
+        """Detach ``child`` from ``parent``; False when that edge is not in the graph."""
+        if self._parent.get(child) != parent:
+            return False
+        del self._parent[child]
+        self._children[parent].remove(child)
+        return True
+
+    def add_company(self, company: Any) -> List[Tuple[str, str]]:
+        members, edges = edges_from_company(company)
+        self.extend(members, edges)
+        return edges
+
+    def extend(self, members: Iterable[Dict[str, Any]], edges: Iterable[Tuple[str, str]]) -> None:
+        for member in members:
+            self.add_member(member)
+        for parent, child in edges:
+            self.add_edge(parent, child)
+
+    def export(self) -> Tuple[List[Dict[str, Any]], List[Tuple[str, str]]]:
+        """Members and (parent, child) edges; ``extend`` rebuilds the same graph from them."""
+        edges = [(parent, child) for parent, children in self._children.items() for child in children]
+        return list(self._members.values()), edges
+
+    # ----- queries -----
+
+    def node(self, duns: str) -> Optional[Dict[str, Any]]:
+        member = self._members.get(duns)
+        if member is None:
+            return None
+        return {
+            **member,
+            "parentDuns": self._parent.get(duns),
+            "childCount": len(self._children.get(duns, ())),
+        }
+
+    def children(self, duns: str, offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+        return self._page(self._children.get(duns, []), offset, limit)
+
+    def siblings(self, duns: str, offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+        parent = self._parent.get(duns)
+        siblings = self._children.get(parent, []) if parent else []
+        return self._page([sibling for sibling in siblings if sibling != duns], offset, limit)
+
+    def ancestors(self, duns: str) -> List[Dict[str, Any]]:
+        """Path from the direct parent up to the global ultimate."""
+        path = []
+        current = self._parent.get(duns)
+        while current is not None:
+            path.append(self.node(current))
+            current = self._parent.get(current)
+        return path
+
+    def root(self, duns: str) -> str:
+        while duns in self._parent:
+            duns = self._parent[duns]
+        return duns
+
+    def subtree(self, duns: str, max_depth: int = 2, max_nodes: int = 1000) -> Dict[str, Any]:
+        """Breadth-first slice of the tree below ``duns``.
+
+        Nodes at the depth or size limit report their ``childCount`` so the
+        client can expand them later with ``children``.
+        """
+        nodes = []
+        truncated = False
+        queue = deque([(duns, 0)])
+        while queue:
+            current, depth = queue.popleft()
+            if len(nodes) >= max_nodes:
+                truncated = True
+                break
+            nodes.append({**self.node(current), "depth": depth})
+            if depth < max_depth:
+                queue.extend((child, depth + 1) for child in self._children.get(current, ()))
+        return {"root": duns, "max_depth": max_depth, "nodes": nodes, "truncated": truncated}
+
+    def descendant_edges(self, duns: str) -> List[Tuple[str, str]]:
+        """Every (parent, child) edge below ``duns``, breadth first."""
+        edges = []
+        queue = deque([duns])
+        while queue:
+            current = queue.popleft()
+            for child in self._children.get(current, ()):
+                edges.append((current, child))
+                queue.append(child)
+        return edges
+
+    def _page(self, duns_list: List[str], offset: int, limit: int) -> Dict[str, Any]:
+        page = duns_list[offset:offset + limit]
+        return {
+            "items": [self.node(duns) for duns in page],
+            "total": len(duns_list),
+            "offset": offset,
+            "next_offset": offset + limit if offset + limit < len(duns_list) else None,
+        }
+
+    def _creates_cycle(self, parent: str, child: str) -> bool:
+        current = parent
+        while current is not None:
+            if current == child:
+                return True
+            current = self._parent.get(current)
+        return False
+
+    # ----- persistence -----
+
+    def edge_documents(self, edges: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        documents = []
+        for parent, child in edges:
+            member = self._members.get(child, {"duns": child})
+            documents.append({
+                "child_duns": child,
+                "parent_duns": parent,
+                "global_ultimate_duns": self.root(child),
+                "relationship_code": member.get("relationshipCode"),
+                "member": member,
+            })
+        return documents
+
+
+async def ensure_hierarchy_indexes(db) -> None:
+    await db.hierarchy_edges.create_indexes(HIERARCHY_EDGE_INDEXES)
+
+
+async def save_edges(collection, graph: HierarchyGraph, edges: Iterable[Tuple[str, str]], batch_size: int = 1000) -> int:
+    """Upsert edges (one document per child) with unordered bulk writes."""
+    operations = [
+        UpdateOne({"child_duns": document["child_duns"]}, {"$set": document}, upsert=True)
+        for document in graph.edge_documents(edges)
+    ]
+    for start in range(0, len(operations), batch_size):
+        await collection.bulk_write(operations[start:start + batch_size], ordered=False)
+    return len(operations)
+
+
+async def delete_edges(collection, edges: Iterable[Tuple[str, str]]) -> int:
+    """Remove stored edges, only where the child still hangs under that parent."""
+    edges = list(edges)
+    if not edges:
+        return 0
+    result = await collection.delete_many(
+        {"$or": [{"child_duns": child, "parent_duns": parent} for parent, child in edges]}
+    )
+    return result.deleted_count
+
+
+async def load_edges(collection, graph: HierarchyGraph, batch_size: int = 5000) -> int:
+    """Stream every stored edge into ``graph``."""
+    count = 0
+    async for document in collection.find({}, {"_id": 0}).batch_size(batch_size):
+        graph.add_member(document["member"])
+        graph.add_edge(document["parent_duns"], document["child_duns"])
+        count += 1
+    return count
@@ -0,0 +1,150 @@
+"""Conditional GET and server-side caching of encoded API responses.
+
+Responses are encoded once to bytes (see ``responses``) and tagged with an ETag derived from
+those bytes, or from the documents they hold less their ``VOLATILE_FIELDS``
+(see ``persistence``) where a body also carries when it was searched or
+last confirmed, so the same content always carries the same tag. The tags
+are weak (``W/"..."``): the body bytes differ between encodes by those
+timestamps and between the identity and compressed variants, which share
+one tag. A request whose ``If-None-Match`` names the current tag gets
+``304 Not Modified`` without a body. ``ResponseCache`` keeps recently encoded bodies (keyed by
+DUNS or normalized search criteria) so repeat views skip both the lookup
+and the serialization (and compression, which is kept per entry); entries
+are dropped per DUNS when a company changes.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from persistence import content_hash
+from responses import encoded_response
+
+
+def content_etag(body: bytes) -> str:
+    """Weak ETag over the identity-encoded ``body``."""
+    return 'W/"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def documents_etag(documents: Iterable[Dict[str, Any]]) -> str:
+    """Weak ETag over the business content of ``documents``, in order; timestamps and other volatile fields left out."""
+    digest = hashlib.sha256()
+    for document in documents:
+        digest.update(content_hash(document).encode("ascii"))
+    return 'W/"' + digest.hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether ``If-None-Match`` names ``etag``; weak comparison, as RFC 9110 asks for this header."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def conditional_response(request: Request, body: bytes, etag: str, cache_control: str,
+                         media_type: str = "application/json",
+                         compressed: Optional[Dict[str, bytes]] = None) -> Response:
+    """``body`` with its validators, or an empty 304 when the client already has it."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return encoded_response(request, body, headers, media_type=media_type, compressed=compressed)
+
+
+def normalized_criteria(criteria: Dict[str, Any]) -> str:
+    """Cache key for search criteria: unset, empty and false values dropped, keys sorted."""
+    supplied = {key: value for key, value in criteria.items() if value not in (None, "", False, [])}
+    return json.dumps(supplied, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "media_type", "expires_at", "duns", "compressed")
+
+    def __init__(self, body: bytes, media_type: str, expires_at: float, duns: Set[str], etag: Optional[str] = None):
+        self.body = body
+        self.etag = etag or content_etag(body)
+        self.media_type = media_type
+        self.expires_at = expires_at
+        self.duns = duns
+        self.compressed: Dict[str, bytes] = {}
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        return conditional_response(request, self.body, self.etag, cache_control, self.media_type, self.compressed)
+
+
+class ResponseCache:
+    """LRU of encoded responses with a TTL, invalidated by the DUNS they contain."""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._keys_by_duns: Dict[str, Set[str]] = {}
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.time():
+            if entry is not None:
+                self._drop(key)
+            self.counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return entry
+
+    def put(self, key: str, body: bytes, duns: Iterable[str] = (), media_type: str = "application/json",
+            etag: Optional[str] = None) -> CachedResponse:
+        """Cache ``body``; its ETag is ``etag`` when given, else derived from the bytes."""
+        if key in self._entries:
+            self._drop(key)
+        entry = CachedResponse(body, media_type, time.time() + self.ttl, set(duns), etag)
+        self._entries[key] = entry
+        for value in entry.duns:
+            self._keys_by_duns.setdefault(value, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.counters["evictions"] += 1
+        return entry
+
+    def invalidate(self, duns: str) -> None:
+        """Drop every response that contains ``duns``."""
+        for key in list(self._keys_by_duns.get(duns, ())):
+            self._drop(key)
+            self.counters["invalidations"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_duns.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hit_ratio": self.counters["hits"] / lookups if lookups else None,
+        }
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for value in entry.duns:
+            keys = self._keys_by_duns.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_duns[value]
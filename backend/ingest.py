@@ -0,0 +1,293 @@
+"""Offline bulk ingestion of D&B extracts into ``cached_companies``.
+
+The extract is streamed in chunks. Worker processes validate each chunk
+against the ``Company`` model (hierarchy members included) and extract the
+family-tree edges; the main process writes companies with unordered bulk
+upserts (unchanged content is not rewritten) and edges into
+``hierarchy_edges``. Progress is checkpointed after every chunk that
+completes in order, so an interrupted run resumes where it stopped.
+
+    cd backend && python -m ingest extract.jsonl [--format csv] [--layout dnb] [--workers 8]
+
+JSONL lines and CSV rows hold either our company documents (``company``
+layout; CSV headers use dotted paths such as ``address.city``) or D&B
+Direct+ data block responses (``dnb`` layout).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from hierarchy import HierarchyGraph, edges_from_company, ensure_hierarchy_indexes, load_edges, save_edges
+from persistence import bulk_upsert_companies, ensure_indexes
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("jsonl", "csv")
+LAYOUTS = ("company", "dnb")
+# Invalid records logged per run; the rest are only counted
+MAX_LOGGED_ERRORS = 20
+
+
+def unflatten(row: Dict[str, Any]) -> Dict[str, Any]:
+    """CSV row to a nested document: dotted headers become nested objects,
+    cells holding a JSON array or object are decoded, empty cells are dropped."""
+    document: Dict[str, Any] = {}
+    for key, value in row.items():
+        if key is None or value is None or value == "":
+            continue
+        if value[0] in "[{":
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        target = document
+        *parents, field = key.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[field] = value
+    return document
+
+
+def iter_chunks(path: Path, fmt: str, chunk_size: int, skip: int = 0) -> Iterator[Tuple[int, List[Any]]]:
+    """(number of the first record, records) chunks; the first ``skip`` records are passed over.
+
+    JSONL records stay undecoded bytes so parsing happens in the workers.
+    """
+    if fmt == "csv":
+        handle = open(path, newline="", encoding="utf-8")
+        records: Iterator[Any] = csv.DictReader(handle)
+    else:
+        handle = open(path, "rb")
+        records = (line for line in handle if line.strip())
+    with handle:
+        number = 0
+        chunk: List[Any] = []
+        for record in records:
+            number += 1
+            if number <= skip:
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield number - len(chunk), chunk
+                chunk = []
+        if chunk:
+            yield number - len(chunk), chunk
+
+
+# ----- worker processes -----
+
+_convert: Optional[Callable[[Any], Any]] = None
+
+
+def _init_worker(fmt: str, layout: str) -> None:
+    """Import the API models once per worker process."""
+    global _convert
+    import server
+    # The server's request logging is not wanted in every worker
+    logging.getLogger().setLevel(logging.WARNING)
+
+    def convert(record: Any) -> Any:
+        if layout == "dnb":
+            payload = unflatten(record) if fmt == "csv" else json.loads(record)
+            company = server.company_from_dnb(payload)
+            if company is None:
+                raise ValueError("no organization.duns in record")
+            return company
+        if fmt == "csv":
+            return server.Company.model_validate(unflatten(record))
+        # Parsed and validated in one pass by pydantic-core
+        return server.Company.model_validate_json(record)
+
+    _convert = convert
+
+
+def validate_chunk(first: int, records: List[Any]) -> Dict[str, Any]:
+    """Validate one chunk; returns storage documents, hierarchy members and edges, and errors."""
+    documents, members, edges, errors = [], [], [], []
+    for number, record in enumerate(records, first + 1):
+        try:
+            company = _convert(record)
+        except Exception as e:
+            # Validation errors span several lines; the first two name the model and field
+            errors.append((number, " ".join(str(e).splitlines()[:2])))
+            continue
+        documents.append(company.model_dump())
+        company_members, company_edges = edges_from_company(company)
+        members.extend(company_members)
+        edges.extend(company_edges)
+    return {"documents": documents, "members": members, "edges": edges, "errors": errors}
+
+
+# ----- checkpoints -----
+
+class IngestCheckpoint:
+    """Records ingested so far for one source file, saved atomically as JSON."""
+
+    def __init__(self, path: Path, source: Path):
+        self.path = path
+        self.source = str(source.resolve())
+        self.state: Dict[str, Any] = {"source": self.source, "records": 0}
+
+    def load(self) -> Dict[str, Any]:
+        self.state = {"source": self.source, "records": 0}
+        if self.path.exists():
+            state = json.loads(self.path.read_text())
+            if state.get("source") != self.source:
+                raise ValueError(f"Checkpoint {self.path} belongs to {state.get('source')}, not {self.source}")
+            self.state = state
+        return self.state
+
+    def save(self, **state) -> None:
+        self.state.update(state)
+        temporary = self.path.with_suffix(self.path.suffix + ".tmp")
+        temporary.write_text(json.dumps(self.state, indent=2))
+        os.replace(temporary, self.path)
+
+
+# ----- pipeline -----
+
+async def ingest_file(
+    path: Path,
+    db,
+    *,
+    fmt: str = "jsonl",
+    layout: str = "company",
+    workers: int = 4,
+    chunk_size: int = 5000,
+    batch_size: int = 1000,
+    checkpoint: Optional[IngestCheckpoint] = None,
+) -> Dict[str, Any]:
+    """Ingest one extract into ``db``; returns the run counters and throughput."""
+    await ensure_indexes(db)
+    await ensure_hierarchy_indexes(db)
+    state = checkpoint.load() if checkpoint else {"records": 0}
+    resumed_from = state["records"]
+    counters = {key: state.get(key, 0) for key in ("written", "unchanged", "invalid", "edges")}
+
+    # Stored edges seed the graph so global ultimates span earlier runs and chunks
+    graph = HierarchyGraph()
+    await load_edges(db.hierarchy_edges, graph)
+
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    processed = 0
+    logged_errors = 0
+    # Chunks validate and write concurrently but are checkpointed in file order
+    finished: Dict[int, int] = {}
+    committed = resumed_from
+
+    async def process(first: int, records: List[Any]) -> None:
+        nonlocal processed, logged_errors
+        result = await loop.run_in_executor(executor, validate_chunk, first, records)
+        for number, error in result["errors"]:
+            if logged_errors < MAX_LOGGED_ERRORS:
+                logger.warning(f"Record {number} rejected: {error}")
+                logged_errors += 1
+        written = await bulk_upsert_companies(db.cached_companies, result["documents"], batch_size)
+        for member in result["members"]:
+            graph.add_member(member)
+        for parent, child in result["edges"]:
+            graph.add_edge(parent, child)
+        counters["edges"] += await save_edges(db.hierarchy_edges, graph, result["edges"], batch_size)
+        counters["written"] += written["written"]
+        counters["unchanged"] += written["unchanged"]
+        counters["invalid"] += len(result["errors"])
+        processed += len(records)
+        finished[first] = len(records)
+
+    def advance_checkpoint() -> None:
+        nonlocal committed
+        advanced = False
+        while committed in finished:
+            committed += finished.pop(committed)
+            advanced = True
+        if advanced:
+            rate = processed / max(time.monotonic() - started, 1e-9)
+            if checkpoint:
+                checkpoint.save(records=committed, **counters)
+            logger.info(f"Ingested {committed} records ({rate:.0f} records/s)")
+
+    in_flight = set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(fmt, layout)) as executor:
+        try:
+            for first, records in iter_chunks(path, fmt, chunk_size, resumed_from):
+                in_flight.add(asyncio.ensure_future(process(first, records)))
+                # Bounded read-ahead: at most two chunks per worker in flight
+                if len(in_flight) >= workers * 2:
+                    done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                    advance_checkpoint()
+            if in_flight:
+                done, _ = await asyncio.wait(in_flight)
+                in_flight = set()
+                for task in done:
+                    task.result()
+                advance_checkpoint()
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    elapsed = time.monotonic() - started
+    return {
+        **counters,
+        "records": committed,
+        "processed": processed,
+        "resumed_from": resumed_from,
+        "elapsed_s": round(elapsed, 2),
+        "records_per_second": round(processed / elapsed, 1) if elapsed else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-load a D&B extract into cached_companies.")
+    parser.add_argument("path", type=Path, help="JSONL or CSV extract")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    parser.add_argument("--layout", choices=LAYOUTS, default="company",
+                        help="company documents (default) or D&B Direct+ responses")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="validation processes")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="records per validation chunk")
+    parser.add_argument("--batch-size", type=int, default=1000, help="operations per bulk write")
+    parser.add_argument("--checkpoint", type=Path,
+                        help="checkpoint file (default: <path>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent / '.env')
+    fmt = args.format or ("csv" if args.path.suffix.lower() == ".csv" else "jsonl")
+    checkpoint_path = args.checkpoint or args.path.with_name(args.path.name + ".checkpoint.json")
+    if args.restart and checkpoint_path.exists():
+        checkpoint_path.unlink()
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        summary = asyncio.run(ingest_file(
+            args.path,
+            client[os.environ["DB_NAME"]],
+            fmt=fmt,
+            layout=args.layout,
+            workers=max(1, args.workers),
+            chunk_size=args.chunk_size,
+            batch_size=args.batch_size,
+            checkpoint=IngestCheckpoint(checkpoint_path, args.path),
+        ))
+    finally:
+        client.close()
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""Request timings, hot-path spans and Prometheus metrics.
+
+``TimingMiddleware`` times every HTTP request into a histogram labelled by
+method, route template and status class, and reports the spans recorded
+while handling it in a ``Server-Timing`` header. ``span`` times a block of
+code (an index lookup, a database round-trip, an encode step) into a
+per-span histogram. ``MetricsRegistry.render`` produces the Prometheus text
+exposition format for a ``/metrics`` endpoint, so no client library is
+needed.
+
+With profiling enabled, a request carrying ``X-Profile: 1`` is sampled by
+``SamplingProfiler``; the collapsed stacks (flame graph input) are kept in
+a ``ProfileStore`` under the id returned in ``X-Profile-Id``.
+"""
+import bisect
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Seconds; request and span latencies from well under a millisecond up to timeouts
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label combination."""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _labels(self.labelnames, labels, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """Counter or gauge read from application state at scrape time.
+
+    ``read`` returns a number, or with ``label`` a dict of label value -> number.
+    """
+
+    def __init__(self, name: str, kind: str, help: str, read: Callable[[], Any], label: Optional[str] = None):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.read = read
+        self.label = label
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.read()
+        if self.label is None:
+            lines.append(f"{self.name} {_number(value)}")
+        else:
+            for key, item in sorted(value.items()):
+                if isinstance(item, (int, float)) and not isinstance(item, bool):
+                    lines.append(f'{self.name}{{{self.label}="{_escape(str(key))}"}} {_number(item)}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        histogram = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(histogram)
+        return histogram
+
+    def callback(self, name: str, kind: str, help: str, read: Callable[[], Any], label: Optional[str] = None) -> None:
+        self._metrics.append(CallbackMetric(name, kind, help, read, label))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request", ("method", "route", "status")
+)
+SPAN_DURATION = REGISTRY.histogram("app_span_duration_seconds", "Time spent in an instrumented code path", ("span",))
+
+# (name, seconds) spans of the request being handled
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the block into ``app_span_duration_seconds`` and the request's Server-Timing header."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_DURATION.observe(elapsed, name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, elapsed))
+
+
+# ----- sampling profiler -----
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every ``interval`` seconds from a helper thread.
+
+    The event loop is shared, so samples also include other requests running
+    concurrently with the profiled one. The sampler needs the GIL, so busy
+    code is sampled about once per interpreter switch interval (5 ms) at best.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+
+class ProfileStore:
+    """The most recent request profiles, by id."""
+
+    def __init__(self, max_profiles: int = 20, interval: float = 0.005):
+        self.max_profiles = max_profiles
+        self.interval = interval
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def add(self, path: str, elapsed: float, stacks: Counter) -> str:
+        profile_id = uuid.uuid4().hex[:16]
+        self._profiles[profile_id] = {
+            "id": profile_id,
+            "path": path,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "samples": sum(stacks.values()),
+            "stacks": stacks,
+        }
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [{key: value for key, value in profile.items() if key != "stacks"}
+                for profile in reversed(self._profiles.values())]
+
+    @staticmethod
+    def collapsed(profile: Dict[str, Any]) -> str:
+        """Brendan Gregg's collapsed-stack format, one "frame;frame count" line per stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].most_common())
+
+
+# ----- middleware -----
+
+class TimingMiddleware:
+    """ASGI middleware timing each HTTP request; see the module docstring."""
+
+    def __init__(self, app, profiles: Optional[ProfileStore] = None):
+        self.app = app
+        self.profiles = profiles
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        spans: List[Tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        status = [500]
+        profiler = None
+        if self.profiles is not None and (b"x-profile", b"1") in scope.get("headers", ()):
+            profiler = SamplingProfiler(threading.get_ident(), self.profiles.interval).start()
+        profile_id = None
+
+        async def send_with_timing(message):
+            nonlocal profile_id
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                elapsed = time.perf_counter() - started
+                timings = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in spans]
+                timings.append(f"app;dur={elapsed * 1000:.3f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(timings).encode("latin-1")))
+                if profiler is not None:
+                    profile_id = self.profiles.add(scope["path"], elapsed, profiler.stop())
+                    headers.append((b"x-profile-id", profile_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if profiler is not None and profile_id is None:
+                profiler.stop()
+            route = scope.get("route")
+            REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                f"{status[0] // 100}xx",
+            )
+            _request_spans.reset(token)
@@ -0,0 +1,180 @@
+"""Fuzzy company-name matching.
+
+Names are normalized (diacritics, punctuation and trailing legal forms
+removed) and indexed as TF-IDF weighted character trigrams, stored as
+NumPy posting arrays per trigram. A query only touches the postings of its
+own trigrams and the cosine similarity of every candidate is accumulated
+in one vectorized pass, so "Apple Incorporated" finds "Apple Inc." and a
+typo such as "Microsfot" still ranks "Microsoft Corporation" first.
+"""
+import math
+import re
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Legal forms dropped from the end of a name; dotted forms such as "S.A."
+# are covered because dots are removed before tokenizing
+LEGAL_SUFFIXES = frozenset({
+    "ab", "ag", "as", "asa", "bhd", "bv", "co", "company", "corp", "corporation",
+    "eurl", "gmbh", "inc", "incorporated", "kg", "kk", "limited", "llc", "llp",
+    "lp", "ltd", "nv", "oy", "plc", "pte", "pty", "sa", "sarl", "sas", "sasu",
+    "sdn", "spa", "srl",
+})
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# (minimum score, confidence code, match quality); codes follow the D&B 1-10 scale
+CONFIDENCE_BANDS = (
+    (0.99, 10, "Excellent"),
+    (0.90, 9, "Excellent"),
+    (0.80, 8, "Good"),
+    (0.70, 7, "Good"),
+    (0.60, 6, "Fair"),
+    (0.50, 5, "Fair"),
+    (0.40, 4, "Poor"),
+    (0.30, 3, "Poor"),
+    (0.20, 2, "Poor"),
+)
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Comparable form of a company name, e.g. "Société Générale S.A." -> "societe generale"."""
+    if not name:
+        return ""
+    if name.isascii():
+        text = name.lower()
+    else:
+        decomposed = unicodedata.normalize("NFKD", name)
+        text = "".join(char for char in decomposed if not unicodedata.combining(char)).lower()
+    text = text.replace("&", " and ").replace(".", "").replace("'", "")
+    tokens = _NON_ALNUM.sub(" ", text).split()
+    if tokens and tokens[0] == "the" and len(tokens) > 1:
+        tokens = tokens[1:]
+    # A name made only of legal forms keeps its last token
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def name_trigrams(normalized: str) -> Counter:
+    """Trigram counts of a normalized name, padded so word boundaries count too."""
+    padded = f" {normalized} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def confidence_from_score(score: float) -> Tuple[int, str]:
+    for minimum, code, quality in CONFIDENCE_BANDS:
+        if score >= minimum:
+            return code, quality
+    return 1, "Poor"
+
+
+class NameMatcher:
+    """TF-IDF cosine matcher over a fixed list of names (row id = list index)."""
+
+    def __init__(self, names: Iterable[Optional[str]], max_postings: int = 250000):
+        self.max_postings = max_postings
+        self.size = 0
+        self._vocabulary: Dict[str, int] = {}
+        gram_ids = array("q")
+        rows = array("q")
+        counts = array("q")
+        for row, name in enumerate(names):
+            normalized = normalize_name(name)
+            self.size = row + 1
+            if not normalized:
+                continue
+            for gram, count in name_trigrams(normalized).items():
+                gram_ids.append(self._vocabulary.setdefault(gram, len(self._vocabulary)))
+                rows.append(row)
+                counts.append(count)
+        self._build(
+            np.frombuffer(gram_ids, dtype=np.int64),
+            np.frombuffer(rows, dtype=np.int64),
+            np.frombuffer(counts, dtype=np.int64),
+        )
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _build(self, gram_ids: np.ndarray, rows: np.ndarray, counts: np.ndarray) -> None:
+        size = self.size
+        vocabulary_size = len(self._vocabulary)
+        # Rows were added in order, so a stable sort gives postings by trigram, then row
+        order = np.argsort(gram_ids, kind="stable")
+        gram_of, row_of, term_counts = gram_ids[order], rows[order], counts[order]
+
+        document_frequency = np.bincount(gram_of, minlength=vocabulary_size)
+        self._idf = np.log((1 + size) / (1 + document_frequency)) + 1.0
+        self._unseen_idf = math.log(1 + size) + 1.0
+        weights = (1.0 + np.log(term_counts)) * self._idf[gram_of]
+        norms = np.sqrt(np.bincount(row_of, weights=weights * weights, minlength=size))
+        weights /= norms[row_of]
+
+        self._indptr = np.zeros(vocabulary_size + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=self._indptr[1:])
+        self._posting_rows = row_of.astype(np.int32)
+        self._posting_weights = weights.astype(np.float32)
+
+    def _query_vector(self, normalized: str) -> Dict[str, float]:
+        vector = {}
+        for gram, count in name_trigrams(normalized).items():
+            gram_id = self._vocabulary.get(gram)
+            idf = self._idf[gram_id] if gram_id is not None else self._unseen_idf
+            vector[gram] = (1.0 + math.log(count)) * idf
+        return vector
+
+    def similarity(self, name: str, other: str) -> float:
+        """Cosine score between two names, weighted like ``match`` scores."""
+        left = self._query_vector(normalize_name(name)) if name else {}
+        right = self._query_vector(normalize_name(other)) if other else {}
+        if not left or not right:
+            return 0.0
+        dot = sum(weight * right[gram] for gram, weight in left.items() if gram in right)
+        norm = math.sqrt(sum(w * w for w in left.values())) * math.sqrt(sum(w * w for w in right.values()))
+        return min(1.0, round(dot / norm, 4))
+
+    def match(self, name: str, limit: Optional[int] = 25, min_score: float = 0.3) -> List[Tuple[int, float]]:
+        """Best (row, score) pairs for ``name``, highest score first; ``limit=None`` keeps all."""
+        normalized = normalize_name(name)
+        if not normalized or not self.size:
+            return []
+        query = self._query_vector(normalized)
+        known = [(self._vocabulary[gram], weight) for gram, weight in query.items() if gram in self._vocabulary]
+        if not known:
+            return []
+        query_norm = math.sqrt(sum(weight * weight for weight in query.values()))
+
+        # Rarest trigrams first; very common ones are skipped once the posting
+        # budget is spent, they carry little weight anyway
+        known.sort(key=lambda item: self._indptr[item[0] + 1] - self._indptr[item[0]])
+        row_chunks, weight_chunks = [], []
+        budget = self.max_postings
+        for gram_id, weight in known:
+            start, end = self._indptr[gram_id], self._indptr[gram_id + 1]
+            if row_chunks and end - start > budget:
+                break
+            budget -= end - start
+            row_chunks.append(self._posting_rows[start:end])
+            weight_chunks.append(self._posting_weights[start:end] * np.float32(weight / query_norm))
+
+        candidate_rows = np.concatenate(row_chunks)
+        contributions = np.concatenate(weight_chunks)
+        if len(candidate_rows) * 8 < self.size:
+            rows, inverse = np.unique(candidate_rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=contributions)
+        else:
+            scores = np.bincount(candidate_rows, weights=contributions, minlength=self.size)
+            rows = np.flatnonzero(scores >= min_score)
+            scores = scores[rows]
+        keep = scores >= min_score
+        rows, scores = rows[keep], scores[keep]
+        if limit is not None and len(rows) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            rows, scores = rows[top], scores[top]
+        order = np.lexsort((rows, -scores))
+        return [(int(rows[i]), min(1.0, round(float(scores[i]), 4))) for i in order]
@@ -0,0 +1,256 @@
+"""Batched persistence of company documents into ``cached_companies``.
+
+Upserts are grouped into unordered ``bulk_write`` batches. Documents whose
+content hash matches the stored one are not rewritten; only their access
+fields (``last_updated`` and ``search_criteria``) are touched so the recent
+companies list stays accurate. ``fetched_at`` records when the content was
+last written or confirmed by its source, so it is not bumped by searches.
+``CompanyWriteBehind`` moves this work off the request path behind a
+bounded queue.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel, UpdateOne
+from pymongo.errors import OperationFailure
+
+from catalog import normalize_registration
+from geo import geojson_point
+
+logger = logging.getLogger(__name__)
+
+# Fields that change on every write without the company itself changing
+VOLATILE_FIELDS = {"_id", "id", "last_updated", "search_criteria", "content_hash", "fetched_at", "refresh_after"}
+# Storage-only fields left out when documents are read back as companies
+DOCUMENT_PROJECTION = {
+    "_id": 0, "content_hash": 0, "fetched_at": 0, "location": 0, "registration_keys": 0, "refresh_after": 0,
+}
+# Per-search result fields that are never stored
+RESULT_ONLY_FIELDS = ("distance_km",)
+ACCESS_FIELDS = ("last_updated", "search_criteria")
+
+
+# Indexes backing DUNS lookups, the recent-companies list and the search fields
+CACHED_COMPANY_INDEXES = [
+    IndexModel([("duns", ASCENDING)], name="duns_unique", unique=True),
+    IndexModel([("last_updated", DESCENDING), ("duns", DESCENDING)], name="last_updated_desc"),
+    # The delta refresh selects documents by how long ago their source confirmed them
+    IndexModel([("fetched_at", ASCENDING)], name="fetched_at"),
+    # Registration numbers without formatting, as bulk resolution looks them up
+    IndexModel([("registration_keys", ASCENDING)], name="registration_keys"),
+    IndexModel([("company_name", ASCENDING)], name="company_name"),
+    IndexModel(
+        [("address.continent", ASCENDING), ("address.country", ASCENDING), ("address.city", ASCENDING)],
+        name="address_geography",
+    ),
+    IndexModel([("address.country", ASCENDING), ("address.postal_code", ASCENDING)], name="address_postal_code"),
+    # 2dsphere indexes skip documents without a location
+    IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+]
+
+# Fields returned for list views; full documents are fetched per DUNS
+COMPANY_SUMMARY_PROJECTION = {
+    "_id": 0,
+    "duns": 1,
+    "company_name": 1,
+    "operating_status": 1,
+    "address.city": 1,
+    "address.country": 1,
+    "last_updated": 1,
+    "search_criteria": 1,
+}
+
+
+async def ensure_indexes(db) -> None:
+    """Create the collection indexes; safe to call on every startup."""
+    try:
+        await db.cached_companies.create_indexes(CACHED_COMPANY_INDEXES)
+    except OperationFailure as e:
+        # e.g. duplicate DUNS written before the unique index existed
+        logger.error(f"Could not create cached_companies indexes: {str(e)}")
+
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    """Opaque keyset cursor pointing just after ``document``."""
+    last_updated = document["last_updated"]
+    if isinstance(last_updated, datetime):
+        last_updated = last_updated.isoformat()
+    raw = json.dumps([last_updated, document["duns"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of ``encode_cursor``; raises ValueError on a malformed cursor."""
+    try:
+        last_updated, duns = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        timestamp = datetime.fromisoformat(last_updated)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(duns, str):
+        raise ValueError("Invalid cursor")
+    if timestamp.tzinfo is not None:
+        # Mongo stores naive UTC datetimes
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp, duns
+
+
+def keyset_filter(cursor: Optional[str]) -> Dict[str, Any]:
+    """Filter selecting documents after ``cursor`` in (last_updated, duns) descending order."""
+    if not cursor:
+        return {}
+    last_updated, duns = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"last_updated": {"$lt": last_updated}},
+            {"last_updated": last_updated, "duns": {"$lt": duns}},
+        ]
+    }
+
+
+def storage_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Document as stored: result-only fields dropped, address coordinates
+    added as a GeoJSON ``location`` for the 2dsphere index and registration
+    numbers as normalized ``registration_keys`` (e.g. "94-2404110" -> "942404110")."""
+    stored = {key: value for key, value in document.items() if key not in RESULT_ONLY_FIELDS}
+    address = stored.get("address") or {}
+    location = geojson_point(address.get("latitude"), address.get("longitude"))
+    if location is not None:
+        stored["location"] = location
+    keys = sorted({normalize_registration(registration.get("number"))
+                   for registration in stored.get("registration_numbers") or []} - {""})
+    if keys:
+        stored["registration_keys"] = keys
+    return stored
+
+
+def content_hash(document: Dict[str, Any]) -> str:
+    """Stable digest of the business content of a company document."""
+    content = {key: value for key, value in document.items() if key not in VOLATILE_FIELDS}
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+async def bulk_upsert_companies(
+    collection, documents: Iterable[Dict[str, Any]], batch_size: int = 500, fetched: bool = False
+) -> Dict[str, int]:
+    """Upsert company documents by DUNS, skipping rewrites of unchanged content.
+
+    ``fetched`` says the documents were just loaded from their source, so
+    ``fetched_at`` is bumped even where the content is unchanged.
+    """
+    now = datetime.now(timezone.utc)
+    by_duns: Dict[str, Dict[str, Any]] = {}
+    for document in documents:
+        by_duns[document["duns"]] = storage_document(document)
+    if not by_duns:
+        return {"written": 0, "unchanged": 0}
+
+    stored_hashes = {
+        doc["duns"]: doc.get("content_hash")
+        async for doc in collection.find(
+            {"duns": {"$in": list(by_duns)}}, {"_id": 0, "duns": 1, "content_hash": 1}
+        )
+    }
+
+    operations: List[UpdateOne] = []
+    unchanged = 0
+    for duns, document in by_duns.items():
+        digest = content_hash(document)
+        if stored_hashes.get(duns) == digest:
+            unchanged += 1
+            touched = {field: document[field] for field in ACCESS_FIELDS if document.get(field) is not None}
+            if fetched:
+                touched["fetched_at"] = now
+            if touched:
+                operations.append(UpdateOne({"duns": duns}, {"$set": touched}))
+        else:
+            operations.append(UpdateOne(
+                {"duns": duns}, {"$set": {**document, "content_hash": digest, "fetched_at": now}}, upsert=True
+            ))
+
+    for start in range(0, len(operations), batch_size):
+        await collection.bulk_write(operations[start:start + batch_size], ordered=False)
+    return {"written": len(by_duns) - unchanged, "unchanged": unchanged}
+
+
+class CompanyWriteBehind:
+    """Bounded background queue that flushes company upserts in batches.
+
+    A batch is flushed when it reaches ``batch_size`` documents or when
+    ``flush_interval`` seconds have passed since its first document.
+    ``enqueue`` waits when the queue is full, which applies backpressure
+    to the request path instead of growing without bound.
+    """
+
+    def __init__(self, collection, *, max_queue: int = 10000, batch_size: int = 500, flush_interval: float = 1.0):
+        self.collection = collection
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"enqueued": 0, "written": 0, "unchanged": 0, "batches": 0, "errors": 0}
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def enqueue(self, documents: Iterable[Dict[str, Any]]) -> None:
+        for document in documents:
+            await self._queue.put(document)
+            self.counters["enqueued"] += 1
+
+    async def close(self) -> None:
+        """Flush everything still queued, then stop the worker."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "queued": self._queue.qsize() if self._queue else 0}
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    document = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if document is None:
+                    stopping = True
+                    break
+                batch.append(document)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            result = await bulk_upsert_companies(self.collection, batch, self.batch_size)
+            self.counters["written"] += result["written"]
+            self.counters["unchanged"] += result["unchanged"]
+            self.counters["batches"] += 1
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"Write-behind flush of {len(batch)} companies failed: {str(e)}")
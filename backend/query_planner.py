@@ -0,0 +1,291 @@
+"""Query planner for unified search.
+
+Every supplied criterion must match (AND). The planner intersects catalog
+index lookups from the most selective index down, stops using indexes once
+the candidate set is small, and checks the remaining criteria against the
+candidate companies themselves. Each stage is recorded with its candidate
+count and timing so a slow query can be explained.
+"""
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from catalog import (
+    CompanyCatalog, normalize_continent, normalize_registration, normalize_text, phone_matches, phone_query,
+)
+from geo import bbox_center, distance_km, in_bbox, valid_coordinates
+
+# Criteria with a catalog index, most selective first
+INDEX_ORDER = (
+    "local_identifier", "company_name", "postal_code", "phone_fax", "radius_km", "bbox",
+    "city", "country", "continent", "has_phone", "has_fax",
+)
+# Presence flags are bitmaps, applied to the candidates rather than intersected as sets
+PRESENCE_CRITERIA = ("has_phone", "has_fax")
+# Every criterion the planner understands, in the order residual filters run
+CRITERIA = ("duns",) + INDEX_ORDER + ("state", "address")
+
+
+def supplied_criteria(criteria: Dict[str, Any]) -> Dict[str, Any]:
+    """Criteria that take part in the search; empty strings and false flags do not."""
+    return {key: criteria[key] for key in CRITERIA if criteria.get(key)}
+
+
+def geo_center(criteria: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """Point distances are measured from: the given coordinates, else the middle of the box."""
+    if valid_coordinates(criteria.get("latitude"), criteria.get("longitude")):
+        return criteria["latitude"], criteria["longitude"]
+    if criteria.get("bbox"):
+        return bbox_center(criteria["bbox"])
+    return None
+
+
+def _address_field(company: Any, field: str) -> str:
+    return normalize_text(getattr(company.address, field, None)) if company.address else ""
+
+
+def _distance(company: Any, center: Tuple[float, float]) -> Optional[float]:
+    address = company.address
+    if not address or not valid_coordinates(address.latitude, address.longitude):
+        return None
+    return distance_km(center[0], center[1], address.latitude, address.longitude)
+
+
+class SearchPlan:
+    """Planned search: ordered (match, name score, distance km) entries plus the explain stages.
+
+    A match is a catalog row, turned into a company only when iterated, or a
+    company that was fetched directly.
+    """
+
+    def __init__(self, criteria: Dict[str, Any], materialize: Callable[[Any], Any] = lambda match: match):
+        self.criteria = criteria
+        self.materialize = materialize
+        self.stages: List[Dict[str, Any]] = []
+        self.matches: List[Tuple[Any, Optional[float], Optional[float]]] = []
+
+    def iter_matches(self) -> Iterator[Tuple[Any, Optional[float], Optional[float]]]:
+        for match, score, distance in self.matches:
+            yield self.materialize(match), score, distance
+
+    def record(self, stage: str, criterion: str, candidates: int, started: float, **details) -> None:
+        self.stages.append({
+            "stage": stage,
+            "criterion": criterion,
+            **details,
+            "candidates": candidates,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        })
+
+    def explain(self) -> Dict[str, Any]:
+        return {"criteria": sorted(self.criteria), "stages": self.stages, "results": len(self.matches)}
+
+
+class QueryPlanner:
+    """Plans and runs AND searches over a ``CompanyCatalog``.
+
+    Index stages stop once at most ``residual_threshold`` candidates are
+    left; checking a handful of companies directly is cheaper than another
+    index lookup and intersection. A fuzzy name criterion orders the results
+    by score and keeps the best ``name_limit``; otherwise a geographic
+    criterion orders them by distance.
+    """
+
+    def __init__(self, catalog: CompanyCatalog, *, residual_threshold: int = 256,
+                 name_limit: int = 25, name_min_score: float = 0.3):
+        self.catalog = catalog
+        self.residual_threshold = residual_threshold
+        self.name_limit = name_limit
+        self.name_min_score = name_min_score
+
+    def fuzzy_name(self, criteria: Dict[str, Any]) -> bool:
+        return bool(criteria.get("company_name")) and not criteria.get("exact_match")
+
+    # ----- index stages -----
+
+    def _lookup(self, catalog: CompanyCatalog, criterion: str, value: Any, criteria: Dict[str, Any],
+                scores: Dict[int, float], distances: Dict[int, float]) -> Set[int]:
+        if criterion == "local_identifier":
+            return catalog.lookup_registration(value)
+        if criterion == "company_name":
+            if not self.fuzzy_name(criteria):
+                return catalog.lookup_name(value, exact=True)
+            # Alone, the name match can be cut to the final limit; combined with
+            # other criteria every match above the minimum score is a candidate
+            limit = self.name_limit if len(supplied_criteria(criteria)) == 1 else None
+            matches = catalog.match_name(value, limit, self.name_min_score)
+            scores.update(matches)
+            return {row for row, _ in matches}
+        if criterion == "postal_code":
+            return catalog.lookup_postal_code(value)
+        if criterion in ("radius_km", "bbox"):
+            if criterion == "radius_km":
+                found = catalog.lookup_radius(criteria["latitude"], criteria["longitude"], value)
+            else:
+                found = catalog.lookup_bbox(value, geo_center(criteria))
+            # With both a radius and a box, both measure from the same center
+            distances.update(found)
+            return set(found)
+        if criterion == "city":
+            return catalog.lookup_city(value)
+        if criterion == "country":
+            return catalog.lookup_country(value)
+        if criterion == "continent":
+            return catalog.lookup_continent(value)
+        if criterion == "phone_fax":
+            return catalog.lookup_phone(value)
+        if criterion in PRESENCE_CRITERIA:
+            return catalog.lookup_presence(criterion)
+        raise ValueError(f"No index for criterion {criterion}")
+
+    # ----- residual filters -----
+
+    def predicate(self, catalog: CompanyCatalog, criterion: str, value: Any,
+                  criteria: Dict[str, Any]) -> Callable[[Any], bool]:
+        """Check of one criterion against a single company, same semantics as its index."""
+        if criterion == "duns":
+            return lambda company: company.duns == value
+        if criterion == "local_identifier":
+            return lambda company: any(value in reg.number for reg in (company.registration_numbers or []))
+        if criterion == "company_name":
+            if not self.fuzzy_name(criteria):
+                key = normalize_text(value)
+                return lambda company: normalize_text(company.company_name) == key
+            return lambda company: catalog.name_similarity(value, company.company_name) >= self.name_min_score
+        if criterion == "postal_code":
+            key = normalize_registration(value)
+            return lambda company: normalize_registration(company.address.postal_code if company.address else None) == key
+        if criterion == "continent":
+            key = normalize_continent(value)
+            return lambda company: bool(company.address) and normalize_continent(company.address.continent) == key
+        if criterion in ("city", "country", "state"):
+            key = normalize_text(value)
+            return lambda company: key in _address_field(company, criterion)
+        if criterion == "address":
+            key = normalize_text(value)
+            return lambda company: key in _address_field(company, "street")
+        if criterion == "phone_fax":
+            query = phone_query(value)
+            return lambda company: phone_matches(query, company.phone_e164) or phone_matches(query, company.fax_e164)
+        if criterion == "radius_km":
+            center = (criteria["latitude"], criteria["longitude"])
+
+            def within_radius(company: Any) -> bool:
+                # A company at the center is 0.0 km away, which is falsy
+                distance = _distance(company, center)
+                return distance is not None and distance <= value
+            return within_radius
+        if criterion == "bbox":
+            return lambda company: (
+                bool(company.address) and valid_coordinates(company.address.latitude, company.address.longitude)
+                and in_bbox(company.address.latitude, company.address.longitude, value)
+            )
+        if criterion == "has_phone":
+            return lambda company: bool(company.phone)
+        if criterion == "has_fax":
+            return lambda company: bool(company.fax)
+        raise ValueError(f"Unknown criterion {criterion}")
+
+    # ----- planning -----
+
+    def plan_company(self, company: Optional[Any], criteria: Dict[str, Any], started: float) -> SearchPlan:
+        """Plan for a DUNS search: ``company`` (looked up by DUNS since ``started``)
+        checked against the other criteria."""
+        catalog = self.catalog.snapshot()
+        supplied = supplied_criteria(criteria)
+        plan = SearchPlan(supplied)
+        plan.record("lookup", "duns", int(company is not None), started)
+        if company is None:
+            return plan
+        for criterion, value in supplied.items():
+            if criterion == "duns":
+                continue
+            started = time.perf_counter()
+            matched = self.predicate(catalog, criterion, value, criteria)(company)
+            plan.record("filter", criterion, int(matched), started)
+            if not matched:
+                return plan
+        score = None
+        if self.fuzzy_name(criteria):
+            score = catalog.name_similarity(criteria["company_name"], company.company_name)
+        center = geo_center(criteria)
+        plan.matches = [(company, score, _distance(company, center) if center else None)]
+        return plan
+
+    def plan(self, criteria: Dict[str, Any]) -> SearchPlan:
+        """Run a catalog search for every supplied criterion except ``duns``."""
+        catalog = self.catalog.snapshot()
+        supplied = supplied_criteria(criteria)
+        supplied.pop("duns", None)
+        plan = SearchPlan(supplied, catalog.company)
+        if not supplied:
+            return plan
+
+        candidates: Optional[Set[int]] = None
+        scores: Dict[int, float] = {}
+        distances: Dict[int, float] = {}
+        indexed = set()
+        for criterion in INDEX_ORDER:
+            if criterion not in supplied:
+                continue
+            if candidates is not None and len(candidates) <= self.residual_threshold:
+                break
+            started = time.perf_counter()
+            if criterion in PRESENCE_CRITERIA and candidates is not None:
+                candidates = catalog.filter_presence(candidates, criterion)
+                indexed.add(criterion)
+                plan.record("bitmap", criterion, len(candidates), started)
+                if not candidates:
+                    return plan
+                continue
+            rows = self._lookup(catalog, criterion, supplied[criterion], criteria, scores, distances)
+            candidates = rows if candidates is None else candidates & rows
+            indexed.add(criterion)
+            plan.record("index", criterion, len(candidates), started, index_rows=len(rows))
+            if not candidates:
+                return plan
+
+        if candidates is None:
+            # Only unindexed criteria (state, address): scan the catalog
+            started = time.perf_counter()
+            candidates = catalog.lookup_all()
+            plan.record("scan", "*", len(candidates), started)
+
+        # Residual filters read light row views; companies are built only for the results
+        entries = [(row, catalog.view(row)) for row in sorted(candidates)]
+        for criterion, value in supplied.items():
+            if criterion in indexed:
+                continue
+            started = time.perf_counter()
+            check = self.predicate(catalog, criterion, value, criteria)
+            entries = [(row, company) for row, company in entries if check(company)]
+            plan.record("filter", criterion, len(entries), started)
+            if not entries:
+                return plan
+
+        center = geo_center(criteria)
+        fuzzy = self.fuzzy_name(criteria)
+        if not fuzzy and center is None:
+            plan.matches = [(row, None, None) for row, _ in entries]
+            return plan
+
+        started = time.perf_counter()
+        ranked = []
+        for row, company in entries:
+            score = None
+            if fuzzy and "company_name" in indexed:
+                score = scores[row]
+            elif fuzzy:
+                score = catalog.name_similarity(supplied["company_name"], company.company_name)
+            distance = None
+            if center is not None:
+                distance = distances[row] if row in distances else _distance(company, center)
+            ranked.append((row, score, distance))
+        # Stable sorts keep catalog order between ties; companies without coordinates go last
+        if fuzzy:
+            ranked.sort(key=lambda match: -match[1])
+            ranked = ranked[:self.name_limit]
+        else:
+            ranked.sort(key=lambda match: float("inf") if match[2] is None else match[2])
+        plan.matches = ranked
+        plan.record("rank", "company_name" if fuzzy else "distance", len(ranked), started)
+        return plan
@@ -0,0 +1,434 @@
+"""Incremental refresh of stale ``cached_companies`` documents.
+
+``DeltaRefresher`` selects the documents whose source confirmed them
+longest ago (``fetched_at`` older than ``max_age``, or never recorded) with
+a range query on the ``fetched_at`` index. ``last_updated`` is not used, as
+every search touches it. It reloads them from the data source in
+rate-limited batches and writes back only what changed:
+
+- same content hash: only ``fetched_at`` and ``last_updated`` are touched,
+- different hash: just the changed top-level fields are ``$set`` / ``$unset``,
+- not found or failed: the document is parked until ``retry_delay`` has
+  passed (``refresh_after``) so it does not block the head of the queue.
+
+When a company's hierarchy changed, only its own edges are rewritten (plus
+the edges below members that moved to another global ultimate), instead of
+rebuilding whole trees.
+
+With several server processes on one database, a ``Lease`` lets only one of
+them run batches, and the changes it makes are published on a
+``ChangeFeed`` that the other processes poll to drop their cached copies
+and apply the same edge changes to their own hierarchy graph.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from bulk_resolve import RateLimiter
+from hierarchy import HierarchyGraph, delete_edges, edges_from_company, save_edges
+from persistence import VOLATILE_FIELDS, content_hash, storage_document
+
+logger = logging.getLogger(__name__)
+
+# Feed entries are only needed until every process has polled them
+CHANGE_FEED_RETENTION_SECONDS = 24 * 3600
+COMPANY_CHANGE_INDEXES = [
+    IndexModel([("changed_at", ASCENDING)], name="changed_at_ttl", expireAfterSeconds=CHANGE_FEED_RETENTION_SECONDS),
+]
+
+
+def _utc(value: Any) -> Optional[datetime]:
+    """Mongo returns naive UTC datetimes."""
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value if isinstance(value, datetime) else None
+
+
+def changed_fields(stored: Dict[str, Any], document: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """(fields to set, fields to unset) turning ``stored`` into ``document``; volatile fields are ignored."""
+    changes = {key: value for key, value in document.items()
+               if key not in VOLATILE_FIELDS and stored.get(key) != value}
+    removed = [key for key in stored if key not in VOLATILE_FIELDS and key not in document]
+    return changes, removed
+
+
+async def ensure_refresh_indexes(db) -> None:
+    await db.company_changes.create_indexes(COMPANY_CHANGE_INDEXES)
+
+
+class Lease:
+    """Time-limited lock in MongoDB, so one process of a deployment runs a job.
+
+    The holder renews it on every ``acquire``; when it stops renewing
+    (crashed, or shut down without ``release``) another process takes over
+    once ``ttl`` seconds have passed.
+    """
+
+    def __init__(self, collection, name: str, owner: str, ttl: float = 300.0):
+        self.collection = collection
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.held = False
+
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+            )
+            self.held = True
+        except DuplicateKeyError:
+            # Another process holds a lease that has not expired
+            self.held = False
+        return self.held
+
+    async def release(self) -> None:
+        if self.held:
+            await self.collection.delete_one({"_id": self.name, "owner": self.owner})
+            self.held = False
+
+
+class ChangeFeed:
+    """Companies changed by the refresher, replayed by the other server processes.
+
+    The refreshing process publishes each changed DUNS, whether its
+    hierarchy changed and the hierarchy edges it removed. Every other
+    process polls the feed every ``interval`` seconds, calls ``on_change``
+    for each company and makes the same graph changes: drops those edges
+    and adds the company as now stored in ``companies_collection``.
+    """
+
+    def __init__(
+        self,
+        collection,
+        companies_collection,
+        model: Callable[..., Any],
+        graph: HierarchyGraph,
+        *,
+        origin: str,
+        on_change: Optional[Callable[[str], None]] = None,
+        interval: float = 5.0,
+    ):
+        self.collection = collection
+        self.companies_collection = companies_collection
+        self.model = model
+        self.graph = graph
+        self.origin = origin
+        self.on_change = on_change
+        self.interval = interval
+        # Changes made before this process loaded its graph are already in it
+        self._since = datetime.now(timezone.utc)
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"published": 0, "applied": 0, "errors": 0}
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def publish(self, changes: List[Dict[str, Any]]) -> None:
+        """Record changes as ``{"duns", "hierarchy_changed", "edges_removed"}`` entries."""
+        if not changes:
+            return
+        now = datetime.now(timezone.utc)
+        await self.collection.insert_many([{**change, "origin": self.origin, "changed_at": now} for change in changes])
+        self.counters["published"] += len(changes)
+
+    async def poll(self) -> int:
+        """Apply the changes other processes published since the last poll; returns how many."""
+        cursor = self.collection.find({"changed_at": {"$gt": self._since}}, {"_id": 0}).sort("changed_at", ASCENDING)
+        changes = [change async for change in cursor]
+        if not changes:
+            return 0
+        self._since = _utc(changes[-1]["changed_at"])
+        changes = [change for change in changes if change["origin"] != self.origin]
+
+        for change in changes:
+            for parent, child in change["edges_removed"]:
+                self.graph.remove_edge(parent, child)
+        moved = [change["duns"] for change in changes if change["hierarchy_changed"]]
+        if moved:
+            async for document in self.companies_collection.find({"duns": {"$in": moved}}, {"_id": 0}):
+                self.graph.add_company(self.model(**document))
+        if self.on_change:
+            for change in changes:
+                self.on_change(change["duns"])
+        self.counters["applied"] += len(changes)
+        return len(changes)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"Change feed poll failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+
+class DeltaRefresher:
+    """Background scheduler refreshing stale cached companies from ``loader``.
+
+    Each batch takes up to ``batch_size`` stale documents, oldest first,
+    and loads them with at most ``concurrency`` calls in flight and
+    ``rate_limit`` calls per second. While the backlog is larger than one
+    batch the next batch starts right away; otherwise the scheduler sleeps
+    ``interval`` seconds. With a ``lease`` the scheduler only runs batches
+    while it holds it, and with a ``feed`` every change is published there.
+    Batches never overlap within a process.
+    """
+
+    def __init__(
+        self,
+        collection,
+        edges_collection,
+        loader: Callable[[str], Awaitable[Optional[Any]]],
+        model: Callable[..., Any],
+        graph: HierarchyGraph,
+        *,
+        max_age: float = 24 * 3600,
+        batch_size: int = 100,
+        concurrency: int = 8,
+        rate_limit: float = 10.0,
+        interval: float = 60.0,
+        retry_delay: float = 3600.0,
+        on_change: Optional[Callable[[str], None]] = None,
+        lease: Optional[Lease] = None,
+        feed: Optional[ChangeFeed] = None,
+    ):
+        self.collection = collection
+        self.edges_collection = edges_collection
+        self.loader = loader
+        self.model = model
+        self.graph = graph
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self.on_change = on_change
+        self.lease = lease
+        self.feed = feed
+        self.limiter = RateLimiter(rate_limit)
+        self._batch_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "batches": 0,
+            "refreshed": 0,
+            "changed": 0,
+            "unchanged": 0,
+            "missing": 0,
+            "errors": 0,
+            "edges_saved": 0,
+            "edges_removed": 0,
+        }
+        self.last_batch: Optional[Dict[str, Any]] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self.lease is not None:
+            await self.lease.release()
+
+    def stale_filter(self, now: datetime) -> Dict[str, Any]:
+        return {
+            # Also matches documents stored before fetched_at was recorded
+            "fetched_at": {"$not": {"$gte": now - timedelta(seconds=self.max_age)}},
+            # Also matches documents that were never parked
+            "refresh_after": {"$not": {"$gt": now}},
+        }
+
+    async def stats(self) -> Dict[str, Any]:
+        """Counters plus the current backlog and how far behind the oldest stale document is."""
+        now = datetime.now(timezone.utc)
+        stale = self.stale_filter(now)
+        backlog = await self.collection.count_documents(stale)
+        oldest = await self.collection.find_one(stale, {"_id": 0, "fetched_at": 1, "last_updated": 1},
+                                                sort=[("fetched_at", ASCENDING)])
+        oldest_updated = _utc(oldest.get("fetched_at") or oldest.get("last_updated")) if oldest else None
+        oldest_age = (now - oldest_updated).total_seconds() if oldest_updated else None
+        return {
+            **self.counters,
+            "running": self.is_running,
+            # Whether this process runs the batches (always without a lease)
+            "leader": self.lease.held if self.lease is not None else self.is_running,
+            "backlog": backlog,
+            "oldest_age_seconds": round(oldest_age, 1) if oldest_age is not None else None,
+            # Time the oldest stale document has been waiting past max_age
+            "lag_seconds": round(max(0.0, oldest_age - self.max_age), 1) if oldest_age is not None else 0.0,
+            "max_age_seconds": self.max_age,
+            "last_batch": self.last_batch,
+        }
+
+    async def run_leased_batch(self) -> Optional[int]:
+        """Run one batch if this process holds or can take the lease; None while another one holds it."""
+        if self.lease is None:
+            return await self.run_batch()
+        if not await self.lease.acquire():
+            return None
+        try:
+            return await self.run_batch()
+        finally:
+            if not self.is_running:
+                # Only taken for this batch, so the scheduler of another process can have it
+                await self.lease.release()
+
+    async def run_batch(self) -> int:
+        """Refresh one batch of stale documents; returns how many were selected."""
+        async with self._batch_lock:
+            return await self._run_batch()
+
+    async def _run_batch(self) -> int:
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        cursor = (
+            self.collection.find(self.stale_filter(now), {"_id": 0, "duns": 1, "content_hash": 1})
+            .sort("fetched_at", ASCENDING)
+            .limit(self.batch_size)
+        )
+        stale = {document["duns"]: document.get("content_hash") async for document in cursor}
+        if not stale:
+            return 0
+
+        loaded = await self._load_all(list(stale))
+        documents: Dict[str, Dict[str, Any]] = {}
+        operations: List[UpdateOne] = []
+        outcome = {"changed": 0, "unchanged": 0, "missing": 0, "errors": 0}
+        for duns, company in loaded.items():
+            if company is None or isinstance(company, Exception):
+                outcome["missing" if company is None else "errors"] += 1
+                parked_until = now + timedelta(seconds=self.retry_delay)
+                operations.append(UpdateOne({"duns": duns}, {"$set": {"refresh_after": parked_until}}))
+                continue
+            document = storage_document(company.model_dump(exclude={"search_criteria"}))
+            digest = content_hash(document)
+            if digest == stale[duns]:
+                outcome["unchanged"] += 1
+                operations.append(UpdateOne({"duns": duns}, {"$set": {"fetched_at": now, "last_updated": now},
+                                                             "$unset": {"refresh_after": ""}}))
+            else:
+                documents[duns] = {**document, "content_hash": digest}
+
+        changed_companies = []
+        if documents:
+            stored_documents = {
+                document["duns"]: document
+                async for document in self.collection.find({"duns": {"$in": list(documents)}}, {"_id": 0})
+            }
+            for duns, document in documents.items():
+                stored = stored_documents.get(duns, {})
+                changes, removed = changed_fields(stored, document)
+                update = {
+                    "$set": {**changes, "content_hash": document["content_hash"],
+                             "fetched_at": now, "last_updated": now},
+                    "$unset": {field: "" for field in removed + ["refresh_after"]},
+                }
+                operations.append(UpdateOne({"duns": duns}, update))
+                outcome["changed"] += 1
+                if "corporate_hierarchy" in changes or "corporate_hierarchy" in removed:
+                    changed_companies.append((stored, loaded[duns]))
+
+        await self.collection.bulk_write(operations, ordered=False)
+        changes = {duns: {"duns": duns, "hierarchy_changed": False, "edges_removed": []} for duns in documents}
+        for stored, company in changed_companies:
+            removed = await self._update_edges(stored, company)
+            changes[company.duns].update(hierarchy_changed=True, edges_removed=removed)
+        if self.feed is not None:
+            await self.feed.publish(list(changes.values()))
+        if self.on_change:
+            for duns in documents:
+                self.on_change(duns)
+
+        for key, count in outcome.items():
+            self.counters[key] += count
+        self.counters["refreshed"] += len(stale)
+        self.counters["batches"] += 1
+        self.last_batch = {
+            "started_at": now.isoformat(),
+            "selected": len(stale),
+            **outcome,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        return len(stale)
+
+    # ----- internals -----
+
+    async def _load_all(self, duns_list: List[str]) -> Dict[str, Any]:
+        """DUNS -> company, None (not found) or the exception raised while loading."""
+        results: Dict[str, Any] = {}
+        pending = list(duns_list)
+
+        async def worker():
+            while pending:
+                duns = pending.pop()
+                await self.limiter.acquire()
+                try:
+                    results[duns] = await self.loader(duns)
+                except Exception as e:
+                    logger.warning(f"Refresh of {duns} failed: {str(e)}")
+                    results[duns] = e
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(pending)))))
+        return results
+
+    async def _update_edges(self, stored: Dict[str, Any], company: Any) -> List[Tuple[str, str]]:
+        """Apply one company's hierarchy change to the graph and the stored edges; returns the removed edges."""
+        old_edges: Set[Tuple[str, str]] = set()
+        if stored.get("corporate_hierarchy"):
+            old_edges = set(edges_from_company(self.model(**stored))[1])
+        members, edges = edges_from_company(company)
+        removed = old_edges - set(edges)
+        for parent, child in removed:
+            self.graph.remove_edge(parent, child)
+
+        # Members whose global ultimate changes need the edges below them rewritten too
+        children = {child for _, child in edges} | {child for _, child in removed}
+        roots_before = {child: self.graph.root(child) for child in children}
+        self.graph.add_company(company)
+        affected = list(edges)
+        for child in children:
+            if self.graph.root(child) != roots_before[child]:
+                affected.extend(self.graph.descendant_edges(child))
+        # Edges the graph rejected (cycles) are not stored
+        affected = [(parent, child) for parent, child in dict.fromkeys(affected)
+                    if self.graph.node(child) and self.graph.node(child)["parentDuns"] == parent]
+
+        self.counters["edges_removed"] += await delete_edges(self.edges_collection, removed)
+        self.counters["edges_saved"] += await save_edges(self.edges_collection, self.graph, affected)
+        return sorted(removed)
+
+    async def _run(self) -> None:
+        while True:
+            selected = 0
+            try:
+                selected = await self.run_leased_batch() or 0
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"Delta refresh batch failed: {str(e)}")
+            if selected < self.batch_size:
+                await asyncio.sleep(self.interval)
@@ -1,4 +1,6 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
@@ -7,12 +9,41 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, model_validator
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 import os
 import logging
 import uuid
-import httpx
+import time
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from auth_cache import TokenCache, UserRepository
+from bulk_resolve import IDENTIFIER_TYPES, ndjson_line, resolve_identifiers, parse_identifiers_csv, may_be_duns, may_be_registration
+from cache import TieredCompanyCache
+from catalog import CompanyCatalog, normalize_phone
+from dnb_client import DnbClient
+from export import XLSX_MEDIA_TYPE, build_hierarchy_xlsx, hierarchy_rows, iter_csv, iter_file
+from geo import bbox_center, bbox_polygon, geojson_point
+from hierarchy import HierarchyGraph, ensure_hierarchy_indexes, load_edges, save_edges
+from http_cache import CachedResponse, ResponseCache, conditional_response, documents_etag, normalized_criteria
+from metrics import REGISTRY, ProfileStore, TimingMiddleware, span
+from name_matching import confidence_from_score
+from persistence import (
+    COMPANY_SUMMARY_PROJECTION,
+    DOCUMENT_PROJECTION,
+    VOLATILE_FIELDS,
+    CompanyWriteBehind,
+    bulk_upsert_companies,
+    encode_cursor,
+    ensure_indexes,
+    keyset_filter,
+)
+from query_planner import QueryPlanner, SearchPlan
+from refresh import ChangeFeed, DeltaRefresher, Lease, ensure_refresh_indexes
+from responses import encode_json, json_response
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -29,15 +60,40 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt costs ~100-300 ms of CPU per call; it runs on this bounded pool so
+# logins never block the event loop (bcrypt releases the GIL while hashing)
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+# Created on first use and shut down with the app (see APP LIFECYCLE)
+password_executor: Optional[ThreadPoolExecutor] = None
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
 # D&B API Configuration
 DNB_API_KEY = os.environ.get("DNB_API_KEY", "")
 DNB_API_SECRET = os.environ.get("DNB_API_SECRET", "")
-DNB_API_BASE_URL = "https://plus.dnb.com/v1"
+DNB_API_BASE_URL = os.environ.get("DNB_API_BASE_URL", "https://plus.dnb.com/v1")
+DNB_TOKEN_URL = os.environ.get("DNB_TOKEN_URL", "https://plus.dnb.com/v2/token")
+# Live D&B calls are opt-in; without them only the local catalog is searched
+DNB_API_ENABLED = os.environ.get("DNB_API_ENABLED", "false").lower() == "true"
+
+dnb_client = DnbClient(
+    DNB_API_KEY,
+    DNB_API_SECRET,
+    DNB_API_BASE_URL,
+    DNB_TOKEN_URL,
+    max_connections=int(os.environ.get("DNB_MAX_CONNECTIONS", "50")),
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the startup steps, serve, then the shutdown steps (see APP LIFECYCLE)"""
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
 
 # Create the main app
-app = FastAPI(title="D&B Business Partner Search API")
+app = FastAPI(title="D&B Business Partner Search API", lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
 # Configure logging
@@ -58,6 +114,7 @@ class User(BaseModel):
     email: Optional[str] = None
     full_name: Optional[str] = None
     disabled: Optional[bool] = None
+    is_admin: Optional[bool] = None
 
 class UserInDB(User):
     hashed_password: str
@@ -104,6 +161,20 @@ class CompanySearchCriteria(BaseModel):
     has_phone: Optional[bool] = None
     has_fax: Optional[bool] = None
     exact_match: Optional[bool] = False
+    # Geographic search: within radius_km of (latitude, longitude) and/or inside
+    # bbox = [west, south, east, north]; results come back nearest first
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    radius_km: Optional[float] = Field(None, gt=0)
+    bbox: Optional[List[float]] = Field(None, min_length=4, max_length=4)
+    
+    @model_validator(mode="after")
+    def check_geo(self) -> "CompanySearchCriteria":
+        if self.radius_km is not None and (self.latitude is None or self.longitude is None):
+            raise ValueError("radius_km requires latitude and longitude")
+        if self.bbox is not None and self.bbox[1] > self.bbox[3]:
+            raise ValueError("bbox must be [west, south, east, north]")
+        return self
 
 class HierarchyMember(BaseModel):
     duns: str
@@ -144,6 +215,9 @@ class Company(BaseModel):
     mailing_address: Optional[Address] = None
     phone: Optional[str] = None
     fax: Optional[str] = None
+    # E.164 forms of phone and fax, filled in on ingestion for indexed lookups
+    phone_e164: Optional[str] = None
+    fax_e164: Optional[str] = None
     email: Optional[str] = None
     website: Optional[str] = None
     primary_sic_code: Optional[str] = None
@@ -161,17 +235,32 @@ class Company(BaseModel):
     last_updated: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     data_source: str = "D&B API"
     search_criteria: Optional[Dict[str, Any]] = None
+    # Set on search results with a geographic criterion, never stored
+    distance_km: Optional[float] = None
+    
+    @model_validator(mode="after")
+    def normalize_numbers(self) -> "Company":
+        country = self.address.country if self.address else None
+        if self.phone and not self.phone_e164:
+            self.phone_e164 = normalize_phone(self.phone, country)
+        if self.fax and not self.fax_e164:
+            self.fax_e164 = normalize_phone(self.fax, country)
+        return self
 
 # ============= AUTHENTICATION =============
 
-# Mock user database (in production, use MongoDB)
+# Seed users, copied into the MongoDB users collection at startup
 fake_users_db = {
     "admin": {
         "username": "admin",
         "full_name": "Admin User",
         "email": "admin@dnb.com",
-        "hashed_password": pwd_context.hash("D&B2025Secure!"),
+        # Precomputed bcrypt hash; hashing at import time slowed down every startup
+        "hashed_password": os.environ.get(
+            "ADMIN_PASSWORD_HASH", "$2b$12$S714VbOrG2RY859pAZ2vXuZ.PsbYf4RiE3sG6OG5Vb2GCxjzt2IK6"
+        ),
         "disabled": False,
+        "is_admin": True,
     }
 }
 
@@ -181,16 +270,43 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def get_user(username: str):
-    if username in fake_users_db:
-        user_dict = fake_users_db[username]
-        return UserInDB(**user_dict)
+def get_password_executor() -> ThreadPoolExecutor:
+    global password_executor
+    if password_executor is None:
+        password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return password_executor
+
+async def verify_password_async(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), verify_password, plain_password, hashed_password)
+
+async def close_password_executor():
+    """Shut the bcrypt pool down, waiting off the event loop for a hash in progress"""
+    global password_executor
+    executor, password_executor = password_executor, None
+    if executor is not None:
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+token_cache = TokenCache(max_entries=int(os.environ.get("TOKEN_CACHE_SIZE", "10000")))
 
-def authenticate_user(username: str, password: str):
-    user = get_user(username)
+# Users live in MongoDB; fake_users_db only seeds it at startup
+user_repository = UserRepository(
+    db.users,
+    UserInDB,
+    # Also how long other workers keep accepting a user disabled elsewhere
+    ttl=float(os.environ.get("USER_CACHE_TTL_SECONDS", "60")),
+    max_entries=int(os.environ.get("USER_CACHE_SIZE", "10000")),
+    on_invalidate=token_cache.invalidate_user,
+)
+
+async def get_user(username: str):
+    return await user_repository.get(username)
+
+async def authenticate_user(username: str, password: str):
+    user = await get_user(username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
@@ -210,15 +326,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+    with span("auth"):
+        # Tokens already verified are recognized by digest until they expire
+        username = token_cache.get(token)
         if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    user = get_user(username=token_data.username)
+            try:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+                username = payload.get("sub")
+                if username is None:
+                    raise credentials_exception
+                token_cache.put(token, username, float(payload["exp"]))
+            except (JWTError, KeyError, TypeError, ValueError):
+                raise credentials_exception
+        user = await get_user(username=username)
     if user is None:
         raise credentials_exception
     return user
@@ -228,9 +348,14 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return current_user
+
 @api_router.post("/login", response_model=Token)
 async def login(login_data: LoginRequest):
-    user = authenticate_user(login_data.username, login_data.password)
+    user = await authenticate_user(login_data.username, login_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -247,6 +372,24 @@ async def login(login_data: LoginRequest):
 async def verify_token(current_user: User = Depends(get_current_active_user)):
     return {"username": current_user.username, "email": current_user.email}
 
+@api_router.post("/users/{username}/disable")
+async def disable_user(username: str, current_user: User = Depends(get_current_admin_user)):
+    """Disable a user; this worker rejects their tokens at once, the others within USER_CACHE_TTL_SECONDS"""
+    if username == current_user.username:
+        raise HTTPException(status_code=400, detail="Admins cannot disable themselves")
+    if not await user_repository.set_disabled(username, True):
+        raise HTTPException(status_code=404, detail="User not found")
+    logger.info(f"User {username} disabled by {current_user.username}")
+    return {"username": username, "disabled": True}
+
+@api_router.post("/users/{username}/enable")
+async def enable_user(username: str, current_user: User = Depends(get_current_admin_user)):
+    """Re-enable a disabled user"""
+    if not await user_repository.set_disabled(username, False):
+        raise HTTPException(status_code=404, detail="User not found")
+    logger.info(f"User {username} enabled by {current_user.username}")
+    return {"username": username, "disabled": False}
+
 # ============= MOCK DATA FUNCTIONS =============
 
 def create_mock_company_data(duns: str) -> Optional[Company]:
@@ -470,119 +613,426 @@ def create_mock_company_data(duns: str) -> Optional[Company]:
         return Company(**company_data)
     return None
 
+# ============= COMPANY CATALOG =============
+
+MOCK_COMPANY_DUNS = [
+    "804735132",  # Apple
+    "001234567",  # Microsoft
+    "313046411",  # Google
+    "832563616",  # Tesla
+]
+
+company_catalog = CompanyCatalog(model=Company)
+
+# Fuzzy name search returns at most this many matches scoring at least the minimum
+NAME_MATCH_LIMIT = int(os.environ.get("NAME_MATCH_LIMIT", "25"))
+NAME_MATCH_MIN_SCORE = float(os.environ.get("NAME_MATCH_MIN_SCORE", "0.3"))
+
+search_planner = QueryPlanner(
+    company_catalog,
+    residual_threshold=int(os.environ.get("SEARCH_RESIDUAL_THRESHOLD", "256")),
+    name_limit=NAME_MATCH_LIMIT,
+    name_min_score=NAME_MATCH_MIN_SCORE,
+)
+
+def load_catalog_companies() -> List[Company]:
+    """Companies the catalog is built from"""
+    return [create_mock_company_data(duns) for duns in MOCK_COMPANY_DUNS]
+
+def _dnb_member(entry: Optional[Dict[str, Any]], relationship_code: Optional[str] = None) -> Optional[HierarchyMember]:
+    if not entry or not entry.get("duns"):
+        return None
+    return HierarchyMember(
+        duns=entry["duns"],
+        primaryName=entry.get("primaryName") or "",
+        relationshipCode=relationship_code,
+    )
+
+def company_from_dnb(payload: Dict[str, Any]) -> Optional[Company]:
+    """Map a Direct+ data block response onto our Company model"""
+    org = payload.get("organization") if payload else None
+    if not org or not org.get("duns"):
+        return None
+    
+    address = None
+    primary_address = org.get("primaryAddress")
+    if primary_address:
+        street = primary_address.get("streetAddress") or {}
+        address = Address(
+            street=street.get("line1"),
+            additional_lines=[street["line2"]] if street.get("line2") else None,
+            city=(primary_address.get("addressLocality") or {}).get("name"),
+            state=(primary_address.get("addressRegion") or {}).get("abbreviatedName"),
+            postal_code=primary_address.get("postalCode"),
+            country=(primary_address.get("addressCountry") or {}).get("name"),
+            continent=(primary_address.get("continentalRegion") or {}).get("name"),
+            latitude=primary_address.get("latitude"),
+            longitude=primary_address.get("longitude"),
+        )
+    
+    phones = org.get("telephone") or []
+    phone = None
+    if phones:
+        isd_code = phones[0].get("isdCode")
+        phone = f"+{isd_code} {phones[0].get('telephoneNumber')}" if isd_code else phones[0].get("telephoneNumber")
+    faxes = org.get("fax") or []
+    fax = None
+    if faxes:
+        isd_code = faxes[0].get("isdCode")
+        fax = f"+{isd_code} {faxes[0].get('faxNumber')}" if isd_code else faxes[0].get("faxNumber")
+    
+    websites = org.get("websiteAddress") or []
+    industry = org.get("primaryIndustryCode") or {}
+    employees = org.get("numberOfEmployees") or []
+    start_date = org.get("startDate") or ""
+    
+    linkage = org.get("corporateLinkage") or {}
+    hierarchy = None
+    if linkage:
+        hierarchy = CorporateHierarchy(
+            globalUltimate=_dnb_member(linkage.get("globalUltimate")),
+            domesticUltimate=_dnb_member(linkage.get("domesticUltimate")),
+            parent=_dnb_member(linkage.get("parent"), "PAR"),
+        )
+    
+    return Company(
+        duns=org["duns"],
+        company_name=org.get("primaryName") or "",
+        legal_name=(org.get("registeredName") or {}).get("name"),
+        operating_status=((org.get("dunsControlStatus") or {}).get("operatingStatus") or {}).get("description"),
+        address=address,
+        phone=phone,
+        fax=fax,
+        website=websites[0].get("url") if websites else None,
+        primary_sic_code=industry.get("usSicV4"),
+        primary_sic_description=industry.get("usSicV4Description"),
+        employee_count=employees[0].get("value") if employees else None,
+        year_started=int(start_date[:4]) if start_date[:4].isdigit() else None,
+        legal_form=(org.get("businessEntityType") or {}).get("description"),
+        registration_numbers=[
+            RegistrationNumber(
+                type=reg.get("typeDescription") or "Registration Number",
+                number=reg["registrationNumber"],
+                is_preferred=reg.get("isPreferredRegistrationNumber", False),
+            )
+            for reg in (org.get("registrationNumbers") or [])
+            if reg.get("registrationNumber")
+        ],
+        corporate_hierarchy=hierarchy,
+        data_source="D&B API",
+    )
+
+hierarchy_graph = HierarchyGraph()
+
+def build_catalog_hierarchy() -> HierarchyGraph:
+    """Family-tree graph of the catalog, from the members and edges stored with its rows"""
+    graph = HierarchyGraph()
+    graph.extend(*company_catalog.hierarchy())
+    return graph
+
+async def rebuild_hierarchy_graph() -> int:
+    """Rebuild the family-tree graph from the catalog and stored hierarchy edges"""
+    graph = await run_in_threadpool(build_catalog_hierarchy)
+    await load_edges(db.hierarchy_edges, graph)
+    # Requests keep reading the previous graph until the new one is complete
+    hierarchy_graph.replace(graph)
+    return len(hierarchy_graph)
+
+async def fetch_company(duns: str) -> Optional[Company]:
+    """Look a company up in the local catalog, then in D&B Direct+ when enabled"""
+    company = company_catalog.get(duns)
+    if company is not None or not dnb_client.is_running:
+        return company
+    company = company_from_dnb(await dnb_client.get_company(duns))
+    if company is not None:
+        edges = hierarchy_graph.add_company(company)
+        await save_edges(db.hierarchy_edges, hierarchy_graph, edges)
+    return company
+
+async def find_registration_at_dnb(number: str) -> Optional[Company]:
+    """Company D&B Direct+ files under a registration number, when enabled"""
+    if not dnb_client.is_running:
+        return None
+    result = await dnb_client.search_criteria({"registrationNumber": number})
+    for candidate in result.get("searchCandidates") or []:
+        duns = (candidate.get("organization") or {}).get("duns")
+        if duns:
+            return await company_cache.get(duns)
+    return None
+
+company_cache = TieredCompanyCache(
+    db.cached_companies,
+    fetch_company,
+    Company,
+    max_entries=int(os.environ.get("COMPANY_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("COMPANY_CACHE_TTL_SECONDS", str(24 * 3600))),
+    max_stale=float(os.environ.get("COMPANY_CACHE_MAX_STALE_SECONDS", str(7 * 24 * 3600))),
+    negative_ttl=float(os.environ.get("COMPANY_CACHE_NEGATIVE_TTL_SECONDS", "300")),
+)
+
+# Encoded hierarchy and search responses, reused until a company in them changes
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", "1000")),
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "300")),
+)
+# Responses carry user-specific data, so only the browser may keep them
+RESPONSE_CACHE_CONTROL = f"private, max-age={int(os.environ.get('RESPONSE_MAX_AGE_SECONDS', '60'))}"
+
+def company_changed(duns: str):
+    """Forget cached copies of a company whose stored data changed"""
+    company_cache.invalidate(duns)
+    response_cache.invalidate(duns)
+
+# Stale cached companies are refreshed in the background when enabled. Every
+# process serving the same database competes for one lease: the holder runs
+# the batches and the others replay its changes from the company_changes feed
+REFRESH_ENABLED = os.environ.get("REFRESH_ENABLED", "false").lower() == "true"
+PROCESS_ID = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+company_change_feed = ChangeFeed(
+    db.company_changes,
+    db.cached_companies,
+    Company,
+    hierarchy_graph,
+    origin=PROCESS_ID,
+    on_change=company_changed,
+    interval=float(os.environ.get("REFRESH_FEED_POLL_SECONDS", "5")),
+)
+
+delta_refresher = DeltaRefresher(
+    db.cached_companies,
+    db.hierarchy_edges,
+    fetch_company,
+    Company,
+    hierarchy_graph,
+    max_age=float(os.environ.get("REFRESH_MAX_AGE_SECONDS", os.environ.get("COMPANY_CACHE_TTL_SECONDS", str(24 * 3600)))),
+    batch_size=int(os.environ.get("REFRESH_BATCH_SIZE", "100")),
+    concurrency=int(os.environ.get("REFRESH_CONCURRENCY", "8")),
+    rate_limit=float(os.environ.get("REFRESH_RATE_LIMIT", "10")),
+    interval=float(os.environ.get("REFRESH_INTERVAL_SECONDS", "60")),
+    retry_delay=float(os.environ.get("REFRESH_RETRY_SECONDS", "3600")),
+    on_change=company_changed,
+    # Renewed before every batch, so it must outlast the interval plus one batch
+    lease=Lease(db.leases, "delta_refresh", PROCESS_ID,
+                ttl=float(os.environ.get("REFRESH_LEASE_SECONDS", "300"))),
+    feed=company_change_feed,
+)
+
+# ============= PERSISTENCE =============
+
+# With write-behind enabled, search results are persisted off the request path
+SEARCH_WRITE_BEHIND = os.environ.get("SEARCH_WRITE_BEHIND", "false").lower() == "true"
+PERSIST_BATCH_SIZE = int(os.environ.get("PERSIST_BATCH_SIZE", "500"))
+# Company fields the search result list never shows; ``?view=list`` leaves them out
+# (the hierarchy is loaded separately, and the caller knows its own criteria)
+LIST_VIEW_EXCLUDE = {"corporate_hierarchy", "mailing_address", "search_criteria", "phone_e164", "fax_e164"}
+# Upper bound on results sent by a streaming search
+SEARCH_STREAM_MAX_RESULTS = int(os.environ.get("SEARCH_STREAM_MAX_RESULTS", "10000"))
+
+search_writer = CompanyWriteBehind(
+    db.cached_companies,
+    max_queue=int(os.environ.get("WRITE_BEHIND_MAX_QUEUE", "10000")),
+    batch_size=PERSIST_BATCH_SIZE,
+    flush_interval=float(os.environ.get("WRITE_BEHIND_FLUSH_SECONDS", "1.0")),
+)
+
+async def persist_companies(companies: List[Company]):
+    """Upsert companies into cached_companies in unordered bulk batches"""
+    documents = [company.model_dump() for company in companies]
+    if search_writer.is_running:
+        await search_writer.enqueue(documents)
+    else:
+        await bulk_upsert_companies(db.cached_companies, documents, PERSIST_BATCH_SIZE)
+
 # ============= API ENDPOINTS =============
 
 @api_router.get("/")
 async def root():
     return {"message": "D&B Business Partner Search API", "version": "1.0"}
 
+async def plan_search(criteria: CompanySearchCriteria) -> SearchPlan:
+    """Match every supplied criterion; DUNS lookups go through the read-through cache"""
+    if criteria.duns:
+        started = time.perf_counter()
+        company = await company_cache.get(criteria.duns)
+        return search_planner.plan_company(company, criteria.model_dump(), started)
+    return search_planner.plan(criteria.model_dump())
+
+def iter_plan_results(criteria: CompanySearchCriteria, plan: SearchPlan) -> Iterator[Tuple[Company, Company]]:
+    """Yield the planned matches one at a time as (to store, to return), tagged with the search criteria
+    
+    The name-match ranking and distance belong to this search, so only the
+    returned copy carries them; the stored one keeps the company's own
+    ranking_info and so its content_hash.
+    """
+    search_criteria = criteria.model_dump(exclude_none=True)
+    searched_at = datetime.now(timezone.utc)
+    
+    # Catalog entries are shared between requests, so tag copies
+    for company, score, distance in plan.iter_matches():
+        stored = company.model_copy(update={"search_criteria": search_criteria, "last_updated": searched_at})
+        update = {}
+        if score is not None:
+            confidence_code, match_quality = confidence_from_score(score)
+            update["ranking_info"] = RankingInfo(confidence_code=confidence_code, match_quality=match_quality)
+        if distance is not None:
+            update["distance_km"] = round(distance, 3)
+        yield stored, stored.model_copy(update=update) if update else stored
+
+async def stream_search_results(criteria: CompanySearchCriteria, explain: bool = False, view: str = "full"):
+    """NDJSON lines for each match, persisted in batches, capped at SEARCH_STREAM_MAX_RESULTS"""
+    exclude = LIST_VIEW_EXCLUDE if view == "list" else None
+    count = 0
+    truncated = False
+    batch = []
+    try:
+        plan = await plan_search(criteria)
+        for stored, company in iter_plan_results(criteria, plan):
+            if count >= SEARCH_STREAM_MAX_RESULTS:
+                truncated = True
+                break
+            count += 1
+            batch.append(stored)
+            if len(batch) >= PERSIST_BATCH_SIZE:
+                await persist_companies(batch)
+                batch = []
+            # The response only pulls the next line once this one is sent
+            yield company.model_dump_json(exclude=exclude).encode("utf-8") + b"\n"
+        if batch:
+            await persist_companies(batch)
+    except Exception as e:
+        logger.error(f"Streaming search error: {str(e)}")
+        yield ndjson_line({"error": str(e)})
+        return
+    logger.info(f"Streamed {count} results")
+    summary = {"count": count, "truncated": truncated}
+    if explain:
+        summary["plan"] = plan.explain()
+    yield ndjson_line(summary)
+
 @api_router.post("/unified-search")
 async def unified_search(
     criteria: CompanySearchCriteria,
+    request: Request,
+    stream: bool = False,
+    explain: bool = False,
+    view: str = Query("full", pattern="^(full|list)$"),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Unified search endpoint supporting multiple D&B GRS search strategies"""
+    """Unified search endpoint supporting multiple D&B GRS search strategies
+    
+    Every supplied criterion must match. With ``?stream=true`` the results are
+    sent as NDJSON while they are matched, followed by a final
+    ``{"count": ..., "truncated": ...}`` line. With ``?explain=true`` the
+    response (or final line) also carries the query plan with per-stage
+    candidate counts. With ``?view=list`` results leave out the fields the
+    result list never shows (hierarchy, mailing address, search criteria).
+    
+    Plain responses carry an ETag and are kept in the response cache, keyed
+    by the normalized criteria, until a company in them changes; a repeat
+    search is answered from there (or with 304 for a matching
+    ``If-None-Match``) without searching or writing to MongoDB again.
+    """
     
     try:
-        logger.info(f"Unified search request: {criteria.model_dump(exclude_none=True)}")
+        # Dumping the criteria is not free, so only when the line will be logged
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Unified search request: {criteria.model_dump(exclude_none=True)}")
+        
+        if stream:
+            return StreamingResponse(stream_search_results(criteria, explain, view), media_type="application/x-ndjson")
         
-        # Mock data search
-        mock_data = [
-            create_mock_company_data("804735132"),  # Apple
-            create_mock_company_data("001234567"),  # Microsoft
-            create_mock_company_data("313046411"),  # Google
-            create_mock_company_data("832563616"),  # Tesla
-        ]
+        # Explain output reports this request's own timings, so it is never cached
+        key = None if explain else f"search:{view}:" + normalized_criteria(criteria.model_dump())
+        cached = response_cache.get(key) if key else None
+        if cached is not None:
+            return cached.response(request, RESPONSE_CACHE_CONTROL)
         
-        results = []
-        for company in mock_data:
-            if company is None:
-                continue
-                
-            match = False
-            
-            # D-U-N-S exact match
-            if criteria.duns and criteria.duns == company.duns:
-                match = True
-            
-            # Local identifier (SIRET/SIREN) - exact match
-            elif criteria.local_identifier:
-                for reg in (company.registration_numbers or []):
-                    if criteria.local_identifier in reg.number:
-                        match = True
-                        break
-            
-            # Company name search
-            elif criteria.company_name:
-                if criteria.exact_match:
-                    # Exact match: compare normalized strings
-                    if criteria.company_name.lower().strip() == company.company_name.lower().strip():
-                        match = True
-                else:
-                    # Partial match (default)
-                    if criteria.company_name.lower() in company.company_name.lower():
-                        match = True
-            
-            # Geographic search
-            elif criteria.continent or criteria.country or criteria.city:
-                if company.address:
-                    if criteria.continent and criteria.continent == company.address.continent:
-                        match = True
-                    if criteria.country and criteria.country.lower() in (company.address.country or "").lower():
-                        match = True
-                    if criteria.city and criteria.city.lower() in (company.address.city or "").lower():
-                        match = True
-            
-            # Phone/Fax search
-            elif criteria.phone_fax:
-                if company.phone and criteria.phone_fax in company.phone:
-                    match = True
-            
-            # Phone presence
-            elif criteria.has_phone:
-                if company.phone:
-                    match = True
-            
-            if match:
-                company.search_criteria = criteria.model_dump(exclude_none=True)
-                results.append(company)
+        with span("search.plan"):
+            plan = await plan_search(criteria)
+        with span("search.materialize"):
+            matches = list(iter_plan_results(criteria, plan))
         
-        logger.info(f"Found {len(results)} results")
+        logger.info(f"Found {len(matches)} results")
         
         # Cache results in MongoDB
-        if results:
-            for company in results:
-                await db.cached_companies.update_one(
-                    {"duns": company.duns},
-                    {"$set": company.model_dump()},
-                    upsert=True
-                )
+        if matches:
+            with span("search.persist"):
+                await persist_companies([stored for stored, _ in matches])
+        results = [company for _, company in matches]
         
-        return {"results": results, "count": len(results)}
+        duns = [company.duns for company in results]
+        with span("search.encode"):
+            if view == "list":
+                results = [company.model_dump(mode="json", by_alias=True, exclude=LIST_VIEW_EXCLUDE) for company in results]
+            if explain:
+                return json_response(request, {"results": results, "count": len(results), "plan": plan.explain()})
+            body = encode_json({"results": results, "count": len(results)})
+            # Every result carries this search's time, so the tag is over what was found
+            etag = documents_etag(result if view == "list" else result.model_dump(exclude=VOLATILE_FIELDS)
+                                  for result in results)
+        cached = response_cache.put(key, body, duns, etag=etag)
+        return cached.response(request, RESPONSE_CACHE_CONTROL)
         
     except Exception as e:
         logger.error(f"Search error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Autocomplete answers come from the catalog alone and change only on reload
+SUGGEST_CACHE_CONTROL = "private, max-age=300"
+
+@api_router.get("/suggest")
+async def suggest_companies(
+    request: Request,
+    q: str = Query(..., max_length=200),
+    limit: int = Query(10, ge=1, le=25),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Search-as-you-type: companies whose name or legal name starts with ``q``
+    
+    Ranked by confidence code, then company size. Answered from an in-memory
+    prefix index without touching MongoDB, so it can follow every (debounced)
+    keystroke.
+    """
+    with span("suggest"):
+        suggestions = company_catalog.suggest(q, limit)
+    return json_response(request, {"query": q, "suggestions": suggestions},
+                         headers={"Cache-Control": SUGGEST_CACHE_CONTROL})
+
+def cache_hierarchy_response(company: Company) -> CachedResponse:
+    """Encode a company's hierarchy response into the response cache"""
+    payload = {
+        "duns": company.duns,
+        "hierarchy": company.corporate_hierarchy.model_dump(),
+        "data_source": company.data_source,
+        "last_updated": company.last_updated.isoformat()
+    }
+    # Catalog companies are stamped with the time they are read, so last_updated is left out of the tag
+    return response_cache.put(f"hierarchy:{company.duns}", encode_json(payload), [company.duns],
+                              etag=documents_etag([payload]))
+
 @api_router.get("/company-hierarchy/{duns}")
 async def get_company_hierarchy(
     duns: str,
+    request: Request,
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get corporate hierarchy for a company"""
+    """Get corporate hierarchy for a company, with an ETag (304 for a matching If-None-Match)"""
     
     try:
-        company = create_mock_company_data(duns)
+        cached = response_cache.get(f"hierarchy:{duns}")
+        if cached is not None:
+            return cached.response(request, RESPONSE_CACHE_CONTROL)
+        
+        with span("hierarchy.lookup"):
+            company = await company_cache.get(duns)
         
         if not company or not company.corporate_hierarchy:
             raise HTTPException(status_code=404, detail="Hierarchy not found")
         
-        return {
-            "duns": duns,
-            "hierarchy": company.corporate_hierarchy.model_dump(),
-            "data_source": "Mock Data",
-            "last_updated": datetime.now(timezone.utc).isoformat()
-        }
+        with span("hierarchy.encode"):
+            cached = cache_hierarchy_response(company)
+        return cached.response(request, RESPONSE_CACHE_CONTROL)
         
     except HTTPException:
         raise
@@ -590,20 +1040,449 @@ async def get_company_hierarchy(
         logger.error(f"Hierarchy error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/cached-companies", response_model=List[Company])
-async def get_cached_companies(current_user: User = Depends(get_current_active_user)):
-    """Get list of recently searched companies"""
+EXPORT_MAX_MEMBERS = int(os.environ.get("EXPORT_MAX_MEMBERS", "100000"))
+
+@api_router.get("/company-hierarchy/{duns}/export")
+async def export_company_hierarchy(
+    duns: str,
+    format: str = Query("xlsx", pattern="^(csv|xlsx)$"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Download the corporate hierarchy as CSV or XLSX, one row per unique member sorted by level"""
+    company = await company_cache.get(duns)
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+    
+    rows = hierarchy_rows(company, hierarchy_graph, EXPORT_MAX_MEMBERS)
+    safe_name = "".join(char if char.isalnum() else "_" for char in company.company_name)
+    filename = f"Corporate_Hierarchy_{safe_name}_{duns}_{datetime.now(timezone.utc):%Y-%m-%d}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    
+    if format == "csv":
+        return StreamingResponse(iter_csv(rows), media_type="text/csv; charset=utf-8", headers=headers)
+    
+    # Zip compression is CPU-bound, so build the workbook off the event loop
+    workbook = await run_in_threadpool(build_hierarchy_xlsx, rows, company, company.data_source)
+    return StreamingResponse(iter_file(workbook), media_type=XLSX_MEDIA_TYPE, headers=headers)
+
+def _hierarchy_node_or_404(duns: str) -> Dict[str, Any]:
+    node = hierarchy_graph.node(duns)
+    if node is None:
+        raise HTTPException(status_code=404, detail="Company not found in any family tree")
+    return node
+
+@api_router.get("/company-hierarchy/{duns}/subtree")
+async def get_hierarchy_subtree(
+    duns: str,
+    request: Request,
+    depth: int = Query(2, ge=0, le=20),
+    max_nodes: int = Query(1000, ge=1, le=10000),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Depth-limited slice of the family tree below a company"""
+    _hierarchy_node_or_404(duns)
+    return json_response(request, hierarchy_graph.subtree(duns, max_depth=depth, max_nodes=max_nodes))
+
+@api_router.get("/company-hierarchy/{duns}/children")
+async def get_hierarchy_children(
+    duns: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Page through the direct children of a family-tree node"""
+    _hierarchy_node_or_404(duns)
+    return json_response(request, hierarchy_graph.children(duns, offset=offset, limit=limit))
+
+@api_router.get("/company-hierarchy/{duns}/siblings")
+async def get_hierarchy_siblings(
+    duns: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Page through the other children of a node's parent"""
+    _hierarchy_node_or_404(duns)
+    return json_response(request, hierarchy_graph.siblings(duns, offset=offset, limit=limit))
+
+@api_router.get("/company-hierarchy/{duns}/ancestors")
+async def get_hierarchy_ancestors(
+    duns: str,
+    request: Request,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Path from a company up to its global ultimate"""
+    node = _hierarchy_node_or_404(duns)
+    return json_response(request, {"node": node, "ancestors": hierarchy_graph.ancestors(duns)})
+
+@api_router.get("/cached-companies")
+async def get_cached_companies(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    view: str = Query("summary", pattern="^(summary|full)$"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get a page of recently searched companies, newest first"""
+    try:
+        query = keyset_filter(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    projection = COMPANY_SUMMARY_PROJECTION if view == "summary" else DOCUMENT_PROJECTION
     try:
-        companies = await db.cached_companies.find({}, {"_id": 0}).sort("last_updated", -1).limit(50).to_list(50)
-        return companies
+        # Fetch one extra document to know whether another page exists
+        with span("cached_companies.find"):
+            companies = await db.cached_companies.find(query, projection).sort(
+                [("last_updated", -1), ("duns", -1)]
+            ).limit(limit + 1).to_list(limit + 1)
     except Exception as e:
         logger.error(f"Error fetching cached companies: {str(e)}")
-        return []
+        return {"items": [], "next_cursor": None}
+    
+    next_cursor = encode_cursor(companies[limit - 1]) if len(companies) > limit else None
+    with span("cached_companies.encode"):
+        return json_response(request, {"items": companies[:limit], "next_cursor": next_cursor})
+
+@api_router.get("/cached-companies/nearby")
+async def get_nearby_cached_companies(
+    request: Request,
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0),
+    bbox: Optional[str] = Query(None, description="west,south,east,north"),
+    limit: int = Query(50, ge=1, le=1000),
+    view: str = Query("summary", pattern="^(summary|full)$"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Cached companies within a radius and/or bounding box, nearest first (2dsphere index)"""
+    box = None
+    if bbox:
+        try:
+            box = [float(value) for value in bbox.split(",")]
+        except ValueError:
+            box = []
+        if len(box) != 4 or box[1] > box[3]:
+            raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    if latitude is None or longitude is None:
+        if box is None or radius_km is not None:
+            raise HTTPException(status_code=400, detail="latitude and longitude, or bbox, are required")
+        latitude, longitude = bbox_center(box)
+    
+    near = {
+        "near": geojson_point(latitude, longitude),
+        "distanceField": "distance_m",
+        "spherical": True,
+        "key": "location",
+    }
+    if radius_km is not None:
+        near["maxDistance"] = radius_km * 1000
+    if box is not None:
+        near["query"] = {"location": {"$geoWithin": {"$geometry": bbox_polygon(box)}}}
+    if view == "summary":
+        projection = {**COMPANY_SUMMARY_PROJECTION, "distance_km": 1}
+    else:
+        projection = {**DOCUMENT_PROJECTION, "distance_m": 0}
+    pipeline = [
+        {"$geoNear": near},
+        {"$limit": limit},
+        {"$addFields": {"distance_km": {"$round": [{"$divide": ["$distance_m", 1000]}, 3]}}},
+        {"$project": projection},
+    ]
+    try:
+        companies = await db.cached_companies.aggregate(pipeline).to_list(limit)
+    except Exception as e:
+        logger.error(f"Error in geo search: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return json_response(request, {"items": companies, "count": len(companies)})
+
+@api_router.get("/cached-companies/{duns}")
+async def get_cached_company(
+    duns: str,
+    request: Request,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get the full cached document for one company, with an ETag (304 for a matching If-None-Match)"""
+    company = await db.cached_companies.find_one({"duns": duns}, DOCUMENT_PROJECTION)
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found in cache")
+    body = encode_json(Company(**company))
+    # Every search touches last_updated and search_criteria, so they are left out of the tag
+    return conditional_response(request, body, documents_etag([company]), RESPONSE_CACHE_CONTROL)
+
+BULK_RESOLVE_MAX_IDENTIFIERS = int(os.environ.get("BULK_RESOLVE_MAX_IDENTIFIERS", "50000"))
+BULK_RESOLVE_CONCURRENCY = int(os.environ.get("BULK_RESOLVE_CONCURRENCY", "16"))
+BULK_RESOLVE_RATE_LIMIT = float(os.environ.get("BULK_RESOLVE_RATE_LIMIT", "50"))
+
+class BulkResolveRequest(BaseModel):
+    identifiers: List[str]
+
+async def resolve_identifier(identifier: str, identifier_type: str = "auto") -> Optional[Dict[str, Any]]:
+    """Resolve one DUNS, SIREN or SIRET that was not found in cached_companies
+
+    Only declared DUNS go through the company cache (and so to D&B): an
+    undeclared 9-digit number may be a SIREN, so it is only looked up as a
+    DUNS in the local catalog. Declared SIREN and SIRET the catalog does not
+    know are searched for at D&B by registration number.
+    """
+    if may_be_duns(identifier, identifier_type):
+        if identifier_type == "duns":
+            company = await company_cache.get(identifier)
+        else:
+            company = company_catalog.get(identifier)
+        if company:
+            return company.model_dump(mode="json")
+    if not may_be_registration(identifier_type):
+        return None
+    rows = company_catalog.lookup_registration(identifier, exact=True)
+    if not rows and len(identifier) == 14:
+        # A SIRET belongs to the company identified by its first 9 digits
+        rows = company_catalog.lookup_registration(identifier[:9], exact=True)
+    companies = company_catalog.companies(rows)
+    if companies:
+        return companies[0].model_dump(mode="json")
+    if identifier_type in ("siren", "siret"):
+        company = await find_registration_at_dnb(identifier)
+        if company:
+            return company.model_dump(mode="json")
+    return None
+
+@api_router.post("/bulk-resolve")
+async def bulk_resolve(
+    request: Request,
+    identifier_type: str = Query("auto", pattern=f"^({'|'.join(IDENTIFIER_TYPES)})$"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Resolve a list of identifiers (JSON body or uploaded CSV) and stream NDJSON results
+
+    ``?identifier_type=duns`` (or ``siren`` / ``siret``) says what the
+    identifiers are; only declared types are looked up at D&B.
+    """
+    
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or not hasattr(upload, "read"):
+            raise HTTPException(status_code=400, detail="Expected a CSV upload in the 'file' field")
+        identifiers = parse_identifiers_csv((await upload.read()).decode("utf-8-sig"))
+    else:
+        try:
+            identifiers = BulkResolveRequest.model_validate_json(await request.body()).identifiers
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
+    if not identifiers:
+        raise HTTPException(status_code=400, detail="No identifiers supplied")
+    if len(identifiers) > BULK_RESOLVE_MAX_IDENTIFIERS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BULK_RESOLVE_MAX_IDENTIFIERS} identifiers per request"
+        )
+    
+    logger.info(f"Bulk resolve of {len(identifiers)} identifiers")
+    
+    async def stream():
+        async for record in resolve_identifiers(
+            identifiers,
+            collection=db.cached_companies,
+            resolver=resolve_identifier,
+            identifier_type=identifier_type,
+            concurrency=BULK_RESOLVE_CONCURRENCY,
+            rate_limit=BULK_RESOLVE_RATE_LIMIT,
+        ):
+            yield ndjson_line(record)
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@api_router.post("/catalog/reload")
+async def reload_catalog(current_user: User = Depends(get_current_admin_user)):
+    """Rebuild the in-memory company catalog and its indexes (admins only)
+
+    The rebuild runs in a worker thread; searches keep using the previous
+    catalog until the new one is published.
+    """
+    # Restarted workers map the new snapshot; running ones keep theirs until reloaded
+    count = await run_in_threadpool(build_catalog_rows)
+    company_cache.clear()
+    response_cache.clear()
+    await rebuild_hierarchy_graph()
+    logger.info(f"Company catalog reloaded with {count} companies")
+    return {"count": count}
+
+@api_router.get("/cache/stats")
+async def get_cache_stats(current_user: User = Depends(get_current_active_user)):
+    """Hit, miss and staleness counters of the company and response caches"""
+    return {**company_cache.stats(), "responses": response_cache.stats()}
+
+@api_router.get("/refresh/stats")
+async def get_refresh_stats(current_user: User = Depends(get_current_active_user)):
+    """Backlog, lag and counters of the delta refresh of cached companies"""
+    return {**await delta_refresher.stats(), "feed": company_change_feed.counters}
+
+@api_router.post("/refresh/run")
+async def run_refresh_batch(current_user: User = Depends(get_current_admin_user)):
+    """Refresh one batch of stale cached companies now (admins only)
+    
+    Runs under the refresh lease, so never alongside the scheduled batches;
+    409 while another process holds it.
+    """
+    selected = await delta_refresher.run_leased_batch()
+    if selected is None:
+        raise HTTPException(status_code=409, detail="The delta refresh is running in another process")
+    return {"selected": selected, "batch": delta_refresher.last_batch if selected else None}
+
+# ============= METRICS =============
+
+# Sampling profiles of single requests, asked for with an "X-Profile: 1" header
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+profile_store = ProfileStore(max_profiles=int(os.environ.get("PROFILE_HISTORY", "20"))) if PROFILING_ENABLED else None
+
+REGISTRY.callback("company_cache_events_total", "counter", "Company cache lookups and refreshes by outcome",
+                  lambda: company_cache.counters, label="event")
+REGISTRY.callback("company_cache_entries", "gauge", "Companies held in the in-process cache",
+                  lambda: company_cache.stats()["size"])
+REGISTRY.callback("response_cache_events_total", "counter", "Response cache hits, misses and invalidations",
+                  lambda: response_cache.counters, label="event")
+REGISTRY.callback("response_cache_entries", "gauge", "Encoded responses held in the response cache",
+                  lambda: len(response_cache))
+REGISTRY.callback("search_write_behind_total", "counter", "Companies and batches handled by the write-behind queue",
+                  lambda: search_writer.counters, label="event")
+REGISTRY.callback("delta_refresh_total", "counter", "Companies handled by the delta refresh by outcome",
+                  lambda: delta_refresher.counters, label="event")
+REGISTRY.callback("company_change_feed_total", "counter", "Refresh changes published to and applied from the feed",
+                  lambda: company_change_feed.counters, label="event")
+REGISTRY.callback("catalog_companies", "gauge", "Companies in the in-memory catalog", lambda: len(company_catalog))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, span and cache metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@api_router.get("/profiles")
+async def list_profiles(current_user: User = Depends(get_current_admin_user)):
+    """Recent request profiles, newest first (admin only: stacks expose code paths and request timings)"""
+    if profile_store is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return {"items": profile_store.list()}
+
+@api_router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, current_user: User = Depends(get_current_admin_user)):
+    """Collapsed stacks of one profile, ready for flamegraph.pl or speedscope"""
+    profile = profile_store.get(profile_id) if profile_store is not None else None
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(ProfileStore.collapsed(profile))
+
+# ============= APP LIFECYCLE =============
+
+# With a snapshot path, workers map the catalog from this file (written by the
+# first process that builds it) instead of each building its own copy
+CATALOG_SNAPSHOT_PATH = os.environ.get("CATALOG_SNAPSHOT_PATH", "")
+# Recently searched companies preloaded into memory before the app reports ready
+WARMUP_COMPANIES = int(os.environ.get("WARMUP_COMPANIES", "1000"))
+
+SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", os.environ.get("PORT", "8001")))
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", os.environ.get("WEB_CONCURRENCY", "1")))
+
+# Reported by /api/health/ready; requests are served while warming up, just from colder caches
+readiness = {"ready": False, "warmed_companies": 0, "warmed_hierarchies": 0}
+warmup_task: Optional[asyncio.Task] = None
+
+async def create_db_indexes():
+    await ensure_indexes(db)
+    await ensure_hierarchy_indexes(db)
+    await ensure_refresh_indexes(db)
+    await user_repository.ensure_indexes()
+
+async def seed_users():
+    await user_repository.seed(fake_users_db.values())
+
+def build_catalog_rows() -> int:
+    """Build the catalog from its source companies and write the snapshot when configured"""
+    count = company_catalog.reload(load_catalog_companies())
+    if CATALOG_SNAPSHOT_PATH:
+        company_catalog.save(CATALOG_SNAPSHOT_PATH)
+    return count
+
+def load_catalog_rows() -> int:
+    """Map the catalog snapshot when there is one, else build the catalog (and write the snapshot)"""
+    if CATALOG_SNAPSHOT_PATH and os.path.exists(CATALOG_SNAPSHOT_PATH):
+        return company_catalog.load(CATALOG_SNAPSHOT_PATH)
+    return build_catalog_rows()
+
+async def load_company_catalog():
+    count = await run_in_threadpool(load_catalog_rows)
+    logger.info(f"Company catalog loaded with {count} companies")
+    members = await rebuild_hierarchy_graph()
+    logger.info(f"Hierarchy graph loaded with {members} members")
+
+async def warm_up():
+    """Preload recently searched companies and their hierarchy responses, then report ready"""
+    try:
+        companies = await company_cache.warm(WARMUP_COMPANIES)
+        readiness["warmed_companies"] = len(companies)
+        # Most recent last, so they are the last to be evicted
+        for position, company in enumerate(companies[-response_cache.max_entries:]):
+            if company.corporate_hierarchy:
+                cache_hierarchy_response(company)
+                readiness["warmed_hierarchies"] += 1
+            if position % 100 == 99:
+                # Let requests that arrive meanwhile through
+                await asyncio.sleep(0)
+        logger.info(f"Warmed up {readiness['warmed_companies']} companies and "
+                    f"{readiness['warmed_hierarchies']} hierarchies")
+    except Exception as e:
+        logger.error(f"Warm-up failed: {str(e)}")
+    readiness["ready"] = True
+
+async def startup():
+    global warmup_task
+    await create_db_indexes()
+    await seed_users()
+    await load_company_catalog()
+    if DNB_API_ENABLED and dnb_client.configured:
+        await dnb_client.start()
+        logger.info("D&B Direct+ client started")
+    if SEARCH_WRITE_BEHIND:
+        await search_writer.start()
+    if REFRESH_ENABLED:
+        await delta_refresher.start()
+        await company_change_feed.start()
+    warmup_task = asyncio.create_task(warm_up())
+
+async def shutdown():
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await company_change_feed.close()
+    await delta_refresher.close()
+    await search_writer.close()
+    await company_cache.close()
+    await dnb_client.close()
+    await close_password_executor()
+    client.close()
+
+@api_router.get("/health/live")
+async def liveness():
+    """The process is up and serving requests"""
+    return {"status": "ok", "pid": os.getpid()}
+
+@api_router.get("/health/ready")
+async def readiness_check():
+    """503 until the catalog is loaded and the caches are warmed up"""
+    if not readiness["ready"]:
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready", "pid": os.getpid(), "catalog_companies": len(company_catalog), **readiness}
 
 # ============= APP CONFIGURATION =============
 
 app.include_router(api_router)
 
+app.add_middleware(TimingMiddleware, profiles=profile_store)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -612,10 +1491,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
-
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    if SERVER_WORKERS > 1:
+        # Workers import the app on their own; build the catalog once here and
+        # let every worker map the same snapshot file
+        if not CATALOG_SNAPSHOT_PATH:
+            CATALOG_SNAPSHOT_PATH = os.path.join(tempfile.gettempdir(), f"dnb-catalog-{SERVER_PORT}.snapshot")
+            os.environ["CATALOG_SNAPSHOT_PATH"] = CATALOG_SNAPSHOT_PATH
+        company_catalog.reload(load_catalog_companies())
+        company_catalog.save(CATALOG_SNAPSHOT_PATH)
+        uvicorn.run("server:app", host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS, app_dir=str(ROOT_DIR))
+    else:
+        uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT)
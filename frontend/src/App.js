@@ -2,7 +2,6 @@ import React, { useState, useEffect } from "react";
 import "./App.css";
 import axios from "axios";
 import Login from "./Login";
-import * as XLSX from 'xlsx';
 import { saveAs } from 'file-saver';
 import EnhancedCompanyDetails from './EnhancedCompanyDetails';
 
@@ -41,6 +40,7 @@ function App() {
   });
   
   const [searchResults, setSearchResults] = useState([]);
+  const [nameSuggestions, setNameSuggestions] = useState([]);
   const [selectedCompany, setSelectedCompany] = useState(null);
   const [cachedCompanies, setCachedCompanies] = useState([]);
   const [loading, setLoading] = useState(false);
@@ -136,297 +136,28 @@ function App() {
   };
 
   // Excel Export Function for Corporate Hierarchy
-  const exportHierarchyToExcel = () => {
-    console.log("🚀 Export Excel clicked!");
-    
-    // Check if XLSX library is loaded
-    if (typeof XLSX === 'undefined') {
-      console.error("❌ XLSX library not loaded");
-      alert("Excel library not loaded. Please refresh the page and try again.");
-      return;
-    }
-    
-    if (!selectedCompany) {
-      console.error("❌ No selected company");
+  const exportHierarchyToExcel = async () => {
+    if (!selectedCompany || !selectedCompany.duns) {
       alert("No company selected");
       return;
     }
-    
-    console.log("✅ Selected company:", selectedCompany.company_name);
-    
-    const hierarchy = hierarchyData?.hierarchy || selectedCompany?.corporate_hierarchy;
-    if (!hierarchy) {
-      console.error("❌ No hierarchy data available");
-      alert("No hierarchy information available");
-      return;
-    }
-    
-    console.log("✅ Hierarchy data found:", hierarchy);
 
     try {
-      // Create data for Excel with navigable structure
-      const exportData = [];
-
-      // En-tête principal - Company actuelle
-      exportData.push({
-        'Level': 0,
-        'Expand': '+',
-        'Entity Type': 'Current Company',
-        'D-U-N-S': selectedCompany.duns || '',
-        'Name': selectedCompany.company_name || '',
-        'Legal Name': selectedCompany.legal_name || '',
-        'Operating Status': selectedCompany.operating_status || '',
-        'Address': selectedCompany.address ? 
-          `${selectedCompany.address.street || ''}, ${selectedCompany.address.city || ''}, ${selectedCompany.address.country || ''}`.replace(/^,\s*|,\s*$/g, '') : '',
-        'Phone': selectedCompany.phone || '',
-        'Email': selectedCompany.email || '',
-        'Website': selectedCompany.website || '',
-        'Industry': selectedCompany.industry || '',
-        'Employee Count': selectedCompany.employee_count || '',
-        'Sales Volume': selectedCompany.sales_volume || '',
-        'Year Started': selectedCompany.year_started || '',
-        'Legal Form': selectedCompany.legal_form || '',
-        'National IDs': selectedCompany.registration_numbers ? 
-          selectedCompany.registration_numbers.map(reg => `${reg.type}: ${reg.number}`).join('; ') : '',
-        'Relationship': 'Current Entity',
-        'Relationship Description': 'Selected Company'
-      });
-
-      // Global Ultimate (Level -1 - Upward)
-      if (hierarchy.globalUltimate && hierarchy.globalUltimate.duns !== selectedCompany.duns) {
-        exportData.push({
-          'Level': -1,
-          'Expand': '+',
-          'Entity Type': 'Global Ultimate',
-          'D-U-N-S': hierarchy.globalUltimate.duns || '',
-          'Name': hierarchy.globalUltimate.primaryName || '',
-          'Legal Name': hierarchy.globalUltimate.legalName || '',
-          'Operating Status': hierarchy.globalUltimate.operatingStatus || '',
-          'Address': hierarchy.globalUltimate.address ? 
-            `${hierarchy.globalUltimate.address.street || ''}, ${hierarchy.globalUltimate.address.city || ''}, ${hierarchy.globalUltimate.address.country || ''}`.replace(/^,\s*|,\s*$/g, '') : '',
-          'Phone': hierarchy.globalUltimate.phone || '',
-          'Email': hierarchy.globalUltimate.email || '',
-          'Website': hierarchy.globalUltimate.website || '',
-          'Industry': '',
-          'Employee Count': '',
-          'Sales Volume': '',
-          'Year Started': '',
-          'Legal Form': '',
-          'National IDs': '',
-          'Relationship': 'GUP',
-          'Relationship Description': 'Global Ultimate Parent'
-        });
-      }
-
-      // Domestic Ultimate (Level -1 - Upward) 
-      if (hierarchy.domesticUltimate && 
-          hierarchy.domesticUltimate.duns !== selectedCompany.duns && 
-          hierarchy.domesticUltimate.duns !== hierarchy.globalUltimate?.duns) {
-        exportData.push({
-          'Level': -1,
-          'Expand': '+',
-          'Entity Type': 'Domestic Ultimate', 
-          'D-U-N-S': hierarchy.domesticUltimate.duns || '',
-          'Name': hierarchy.domesticUltimate.primaryName || '',
-          'Legal Name': hierarchy.domesticUltimate.legalName || '',
-          'Operating Status': hierarchy.domesticUltimate.operatingStatus || '',
-          'Address': hierarchy.domesticUltimate.address ? 
-            `${hierarchy.domesticUltimate.address.street || ''}, ${hierarchy.domesticUltimate.address.city || ''}, ${hierarchy.domesticUltimate.address.country || ''}`.replace(/^,\s*|,\s*$/g, '') : '',
-          'Phone': hierarchy.domesticUltimate.phone || '',
-          'Email': hierarchy.domesticUltimate.email || '',
-          'Website': hierarchy.domesticUltimate.website || '',
-          'Industry': '',
-          'Employee Count': '',
-          'Sales Volume': '',
-          'Year Started': '',
-          'Legal Form': '',
-          'National IDs': '',
-          'Relationship': 'DUP',
-          'Relationship Description': 'Domestic Ultimate Parent'
-        });
-      }
-
-      // Parent Direct (Level -1 - Upward)
-      if (hierarchy.parent && 
-          hierarchy.parent.duns !== selectedCompany.duns && 
-          hierarchy.parent.duns !== hierarchy.globalUltimate?.duns &&
-          hierarchy.parent.duns !== hierarchy.domesticUltimate?.duns) {
-        exportData.push({
-          'Level': -1,
-          'Expand': '+',
-          'Entity Type': 'Parent Direct',
-          'D-U-N-S': hierarchy.parent.duns || '',
-          'Name': hierarchy.parent.primaryName || '',
-          'Legal Name': hierarchy.parent.legalName || '',
-          'Operating Status': hierarchy.parent.operatingStatus || '',
-          'Address': hierarchy.parent.address ? 
-            `${hierarchy.parent.address.street || ''}, ${hierarchy.parent.address.city || ''}, ${hierarchy.parent.address.country || ''}`.replace(/^,\s*|,\s*$/g, '') : '',
-          'Phone': hierarchy.parent.phone || '',
-          'Email': hierarchy.parent.email || '',
-          'Website': hierarchy.parent.website || '',
-          'Industry': '',
-          'Employee Count': '',
-          'Sales Volume': '',
-          'Year Started': '',
-          'Legal Form': '',
-          'National IDs': '',
-          'Relationship': hierarchy.parent.relationshipCode || 'PAR',
-          'Relationship Description': hierarchy.parent.relationshipDescription || 'Parent Direct'
-        });
-      }
-
-      // Subsidiaries (Level +1 - Downward)
-      if (hierarchy.subsidiaries && hierarchy.subsidiaries.length > 0) {
-        hierarchy.subsidiaries.forEach((subsidiary, index) => {
-          exportData.push({
-            'Level': subsidiary.hierarchyLevel || 1,
-            'Expand': '+',
-            'Entity Type': 'Subsidiary',
-            'D-U-N-S': subsidiary.duns || '',
-            'Name': subsidiary.primaryName || '',
-            'Legal Name': subsidiary.legalName || '',
-            'Operating Status': subsidiary.operatingStatus || '',
-            'Address': subsidiary.address ? 
-              `${subsidiary.address.street || ''}, ${subsidiary.address.city || ''}, ${subsidiary.address.country || ''}`.replace(/^,\s*|,\s*$/g, '') : '',
-            'Phone': subsidiary.phone || '',
-            'Email': subsidiary.email || '',
-            'Website': subsidiary.website || '',
-            'Industry': subsidiary.industry || '',
-            'Employee Count': subsidiary.employeeCount || '',
-            'Sales Volume': subsidiary.salesVolume || '',
-            'Year Started': subsidiary.yearStarted || '',
-            'Legal Form': subsidiary.legalForm || '',
-            'National IDs': subsidiary.nationalIds || '',
-            'Relationship': subsidiary.relationshipCode || 'SUB',
-            'Relationship Description': subsidiary.relationshipDescription || 'Wholly Owned Subsidiary'
-          });
-        });
-      }
-
-      // Family Tree Members (tous les niveaux)
-      if (hierarchy.familyTreeMembers && hierarchy.familyTreeMembers.length > 0) {
-        hierarchy.familyTreeMembers.forEach((member, index) => {
-          // Éviter les doublons
-          const exists = exportData.some(row => row['D-U-N-S'] === member.duns);
-          if (!exists) {
-            exportData.push({
-              'Level': member.hierarchyLevel || 0,
-              'Expand': '+',
-              'Entity Type': 'Family Tree Member',
-              'D-U-N-S': member.duns || '',
-              'Name': member.primaryName || '',
-              'Legal Name': member.legalName || '',
-              'Operating Status': member.operatingStatus || '',
-              'Address': member.address ? 
-                `${member.address.street || ''}, ${member.address.city || ''}, ${member.address.country || ''}`.replace(/^,\s*|,\s*$/g, '') : '',
-              'Phone': member.phone || '',
-              'Email': member.email || '',
-              'Website': member.website || '',
-              'Industry': member.industry || '',
-              'Employee Count': member.employeeCount || '',
-              'Sales Volume': member.salesVolume || '',
-              'Year Started': member.yearStarted || '',
-              'Legal Form': member.legalForm || '',
-              'National IDs': member.nationalIds || '',
-              'Relationship': member.relationshipCode || '',
-              'Relationship Description': member.relationshipDescription || ''
-            });
-          }
-        });
-      }
-
-      console.log("📊 Export data prepared:", exportData.length, "entities");
-
-      // Trier par niveau pour avoir une structure logique
-      exportData.sort((a, b) => (a.Level || 0) - (b.Level || 0));
-
-      // Vérification des dépendances XLSX
-      if (!XLSX || !XLSX.utils || !XLSX.utils.book_new) {
-        console.error("❌ XLSX library not loaded properly");
-        alert("Erreur: Bibliothèque Excel non chargée. Actualisez la page.");
-        return;
-      }
-
-      // Création du classeur Excel
-      const workbook = XLSX.utils.book_new();
-
-      // Feuille principale avec hiérarchie
-      const worksheet = XLSX.utils.json_to_sheet(exportData);
-
-      // Définir les largeurs des colonnes
-      const columnWidths = [
-        { wch: 8 },   // Level
-        { wch: 8 },   // Expand  
-        { wch: 15 },  // Entity Type
-        { wch: 12 },  // D-U-N-S
-        { wch: 30 },  // Name
-        { wch: 30 },  // Legal Name
-        { wch: 15 },  // Operating Status
-        { wch: 40 },  // Address
-        { wch: 15 },  // Phone
-        { wch: 25 },  // Email
-        { wch: 25 },  // Website
-        { wch: 20 },  // Industry
-        { wch: 15 },  // Employee Count
-        { wch: 15 },  // Sales Volume
-        { wch: 12 },  // Year Started
-        { wch: 15 },  // Legal Form
-        { wch: 30 },  // National IDs
-        { wch: 12 },  // Relationship
-        { wch: 25 }   // Relationship Description
-      ];
-
-      worksheet['!cols'] = columnWidths;
-
-      // Ajouter la feuille au classeur
-      XLSX.utils.book_append_sheet(workbook, worksheet, 'Corporate Hierarchy');
-
-      // Metadata sheet
-      const metadataSheet = XLSX.utils.json_to_sheet([
-        { Property: 'Company Name', Value: selectedCompany.company_name || '' },
-        { Property: 'D-U-N-S Number', Value: selectedCompany.duns || '' },
-        { Property: 'Export Date', Value: new Date().toLocaleString() },
-        { Property: 'Total Entities', Value: exportData.length },
-        { Property: 'Data Source', Value: hierarchyData?.data_source || selectedCompany.data_source || 'D&B API' },
-        { Property: 'Language', Value: 'English' },
-        { Property: 'Instructions', Value: 'Use Level column to understand hierarchy. Negative levels = upward (parents), Positive levels = downward (subsidiaries)' }
-      ]);
-
-      XLSX.utils.book_append_sheet(workbook, metadataSheet, 'Metadata');
-
-      console.log("📋 Excel workbook created successfully");
-
-      // Générer et télécharger le fichier
-      const excelBuffer = XLSX.write(workbook, { bookType: 'xlsx', type: 'array' });
-      const blob = new Blob([excelBuffer], { 
-        type: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;charset=UTF-8' 
+      // The backend streams the workbook, deduplicated and sorted by level
+      const response = await axios.get(`${API}/company-hierarchy/${selectedCompany.duns}/export`, {
+        params: { format: 'xlsx' },
+        responseType: 'blob'
       });
-      
-      const fileName = `Corporate_Hierarchy_${(selectedCompany.company_name || 'Company').replace(/[^a-zA-Z0-9]/g, '_')}_${selectedCompany.duns || 'Unknown'}_${new Date().toISOString().split('T')[0]}.xlsx`;
-      
-      console.log("💾 Downloading file:", fileName);
-      
-      // Vérification file-saver
-      if (!saveAs) {
-        console.error("❌ file-saver library not loaded");
-        // Fallback: création d'un lien de téléchargement manuel
-        const url = URL.createObjectURL(blob);
-        const link = document.createElement('a');
-        link.href = url;
-        link.download = fileName;
-        document.body.appendChild(link);
-        link.click();
-        document.body.removeChild(link);
-        URL.revokeObjectURL(url);
-        console.log("✅ Fallback download method used");
-      } else {
-        saveAs(blob, fileName);
-        console.log("✅ File download initiated with file-saver");
-      }
 
+      const fileName = `Corporate_Hierarchy_${(selectedCompany.company_name || 'Company').replace(/[^a-zA-Z0-9]/g, '_')}_${selectedCompany.duns}_${new Date().toISOString().split('T')[0]}.xlsx`;
+      saveAs(response.data, fileName);
     } catch (error) {
       console.error("❌ Export Excel error:", error);
-      alert(`Erreur lors de l'export: ${error.message}`);
+      if (error.response?.status === 404) {
+        alert("No hierarchy information available");
+      } else {
+        alert(`Erreur lors de l'export: ${error.message}`);
+      }
     }
   };
 
@@ -446,6 +177,33 @@ function App() {
     }
   }, [isAuthenticated]);
 
+  // Company name autocomplete: one request once typing pauses, stale ones cancelled
+  useEffect(() => {
+    const prefix = searchCriteria.company_name.trim();
+    if (!isAuthenticated || prefix.length < 2) {
+      setNameSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/suggest`, {
+          params: { q: prefix, limit: 8 },
+          signal: controller.signal
+        });
+        setNameSuggestions(response.data.suggestions);
+      } catch (error) {
+        if (!axios.isCancel(error)) {
+          setNameSuggestions([]);
+        }
+      }
+    }, 150);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchCriteria.company_name, isAuthenticated]);
+
   // Vérifier l'authentification au chargement
   const checkAuthentication = async () => {
     const token = localStorage.getItem('auth_token');
@@ -492,12 +250,22 @@ function App() {
   const fetchCachedCompanies = async () => {
     try {
       const response = await axios.get(`${API}/cached-companies`);
-      setCachedCompanies(response.data);
+      setCachedCompanies(response.data.items);
     } catch (error) {
       console.error("Error fetching cached companies:", error);
     }
   };
 
+  // History entries are summaries; load the full document only when opened
+  const selectCachedCompany = async (duns) => {
+    try {
+      const response = await axios.get(`${API}/cached-companies/${duns}`);
+      handleSelectCompany(response.data);
+    } catch (error) {
+      console.error("Error fetching cached company:", error);
+    }
+  };
+
   const handleInputChange = (field, value) => {
     setSearchCriteria(prev => ({
       ...prev,
@@ -545,7 +313,8 @@ function App() {
         }
       });
 
-      const response = await axios.post(`${API}/unified-search`, filteredCriteria);
+      // The result list does not need the hierarchy; it is fetched per company
+      const response = await axios.post(`${API}/unified-search?view=list`, filteredCriteria);
       setSearchResults(response.data.results);
       
       if (response.data.results.length === 0) {
@@ -605,6 +374,7 @@ function App() {
       fetchHierarchyData(company.duns);
     }
     
+    // Every filled-in criterion must match, so only identifying fields are carried over
     setSearchCriteria({
       // Identification
       duns: company.duns || "",
@@ -614,18 +384,14 @@ function App() {
       // Adresse
       address: company.address ? company.address.street || "" : "",
       city: company.address?.city || "",
-      postal_code: company.address?.postal_code || "",
-      state: company.address?.state || "",
+      postal_code: "",
+      state: "",
       country: company.address?.country || "",
-      continent: company.address?.continent || 
-        (company.address?.country?.includes('United States') ? 'Amérique du Nord' :
-         company.address?.country?.includes('France') ? 'Europe' :
-         company.address?.country?.includes('Sweden') ? 'Europe' :
-         company.address?.country?.includes('India') ? 'Asie' : ''),
+      continent: "",
       
       // Contact
-      phone_fax: company.phone || "",
-      has_phone: !!company.phone,
+      phone_fax: "",
+      has_phone: false,
       has_fax: false
     });
   };
@@ -902,8 +668,17 @@ function App() {
                       value={searchCriteria.company_name}
                       onChange={(e) => handleInputChange("company_name", e.target.value)}
                       placeholder="Ex: Apple Inc., Microsoft Corp..."
+                      list="company-name-suggestions"
+                      autoComplete="off"
                       className="w-full px-4 py-2 border border-gray-300 rounded-md focus:ring-2 focus:ring-blue-500 focus:border-transparent"
                     />
+                    <datalist id="company-name-suggestions">
+                      {nameSuggestions.map((suggestion) => (
+                        <option key={suggestion.duns} value={suggestion.company_name}>
+                          {[suggestion.city, suggestion.country].filter(Boolean).join(", ")}
+                        </option>
+                      ))}
+                    </datalist>
                     
                     {/* Checkbox Exact Match */}
                     {searchCriteria.company_name && (
@@ -1005,12 +780,12 @@ function App() {
                     >
                       <option value="">{"Select continent"}</option>
                       <option value="Europe">{"Europe"}</option>
-                      <option value="Amérique du Nord">{"North America"}</option>
-                      <option value="Amérique du Sud">{"South America"}</option>
-                      <option value="Asie">{"Asia"}</option>
-                      <option value="Afrique">{"Africa"}</option>
-                      <option value="Océanie">{"Oceania"}</option>
-                      <option value="Antarctique">{"Antarctica"}</option>
+                      <option value="North America">{"North America"}</option>
+                      <option value="South America">{"South America"}</option>
+                      <option value="Asia">{"Asia"}</option>
+                      <option value="Africa">{"Africa"}</option>
+                      <option value="Oceania">{"Oceania"}</option>
+                      <option value="Antarctica">{"Antarctica"}</option>
                     </select>
                   </div>
                 </div>
@@ -1300,7 +1075,7 @@ function App() {
                 <div className="divide-y divide-gray-200">
                   {cachedCompanies.map((company, index) => (
                     <div key={index} className="px-6 py-4 hover:bg-gray-50 cursor-pointer"
-                         onClick={() => handleSelectCompany(company)}>
+                         onClick={() => selectCachedCompany(company.duns)}>
                       <div className="flex justify-between items-start">
                         <div className="flex-1">
                           <h4 className="text-sm font-medium text-gray-900">
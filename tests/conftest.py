@@ -0,0 +1,55 @@
+"""Shared fixtures: the backend modules are imported from ``backend/`` as the server runs them."""
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+ADMIN_PASSWORD = "D&B2025Secure!"
+
+
+@pytest.fixture(scope="session")
+def server():
+    """The FastAPI app module, talking to an in-memory mongomock database."""
+    from benchmarks import load_server
+    return load_server(mock_db=True)
+
+
+@pytest.fixture
+def api(server):
+    """Opens an HTTP client on the app, with startup and shutdown run, logged in as ``username``."""
+
+    @asynccontextmanager
+    async def client(username: str = "admin", password: str = ADMIN_PASSWORD):
+        async with server.app.router.lifespan_context(server.app):
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                response = await http.post("/api/login", json={"username": username, "password": password})
+                response.raise_for_status()
+                http.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+                yield http
+
+    return client
+
+
+@pytest.fixture
+def analyst(server):
+    """Active user without admin rights, stored before the app starts."""
+    password = "analyst-password"
+    server.fake_users_db["analyst"] = {
+        "username": "analyst",
+        "full_name": "Analyst User",
+        "email": "analyst@dnb.com",
+        "hashed_password": server.get_password_hash(password),
+        "disabled": False,
+    }
+    yield "analyst", password
+    del server.fake_users_db["analyst"]
+    asyncio.run(server.db.users.delete_many({"username": "analyst"}))
+    server.user_repository.invalidate("analyst")
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+import mongomock_motor
+import pytest
+
+from auth_cache import UserRepository
+
+
+def test_disabled_user_is_rejected_at_once(api, analyst):
+    async def scenario():
+        async with api(*analyst) as analyst_client, api() as admin_client:
+            assert (await analyst_client.get("/api/verify-token")).status_code == 200
+            assert (await analyst_client.post("/api/users/admin/disable")).status_code == 403
+
+            response = await admin_client.post(f"/api/users/{analyst[0]}/disable")
+            assert response.json() == {"username": analyst[0], "disabled": True}
+            assert (await analyst_client.get("/api/verify-token")).status_code == 400
+
+            assert (await admin_client.post(f"/api/users/{analyst[0]}/enable")).status_code == 200
+            assert (await analyst_client.get("/api/verify-token")).status_code == 200
+            assert (await admin_client.post("/api/users/nobody/disable")).status_code == 404
+            assert (await admin_client.post("/api/users/admin/disable")).status_code == 400
+
+    asyncio.run(scenario())
+
+
+def test_other_workers_recheck_disabled_after_ttl(server):
+    async def scenario():
+        users = mongomock_motor.AsyncMongoMockClient().db.users
+        await users.insert_one({"username": "analyst", "hashed_password": "x", "disabled": False})
+        this_worker = UserRepository(users, server.UserInDB, ttl=0.2)
+        other_worker = UserRepository(users, server.UserInDB, ttl=0.2)
+        assert not (await other_worker.get("analyst")).disabled
+
+        assert await this_worker.set_disabled("analyst")
+        assert (await this_worker.get("analyst")).disabled
+        # Still cached by the other worker, until its copy expires
+        assert not (await other_worker.get("analyst")).disabled
+        time.sleep(0.25)
+        assert (await other_worker.get("analyst")).disabled
+
+    asyncio.run(scenario())
+
+
+def test_user_cache_is_bounded(server):
+    repository = UserRepository(None, server.UserInDB, max_entries=2)
+    for username in ("a", "b", "c"):
+        repository.remember(server.UserInDB(username=username, hashed_password="x"))
+    assert len(repository) == 2
+    assert repository.cached("a") is None
+    assert repository.cached("c").username == "c"
@@ -0,0 +1,81 @@
+import asyncio
+
+import mongomock_motor
+import pytest
+
+from bulk_resolve import find_cached, resolve_identifiers
+from persistence import storage_document
+
+
+def cached_companies(*documents):
+    collection = mongomock_motor.AsyncMongoMockClient().db.cached_companies
+    asyncio.run(collection.insert_many([storage_document(document) for document in documents]))
+    return collection
+
+
+def test_formatted_registration_numbers_are_matched_normalized():
+    collection = cached_companies(
+        {"duns": "804735132", "registration_numbers": [{"number": "94-2404110", "type": "EIN"}]},
+        {"duns": "150483782", "registration_numbers": [{"number": "552 081 317", "type": "SIREN"}]},
+    )
+
+    found = asyncio.run(find_cached(collection, ["942404110", "552081317", "804735132"]))
+
+    assert found["942404110"]["duns"] == "804735132"
+    assert found["552081317"]["duns"] == "150483782"
+    assert found["804735132"]["duns"] == "804735132"
+    assert "registration_keys" not in found["942404110"]
+
+
+def test_identifier_type_limits_what_is_matched():
+    collection = cached_companies(
+        {"duns": "804735132", "registration_numbers": [{"number": "552 081 317", "type": "SIREN"}]},
+        {"duns": "552081317"},
+    )
+
+    as_duns = asyncio.run(find_cached(collection, ["552081317"], "duns"))
+    as_siren = asyncio.run(find_cached(collection, ["552081317"], "siren"))
+
+    assert as_duns["552081317"]["duns"] == "552081317"
+    assert as_siren["552081317"]["duns"] == "804735132"
+
+
+@pytest.mark.parametrize("identifier_type, upstream", [("auto", False), ("siren", False), ("duns", True)])
+def test_only_declared_duns_reach_the_company_cache(server, monkeypatch, identifier_type, upstream):
+    calls = []
+
+    async def get(duns):
+        calls.append(duns)
+        return None
+
+    monkeypatch.setattr(server.company_cache, "get", get)
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient().db.cached_companies
+        return [record async for record in resolve_identifiers(
+            ["123456782"], collection=collection, resolver=server.resolve_identifier,
+            identifier_type=identifier_type,
+        )]
+
+    records = asyncio.run(scenario())
+
+    assert records[0] == {"identifier": "123456782", "status": "not_found"}
+    assert calls == (["123456782"] if upstream else [])
+
+
+@pytest.mark.parametrize("identifier_type, searched", [("auto", False), ("siren", True), ("siret", True)])
+def test_declared_registrations_are_searched_at_dnb(server, monkeypatch, identifier_type, searched):
+    apple = server.create_mock_company_data("804735132")
+    calls = []
+
+    async def find_registration_at_dnb(number):
+        calls.append(number)
+        return apple
+
+    monkeypatch.setattr(server, "find_registration_at_dnb", find_registration_at_dnb)
+    identifier = "55208131700014" if identifier_type == "siret" else "552081317"
+
+    company = asyncio.run(server.resolve_identifier(identifier, identifier_type))
+
+    assert calls == ([identifier] if searched else [])
+    assert (company["duns"] if company else None) == ("804735132" if searched else None)
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+
+def test_reload_requires_admin(server, api, analyst):
+    async def scenario():
+        async with api(*analyst) as client:
+            response = await client.post("/api/catalog/reload")
+            assert response.status_code == 403
+        async with api() as client:
+            response = await client.post("/api/catalog/reload")
+            assert response.status_code == 200
+            assert response.json() == {"count": len(server.MOCK_COMPANY_DUNS)}
+
+    asyncio.run(scenario())
+
+
+def test_reload_does_not_block_other_requests(server, api, monkeypatch):
+    load_catalog_companies = server.load_catalog_companies
+
+    def slow_catalog_companies():
+        time.sleep(0.5)
+        return load_catalog_companies()
+
+    monkeypatch.setattr(server, "load_catalog_companies", slow_catalog_companies)
+
+    async def scenario():
+        async with api() as client:
+            reload = asyncio.create_task(client.post("/api/catalog/reload"))
+            started = time.perf_counter()
+            # A reload on the event loop would hold up this sleep as well
+            await asyncio.sleep(0.1)
+            response = await client.get("/api/health/live")
+            elapsed = time.perf_counter() - started
+            assert response.status_code == 200
+            assert not reload.done()
+            assert elapsed < 0.35
+            assert (await reload).status_code == 200
+
+    asyncio.run(scenario())
@@ -0,0 +1,66 @@
+import pytest
+
+from catalog import CompanyCatalog
+
+APPLE = "804735132"
+TESLA = "832563616"
+
+
+def mock_companies(server):
+    return [server.create_mock_company_data(duns) for duns in server.MOCK_COMPANY_DUNS]
+
+
+def catalog_contents(catalog: CompanyCatalog):
+    # last_updated is not a column: each view is stamped when it is built
+    return {company.duns: company.model_dump(exclude={"last_updated"})
+            for company in catalog.companies(catalog.lookup_all())}
+
+
+def test_snapshot_round_trip(server, tmp_path):
+    built = CompanyCatalog(mock_companies(server), model=server.Company)
+    path = str(tmp_path / "catalog.snapshot")
+    built.save(path)
+
+    loaded = CompanyCatalog(model=server.Company)
+    assert loaded.load(path) == len(built) == len(server.MOCK_COMPANY_DUNS)
+
+    assert catalog_contents(loaded) == catalog_contents(built)
+    # Indexes are rebuilt from the mapped columns
+    assert loaded.suggest("app") == built.suggest("app")
+    assert loaded.lookup_phone("4089961010") == built.lookup_phone("4089961010")
+    assert loaded.lookup_continent("North America") == built.lookup_continent("North America")
+
+
+def test_saving_over_a_mapped_snapshot_replaces_the_file(server, tmp_path):
+    companies = mock_companies(server)
+    source = CompanyCatalog(companies, model=server.Company)
+    path = str(tmp_path / "catalog.snapshot")
+    source.save(path)
+    mapped = CompanyCatalog(model=server.Company)
+    mapped.load(path)
+
+    # The catalog changes: Apple is renamed and Tesla is gone
+    changed = [company.model_copy(update={"company_name": "Apple Computer"}) if company.duns == APPLE else company
+               for company in companies if company.duns != TESLA]
+    source.reload(changed)
+    source.save(path)
+    reloaded = CompanyCatalog(model=server.Company)
+    reloaded.load(path)
+
+    # A new file was renamed over the old one, so the earlier mapping still reads the old rows
+    assert mapped.get(APPLE).company_name == "Apple Inc."
+    assert mapped.get(TESLA) is not None
+    assert reloaded.get(APPLE).company_name == "Apple Computer"
+    assert reloaded.get(TESLA) is None
+    assert len(reloaded) == len(companies) - 1
+    assert [entry.name for entry in tmp_path.iterdir()] == ["catalog.snapshot"]
+
+
+def test_other_files_are_not_loaded(server, tmp_path):
+    path = tmp_path / "catalog.snapshot"
+    path.write_bytes(b"not a snapshot" * 10)
+    catalog = CompanyCatalog(mock_companies(server), model=server.Company)
+
+    with pytest.raises(ValueError):
+        catalog.load(str(path))
+    assert len(catalog) == len(server.MOCK_COMPANY_DUNS)
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import mongomock_motor
+import pytest
+
+from cache import TieredCompanyCache
+from persistence import storage_document
+
+DAY = 24 * 3600
+INGESTED = "123456789"
+
+
+def stored_company(server, age: timedelta):
+    """Apple's mock data filed under a DUNS the catalog does not know, last updated ``age`` ago."""
+    company = server.create_mock_company_data("804735132").model_copy(update={"duns": INGESTED})
+    document = storage_document(company.model_dump(exclude={"search_criteria"}))
+    document["last_updated"] = datetime.now(timezone.utc) - age
+    return document
+
+
+def company_cache(server, collection, loader):
+    return TieredCompanyCache(collection, loader, server.Company, ttl=DAY, max_stale=7 * DAY, negative_ttl=60)
+
+
+async def settle(cache):
+    while cache._refreshing:
+        await asyncio.gather(*cache._refreshing)
+
+
+@pytest.mark.parametrize("age_days", [2, 10])
+@pytest.mark.parametrize("outcome", ["none", "error"])
+def test_stored_copy_is_kept_when_the_source_has_nothing(server, age_days, outcome):
+    calls = []
+
+    async def loader(duns):
+        calls.append(duns)
+        if outcome == "error":
+            raise RuntimeError("D&B unavailable")
+        return None
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient().db.cached_companies
+        await collection.insert_one(stored_company(server, timedelta(days=age_days)))
+        cache = company_cache(server, collection, loader)
+        first = await cache.get(INGESTED)
+        await settle(cache)
+        second = await cache.get(INGESTED)
+        await settle(cache)
+        return cache, first, second
+
+    cache, first, second = asyncio.run(scenario())
+
+    assert first.duns == second.duns == INGESTED
+    # Retried only after negative_ttl, not on every read
+    assert calls == [INGESTED]
+    assert cache.counters["refreshes"] == 0
+    assert cache.counters["refresh_misses" if outcome == "none" else "refresh_errors"] == 1
+
+
+def test_only_duns_missing_from_mongo_are_cached_negatively(server):
+    calls = []
+
+    async def loader(duns):
+        calls.append(duns)
+        return None
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient().db.cached_companies
+        cache = company_cache(server, collection, loader)
+        return cache, [await cache.get("999999999") for _ in range(2)]
+
+    cache, results = asyncio.run(scenario())
+
+    assert results == [None, None]
+    assert calls == ["999999999"]
+    assert cache.counters["negative_hits"] == 1
+
+
+def test_successful_refresh_replaces_the_stale_copy(server):
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient().db.cached_companies
+        await collection.insert_one(stored_company(server, timedelta(days=2)))
+
+        async def loader(duns):
+            return server.Company(**{**stored_company(server, timedelta()), "company_name": "Renamed Inc."})
+
+        cache = company_cache(server, collection, loader)
+        stale = await cache.get(INGESTED)
+        await settle(cache)
+        return cache, stale, await cache.get(INGESTED)
+
+    cache, stale, fresh = asyncio.run(scenario())
+
+    assert stale.company_name == "Apple Inc."
+    assert fresh.company_name == "Renamed Inc."
+    assert cache.counters["refreshes"] == 1
+
+
+def test_stale_company_outside_the_catalog_is_still_served(server, api):
+    async def scenario():
+        await server.db.cached_companies.insert_one(stored_company(server, timedelta(days=2)))
+        try:
+            async with api() as client:
+                statuses = []
+                for _ in range(3):
+                    server.response_cache.clear()
+                    statuses.append((await client.get(f"/api/company-hierarchy/{INGESTED}")).status_code)
+                    await settle(server.company_cache)
+                return statuses
+        finally:
+            await server.db.cached_companies.delete_many({"duns": INGESTED})
+            server.company_cache.invalidate(INGESTED)
+
+    assert asyncio.run(scenario()) == [200, 200, 200]
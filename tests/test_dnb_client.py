@@ -0,0 +1,160 @@
+import asyncio
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from dnb_client import DnbClient
+
+TOKEN_URL = "/v3/token"
+
+
+class StandIn:
+    """Local stand-in for Direct+: issues numbered tokens and answers company lookups."""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.tokens_issued = 0
+        self.company_calls = 0
+        self.search_payloads = []
+        self.revoked = set()
+        self.client_ports = []
+
+    async def token(self, request: Request) -> JSONResponse:
+        self.tokens_issued += 1
+        return JSONResponse({"access_token": f"token-{self.tokens_issued}", "expiresIn": 3600})
+
+    async def company(self, request: Request) -> JSONResponse:
+        self.company_calls += 1
+        self.client_ports.append(request.client.port)
+        if request.headers["authorization"].split()[-1] in self.revoked:
+            return JSONResponse({"error": "expired"}, status_code=401)
+        # Slow enough for concurrent callers to overlap
+        await asyncio.sleep(self.delay)
+        duns = request.path_params["duns"]
+        return JSONResponse({"organization": {"duns": duns}})
+
+    async def search(self, request: Request) -> JSONResponse:
+        payload = await request.json()
+        self.search_payloads.append(payload)
+        await asyncio.sleep(self.delay)
+        return JSONResponse({"searchCandidates": [{"organization": {"duns": "804735132"}}], "criteria": payload})
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route(TOKEN_URL, self.token, methods=["POST"]),
+            Route("/v1/data/duns/{duns}", self.company),
+            Route("/v1/search/criteria", self.search, methods=["POST"]),
+        ])
+
+
+def client_for(base_url: str) -> DnbClient:
+    return DnbClient("key", "secret", f"{base_url}/v1", f"{base_url}{TOKEN_URL}")
+
+
+def test_concurrent_identical_requests_make_one_upstream_call():
+    stand_in = StandIn()
+
+    async def scenario():
+        client = client_for("http://dnb.test")
+        await client.start(transport=httpx.ASGITransport(app=stand_in.app()))
+        try:
+            results = await asyncio.gather(*(client.get_company("804735132") for _ in range(20)))
+        finally:
+            await client.close()
+        assert all(result == {"organization": {"duns": "804735132"}} for result in results)
+        assert client.stats["coalesced_requests"] == 19
+
+    asyncio.run(scenario())
+    assert stand_in.tokens_issued == 1
+    assert stand_in.company_calls == 1
+
+
+def test_concurrent_equivalent_searches_make_one_upstream_call():
+    stand_in = StandIn()
+
+    async def scenario():
+        client = client_for("http://dnb.test")
+        await client.start(transport=httpx.ASGITransport(app=stand_in.app()))
+        try:
+            # Key order, surrounding whitespace and unset fields do not make a different search
+            payloads = [
+                {"registrationNumber": "552081317", "countryISOAlpha2Code": "FR"},
+                {"countryISOAlpha2Code": "FR", "registrationNumber": " 552081317 "},
+                {"registrationNumber": "552081317", "countryISOAlpha2Code": "FR", "primaryName": None},
+            ]
+            results = await asyncio.gather(*(client.search_criteria(payloads[n % 3]) for n in range(12)))
+            other = await client.search_criteria({"registrationNumber": "542051180"})
+        finally:
+            await client.close()
+        assert all(result["searchCandidates"] == results[0]["searchCandidates"] for result in results)
+        assert client.stats["coalesced_requests"] == 11
+        assert other["criteria"] == {"registrationNumber": "542051180"}
+
+    asyncio.run(scenario())
+    assert len(stand_in.search_payloads) == 2
+
+
+def test_token_is_fetched_once_and_refreshed_after_401():
+    stand_in = StandIn(delay=0)
+
+    async def scenario():
+        client = client_for("http://dnb.test")
+        await client.start(transport=httpx.ASGITransport(app=stand_in.app()))
+        try:
+            await asyncio.gather(*(client.get_company(f"80473513{digit}") for digit in range(5)))
+            assert stand_in.tokens_issued == 1
+            stand_in.revoked.add("token-1")
+            assert await client.get_company("804735132") == {"organization": {"duns": "804735132"}}
+        finally:
+            await client.close()
+        assert client.stats["token_refreshes"] == 2
+
+    asyncio.run(scenario())
+    assert stand_in.tokens_issued == 2
+    # Five lookups, then the rejected call and its retry
+    assert stand_in.company_calls == 7
+
+
+def test_pooled_connection_is_reused():
+    stand_in = StandIn(delay=0)
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(stand_in.app(), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 10
+        while not server.started:
+            assert time.monotonic() < deadline, "stand-in server did not start"
+            time.sleep(0.01)
+
+        async def scenario():
+            client = client_for(f"http://127.0.0.1:{port}")
+            await client.start()
+            pool = client._http
+            try:
+                for digit in range(5):
+                    await client.get_company(f"80473513{digit}")
+                # Starting again keeps the pool
+                await client.start()
+                assert client._http is pool
+            finally:
+                await client.close()
+
+        asyncio.run(scenario())
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    assert stand_in.tokens_issued == 1
+    assert stand_in.company_calls == 5
+    # Every lookup went over the same keep-alive connection
+    assert len(set(stand_in.client_ports)) == 1
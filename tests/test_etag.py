@@ -0,0 +1,73 @@
+import asyncio
+
+import responses
+
+APPLE = "804735132"
+
+
+def test_etags_ignore_search_and_read_times(server, api):
+    async def scenario():
+        async with api() as client:
+            etags = {}
+            for attempt in range(2):
+                # A fresh encode each time, with new searched_at and last_updated stamps
+                server.response_cache.clear()
+                await asyncio.sleep(0.01)
+                search = await client.post("/api/unified-search", json={"company_name": "Apple"})
+                hierarchy = await client.get(f"/api/company-hierarchy/{APPLE}")
+                assert search.status_code == hierarchy.status_code == 200
+                etags[attempt] = (search.headers["etag"], hierarchy.headers["etag"],
+                                  search.json()["results"][0]["last_updated"])
+            assert etags[0][:2] == etags[1][:2]
+            assert all(etag.startswith('W/"') for etag in etags[0][:2])
+            assert etags[0][2] != etags[1][2]
+
+            revalidated = await client.get(f"/api/company-hierarchy/{APPLE}",
+                                           headers={"If-None-Match": etags[0][1]})
+            assert revalidated.status_code == 304
+
+    asyncio.run(scenario())
+
+
+def test_identity_and_gzip_variants_share_a_weak_etag(server, api, monkeypatch):
+    monkeypatch.setattr(responses, "COMPRESS_MIN_SIZE", 0)
+
+    async def scenario():
+        async with api() as client:
+            path = f"/api/company-hierarchy/{APPLE}"
+            identity = await client.get(path, headers={"Accept-Encoding": "identity"})
+            gzipped = await client.get(path, headers={"Accept-Encoding": "gzip"})
+            etag = identity.headers["etag"]
+            revalidated = [
+                (await client.get(path, headers={"If-None-Match": tag, "Accept-Encoding": "gzip"})).status_code
+                for tag in (etag, etag.removeprefix("W/"))
+            ]
+            return identity, gzipped, revalidated
+
+    identity, gzipped, revalidated = asyncio.run(scenario())
+
+    assert "content-encoding" not in identity.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    # Different bytes on the wire, so the shared tag must be weak
+    assert identity.headers["etag"] == gzipped.headers["etag"]
+    assert identity.headers["etag"].startswith('W/"')
+    assert revalidated == [304, 304]
+
+
+def test_cached_company_is_served_with_its_etag(server, api):
+    async def scenario():
+        async with api() as client:
+            # Stored by the search's write-behind queue, flushed on shutdown
+            await client.post("/api/unified-search", json={"company_name": "Apple"})
+        async with api() as client:
+            found = await client.get(f"/api/cached-companies/{APPLE}")
+            revalidated = await client.get(f"/api/cached-companies/{APPLE}",
+                                           headers={"If-None-Match": found.headers["etag"]})
+            return found, revalidated
+
+    found, revalidated = asyncio.run(scenario())
+
+    assert found.status_code == 200
+    assert found.json()["duns"] == APPLE
+    assert "content_hash" not in found.json()
+    assert revalidated.status_code == 304
@@ -0,0 +1,69 @@
+import asyncio
+import csv
+import io
+import re
+
+import openpyxl
+
+from export import EXPORT_HEADERS, XLSX_MEDIA_TYPE
+
+APPLE = "804735132"
+
+
+def export(api, fmt: str):
+    async def scenario():
+        async with api() as client:
+            return await client.get(f"/api/company-hierarchy/{APPLE}/export", params={"format": fmt})
+
+    return asyncio.run(scenario())
+
+
+def assert_hierarchy_rows(rows):
+    levels = [int(row[0]) for row in rows]
+    assert levels == sorted(levels)
+    assert [row[2] for row in rows if int(row[0]) == 0] == [APPLE]
+    assert len({row[2] for row in rows}) == len(rows)
+    assert len(rows) > 1
+
+
+def test_csv_export(api):
+    response = export(api, "csv")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    assert re.fullmatch(
+        rf'attachment; filename="Corporate_Hierarchy_Apple_Inc__{APPLE}_\d{{4}}-\d{{2}}-\d{{2}}\.csv"',
+        response.headers["content-disposition"],
+    )
+    header, *rows = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert header == EXPORT_HEADERS
+    assert all(len(row) == len(EXPORT_HEADERS) for row in rows)
+    assert_hierarchy_rows(rows)
+
+
+def test_xlsx_export_opens_in_openpyxl(api):
+    response = export(api, "xlsx")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == XLSX_MEDIA_TYPE
+    assert response.headers["content-disposition"].endswith('.xlsx"')
+    workbook = openpyxl.load_workbook(io.BytesIO(response.content), read_only=True)
+    assert workbook.sheetnames == ["Corporate Hierarchy", "Metadata"]
+    header, *rows = [
+        ["" if value is None else value for value in row]
+        for row in workbook["Corporate Hierarchy"].iter_rows(values_only=True)
+    ]
+    assert list(header) == EXPORT_HEADERS
+    assert all(len(row) == len(EXPORT_HEADERS) for row in rows)
+    assert_hierarchy_rows(rows)
+    metadata = dict(workbook["Metadata"].iter_rows(values_only=True))
+    assert metadata["D-U-N-S Number"] == APPLE
+    assert metadata["Total Entities"] == len(rows)
+
+
+def test_unknown_company_is_not_exported(api):
+    async def scenario():
+        async with api() as client:
+            return (await client.get("/api/company-hierarchy/000000000/export")).status_code
+
+    assert asyncio.run(scenario()) == 404
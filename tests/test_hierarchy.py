@@ -0,0 +1,51 @@
+import asyncio
+
+import responses
+from catalog import CompanyCatalog
+from hierarchy import HierarchyGraph
+
+APPLE = "804735132"
+
+
+def test_snapshot_rebuilds_the_same_graph(server, tmp_path):
+    companies = [server.create_mock_company_data(duns) for duns in server.MOCK_COMPANY_DUNS]
+    expected = HierarchyGraph()
+    for company in companies:
+        expected.add_company(company)
+
+    path = str(tmp_path / "catalog.snapshot")
+    CompanyCatalog(companies, model=server.Company).save(path)
+    catalog = CompanyCatalog(model=server.Company)
+    catalog.load(path)
+    graph = HierarchyGraph()
+    graph.extend(*catalog.hierarchy())
+
+    assert graph.export() == expected.export()
+    assert len(graph) > len(companies)
+
+
+def test_replace_swaps_in_a_rebuilt_graph():
+    graph = HierarchyGraph()
+    graph.add_edge("1", "2")
+    rebuilt = HierarchyGraph()
+    rebuilt.add_edge("3", "4")
+    graph.replace(rebuilt)
+    assert "1" not in graph
+    assert graph.node("4")["parentDuns"] == "3"
+
+
+def test_traversal_endpoints_share_the_encoded_path(server, api, monkeypatch):
+    monkeypatch.setattr(responses, "COMPRESS_MIN_SIZE", 0)
+
+    async def scenario():
+        async with api() as client:
+            child = server.hierarchy_graph.children(APPLE, limit=1)["items"][0]["duns"]
+            for path in ("subtree", "children", "siblings", "ancestors"):
+                response = await client.get(f"/api/company-hierarchy/{child}/{path}",
+                                            headers={"Accept-Encoding": "gzip"})
+                assert response.status_code == 200, path
+                assert response.headers["content-encoding"] == "gzip", path
+                if path == "ancestors":
+                    assert response.json()["ancestors"][-1]["duns"] == APPLE
+
+    asyncio.run(scenario())
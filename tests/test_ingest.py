@@ -0,0 +1,91 @@
+import asyncio
+import csv
+import json
+
+import mongomock_motor
+
+import ingest
+from ingest import IngestCheckpoint, ingest_file
+
+APPLE = "804735132"
+
+
+def write_extract(server, path):
+    """JSONL extract: the mock companies, Apple twice in the first chunk, and one broken line."""
+    companies = [server.create_mock_company_data(duns).model_dump_json() for duns in server.MOCK_COMPANY_DUNS]
+    renamed = server.create_mock_company_data(APPLE).model_copy(update={"company_name": "Apple Computer"})
+    lines = companies[:2] + [renamed.model_dump_json()] + companies[2:] + ['{"duns": "000000000"}']
+    path.write_text("\n".join(lines) + "\n")
+    return len(lines)
+
+
+def test_ingest_counts_written_unchanged_and_invalid(server, tmp_path):
+    extract = tmp_path / "extract.jsonl"
+    records = write_extract(server, extract)
+    distinct = len(server.MOCK_COMPANY_DUNS)
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient().db
+        first = await ingest_file(extract, db, workers=2, chunk_size=3, batch_size=2)
+        apple = await db.cached_companies.find_one({"duns": APPLE})
+        second = await ingest_file(extract, db, workers=2, chunk_size=3, batch_size=2)
+        return first, second, apple, await db.cached_companies.count_documents({})
+
+    first, second, apple, stored = asyncio.run(scenario())
+
+    assert stored == distinct
+    # The later copy of a DUNS in a chunk wins
+    assert apple["company_name"] == "Apple Computer"
+    assert (first["records"], first["written"], first["unchanged"], first["invalid"]) == (records, distinct, 0, 1)
+    assert first["edges"] > 0
+    assert (second["written"], second["unchanged"], second["invalid"]) == (0, distinct, 1)
+
+
+def test_checkpoint_resumes_after_the_ingested_records(server, tmp_path):
+    extract = tmp_path / "extract.jsonl"
+    records = write_extract(server, extract)
+    checkpoint = IngestCheckpoint(tmp_path / "extract.checkpoint.json", extract)
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient().db
+        first = await ingest_file(extract, db, workers=1, chunk_size=2, checkpoint=checkpoint)
+        again = await ingest_file(extract, db, workers=1, chunk_size=2, checkpoint=checkpoint)
+        return first, again
+
+    first, again = asyncio.run(scenario())
+
+    assert json.loads(checkpoint.path.read_text())["records"] == records
+    assert (again["resumed_from"], again["processed"], again["written"]) == (records, 0, first["written"])
+
+
+def test_csv_rows_with_dotted_headers(server, tmp_path):
+    extract = tmp_path / "extract.csv"
+    with open(extract, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["duns", "company_name", "address.city", "address.country", "registration_numbers"])
+        writer.writerow(["111111111", "Alpha SA", "Lyon", "France", '[{"type": "SIREN", "number": "552081317"}]'])
+        writer.writerow(["", "No DUNS", "Paris", "France", ""])
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient().db
+        summary = await ingest_file(extract, db, fmt="csv", workers=1)
+        return summary, await db.cached_companies.find_one({"duns": "111111111"})
+
+    summary, alpha = asyncio.run(scenario())
+
+    assert (summary["written"], summary["invalid"]) == (1, 1)
+    assert alpha["address"]["city"] == "Lyon"
+    assert alpha["registration_keys"] == ["552081317"]
+
+
+def test_cli_prints_the_summary(server, tmp_path, capsys):
+    extract = tmp_path / "extract.jsonl"
+    records = write_extract(server, extract)
+
+    # The database is the mongomock client the server fixture swapped in for Motor
+    assert ingest.main([str(extract), "--workers", "1", "--chunk-size", "4"]) == 0
+
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["records"] == summary["processed"] == records
+    assert summary["invalid"] == 1
+    assert (tmp_path / "extract.jsonl.checkpoint.json").exists()
@@ -0,0 +1,32 @@
+import asyncio
+
+APPLE = "804735132"
+
+
+def test_request_histogram_is_labelled_by_route_template(api):
+    async def scenario():
+        async with api() as client:
+            assert (await client.get(f"/api/company-hierarchy/{APPLE}")).status_code == 200
+            return (await client.get("/metrics")).text
+
+    text = asyncio.run(scenario())
+
+    labels = 'method="GET",route="/api/company-hierarchy/{duns}",status="2xx"'
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}' in text
+    assert f"http_request_duration_seconds_count{{{labels}}}" in text
+    # The DUNS itself never becomes a label value
+    assert APPLE not in text
+
+
+def test_profiles_are_admin_only(api, analyst):
+    async def scenario():
+        async with api(*analyst) as analyst_client, api() as admin_client:
+            return [
+                (await client.get(path)).status_code
+                for client in (analyst_client, admin_client)
+                for path in ("/api/profiles", "/api/profiles/missing")
+            ]
+
+    # Profiling is disabled in tests, so an admin gets 404 rather than 403
+    assert asyncio.run(scenario()) == [403, 403, 404, 404]
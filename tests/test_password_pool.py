@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+
+def test_passwords_are_verified_on_the_bcrypt_pool(server, api, monkeypatch):
+    verify_password = server.verify_password
+    threads = []
+
+    def recording_verify_password(plain_password, hashed_password):
+        threads.append(threading.current_thread().name)
+        return verify_password(plain_password, hashed_password)
+
+    monkeypatch.setattr(server, "verify_password", recording_verify_password)
+
+    async def scenario():
+        async with api() as client:
+            wrong = await client.post("/api/login", json={"username": "admin", "password": "wrong"})
+            return wrong.status_code
+
+    assert asyncio.run(scenario()) == 401
+    assert len(threads) == 2
+    assert all(name.startswith("bcrypt") for name in threads)
+    assert threading.current_thread().name not in threads
+
+
+def test_the_pool_is_shut_down_with_the_app(server, api):
+    async def scenario():
+        executors = []
+        # Each client logs in, and the second startup needs a new pool to do it
+        for _ in range(2):
+            async with api():
+                executors.append(server.password_executor)
+        return executors
+
+    first, second = asyncio.run(scenario())
+
+    assert first is not None and second is not None and first is not second
+    assert first._shutdown and second._shutdown
+    assert server.password_executor is None
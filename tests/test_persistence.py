@@ -0,0 +1,213 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import mongomock_motor
+import pytest
+
+from persistence import (
+    CompanyWriteBehind,
+    bulk_upsert_companies,
+    content_hash,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+)
+
+
+class RecordingCollection:
+    """A mongomock collection that also records every bulk_write batch."""
+
+    def __init__(self):
+        self.collection = mongomock_motor.AsyncMongoMockClient().db.cached_companies
+        self.batches = []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def bulk_write(self, operations, ordered=True):
+        self.batches.append([operation._doc for operation in operations])
+        return await self.collection.bulk_write(operations, ordered=ordered)
+
+
+def company(duns: str, **fields):
+    return {"duns": duns, "company_name": f"Company {duns}", "last_updated": datetime.now(timezone.utc), **fields}
+
+
+def test_unchanged_content_only_touches_the_access_fields():
+    async def scenario():
+        collection = RecordingCollection()
+        first = await bulk_upsert_companies(collection, [company("1"), company("2")])
+        # Edited behind the cache's back: a full rewrite would restore it
+        await collection.update_one({"duns": "1"}, {"$set": {"industry": "edited"}})
+        searched_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+        again = await bulk_upsert_companies(collection, [
+            company("1", last_updated=searched_at, search_criteria={"company_name": "Company"}),
+            company("2", company_name="Renamed"),
+        ])
+        return collection, first, again, {document["duns"]: document async for document in collection.find()}
+
+    collection, first, again, stored = asyncio.run(scenario())
+
+    assert first == {"written": 2, "unchanged": 0}
+    assert again == {"written": 1, "unchanged": 1}
+    touched, rewritten = collection.batches[1]
+    assert set(touched["$set"]) == {"last_updated", "search_criteria"}
+    assert rewritten["$set"]["company_name"] == "Renamed"
+    assert stored["1"]["industry"] == "edited"
+    assert stored["1"]["search_criteria"] == {"company_name": "Company"}
+    assert stored["2"]["content_hash"] == content_hash(company("2", company_name="Renamed"))
+
+
+def test_upserts_are_written_in_batches():
+    async def scenario():
+        collection = RecordingCollection()
+        result = await bulk_upsert_companies(collection, [company(str(n)) for n in range(5)], batch_size=2)
+        return collection, result
+
+    collection, result = asyncio.run(scenario())
+
+    assert result == {"written": 5, "unchanged": 0}
+    assert [len(batch) for batch in collection.batches] == [2, 2, 1]
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_write_behind_flushes_full_batches_at_once():
+    async def scenario():
+        collection = RecordingCollection()
+        writer = CompanyWriteBehind(collection, batch_size=3, flush_interval=60)
+        await writer.start()
+        await writer.enqueue([company(str(n)) for n in range(7)])
+        await wait_for(lambda: writer.counters["batches"] == 2)
+        flushed_early = [len(batch) for batch in collection.batches]
+        await writer.close()
+        return writer, flushed_early, collection
+
+    writer, flushed_early, collection = asyncio.run(scenario())
+
+    # Two full batches without waiting for the interval; the last one on close
+    assert flushed_early == [3, 3]
+    assert [len(batch) for batch in collection.batches] == [3, 3, 1]
+    assert writer.counters["written"] == 7
+    assert not writer.is_running
+
+
+def test_write_behind_flushes_a_partial_batch_after_the_interval():
+    async def scenario():
+        collection = RecordingCollection()
+        writer = CompanyWriteBehind(collection, batch_size=100, flush_interval=0.05)
+        await writer.start()
+        await writer.enqueue([company("1"), company("2")])
+        assert writer.counters["batches"] == 0
+        await wait_for(lambda: writer.counters["batches"] == 1)
+        stored = await collection.count_documents({})
+        await writer.close()
+        return stored
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_write_behind_close_flushes_what_is_queued():
+    async def scenario():
+        collection = RecordingCollection()
+        writer = CompanyWriteBehind(collection, batch_size=100, flush_interval=60)
+        await writer.start()
+        await writer.enqueue([company(str(n)) for n in range(4)])
+        await writer.close()
+        return writer.stats(), await collection.count_documents({})
+
+    stats, stored = asyncio.run(scenario())
+
+    assert stored == 4
+    assert stats["enqueued"] == stats["written"] == 4
+    assert stats["queued"] == 0
+
+
+def test_keyset_pages_split_ties_on_last_updated_by_duns():
+    tied = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    documents = [company(str(n), last_updated=tied) for n in range(5)]
+    documents.append(company("9", last_updated=tied - timedelta(days=1)))
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient().db.cached_companies
+        await collection.insert_many(documents)
+        pages, cursor = [], None
+        while True:
+            page = await collection.find(keyset_filter(cursor)).sort(
+                [("last_updated", -1), ("duns", -1)]
+            ).limit(2).to_list(2)
+            if not page:
+                return pages
+            pages.append([document["duns"] for document in page])
+            cursor = encode_cursor(page[-1])
+
+    assert asyncio.run(scenario()) == [["4", "3"], ["2", "1"], ["0", "9"]]
+
+
+def test_aware_and_naive_cursors_select_the_same_page():
+    naive = datetime(2024, 5, 1, 12, 0)
+    paris = timezone(timedelta(hours=2))
+    aware = naive.replace(tzinfo=timezone.utc).astimezone(paris)
+
+    assert decode_cursor(encode_cursor({"last_updated": aware, "duns": "1"})) == (naive, "1")
+    assert keyset_filter(encode_cursor({"last_updated": aware, "duns": "1"})) == keyset_filter(
+        encode_cursor({"last_updated": naive, "duns": "1"})
+    )
+
+
+def cursor_of(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+
+
+MALFORMED_CURSORS = [
+    "not a cursor",
+    "é",
+    cursor_of({"last_updated": "2024-05-01T12:00:00"}),
+    cursor_of(["2024-05-01T12:00:00"]),
+    cursor_of(["yesterday", "1"]),
+    cursor_of([None, "1"]),
+    cursor_of(["2024-05-01T12:00:00", 1]),
+]
+
+
+@pytest.mark.parametrize("cursor", MALFORMED_CURSORS)
+def test_malformed_cursor_is_a_value_error(cursor):
+    with pytest.raises(ValueError):
+        keyset_filter(cursor)
+
+
+def test_cached_companies_endpoint_pages_through_ties(server, api):
+    # Newer than anything other tests store, so these make up the first pages
+    tied = datetime(2100, 1, 1, tzinfo=timezone.utc)
+    documents = [company(f"99999999{n}", last_updated=tied) for n in range(3)]
+
+    async def scenario():
+        await server.db.cached_companies.insert_many([dict(document) for document in documents])
+        try:
+            async with api() as client:
+                pages, cursor = [], None
+                for _ in range(2):
+                    params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+                    body = (await client.get("/api/cached-companies", params=params)).json()
+                    pages.append([item["duns"] for item in body["items"]])
+                    cursor = body["next_cursor"]
+                malformed = [
+                    (await client.get("/api/cached-companies", params={"cursor": cursor})).status_code
+                    for cursor in MALFORMED_CURSORS
+                ]
+                return pages, malformed
+        finally:
+            await server.db.cached_companies.delete_many({"duns": {"$in": [d["duns"] for d in documents]}})
+
+    pages, malformed = asyncio.run(scenario())
+
+    assert pages[0] == ["999999992", "999999991"]
+    assert pages[1][0] == "999999990"
+    assert malformed == [400] * len(MALFORMED_CURSORS)
@@ -0,0 +1,108 @@
+import pytest
+
+from catalog import CompanyCatalog, normalize_phone
+from query_planner import QueryPlanner
+
+APPLE = {"company_name": "Apple", "latitude": 37.3349, "longitude": -122.009, "radius_km": 50}
+
+
+def mock_planner(server) -> QueryPlanner:
+    companies = [server.create_mock_company_data(duns) for duns in server.MOCK_COMPANY_DUNS]
+    return QueryPlanner(CompanyCatalog(companies, model=server.Company))
+
+
+def test_radius_index_keeps_company_at_center(server):
+    criteria = {key: APPLE[key] for key in ("latitude", "longitude", "radius_km")}
+    plan = mock_planner(server).plan(criteria)
+    results = list(plan.iter_matches())
+    assert "Apple Inc." in [company.company_name for company, _, _ in results]
+    assert min(distance for _, _, distance in results) == 0.0
+
+
+def test_radius_residual_filter_keeps_company_at_center(server):
+    plan = mock_planner(server).plan(dict(APPLE))
+    results = list(plan.iter_matches())
+    assert [company.company_name for company, _, _ in results] == ["Apple Inc."]
+    assert results[0][2] == 0.0
+    assert ("filter", "radius_km", 1) in [(stage["stage"], stage["criterion"], stage["candidates"])
+                                          for stage in plan.explain()["stages"]]
+
+
+def form_criteria(company, **edits):
+    """Criteria as the search form holds them after selecting ``company``, then ``edits``."""
+    address = company.address
+    criteria = {
+        "duns": company.duns,
+        "company_name": company.company_name,
+        "address": address.street,
+        "city": address.city,
+        "country": address.country,
+    }
+    return {key: value for key, value in {**criteria, **edits}.items() if value is not None}
+
+
+def test_selected_company_round_trips_through_the_form(server):
+    planner = mock_planner(server)
+    apple = server.create_mock_company_data("804735132")
+
+    for criteria in (form_criteria(apple), form_criteria(apple, duns=""), form_criteria(apple, duns="", city="cupertino")):
+        names = [company.company_name for company, _, _ in planner.plan(criteria).iter_matches()]
+        assert names == ["Apple Inc."], criteria
+
+    # What the form used to back-fill as well still finds the company
+    backfilled = form_criteria(apple, duns="", continent="Amérique du Nord", phone_fax=apple.phone,
+                               postal_code=apple.address.postal_code, state=apple.address.state, has_phone=True)
+    assert [company.duns for company, _, _ in planner.plan(backfilled).iter_matches()] == [apple.duns]
+
+
+def test_continent_labels_are_normalized(server):
+    planner = mock_planner(server)
+    for continent in ("North America", "north america", "Amérique du Nord"):
+        alone = {company.duns for company, _, _ in planner.plan({"continent": continent}).iter_matches()}
+        assert "804735132" in alone, continent
+        narrowed = planner.plan({"company_name": "Apple", "continent": continent})
+        assert [company.duns for company, _, _ in narrowed.iter_matches()] == ["804735132"], continent
+
+
+@pytest.mark.parametrize("number, country, expected", [
+    ("+1 408-996-1010", None, "+14089961010"),
+    ("(408) 996-1010", "United States", "+14089961010"),
+    ("1 408 996 1010", "US", "+14089961010"),
+    ("001 408 996 1010", None, "+14089961010"),
+    ("01 23 45 67 89", "France", "+33123456789"),
+    ("408 996 1010", None, None),
+    ("", "France", None),
+])
+def test_phone_numbers_are_stored_in_e164(number, country, expected):
+    assert normalize_phone(number, country) == expected
+
+
+APPLE_DUNS = "804735132"
+US_DUNS = {APPLE_DUNS, "001234567", "313046411", "832563616"}
+
+
+@pytest.mark.parametrize("fragment, expected", [
+    # Full number however it is typed
+    ("4089961010", {APPLE_DUNS}),
+    ("+1 408-996-1010", {APPLE_DUNS}),
+    ("001 408 996 1010", {APPLE_DUNS}),
+    ("0408 996 1010", {APPLE_DUNS}),
+    # Partial numbers: international ones match from the start, local ones from either end
+    ("+1 408", {APPLE_DUNS}),
+    ("+1", US_DUNS),
+    ("1408", {APPLE_DUNS}),
+    ("996-1010", {APPLE_DUNS}),
+    ("1010", {APPLE_DUNS}),
+    ("408-996", set()),
+    ("+33 408 996 1010", set()),
+])
+def test_phone_matching_by_index_and_by_filter(server, fragment, expected):
+    planner = mock_planner(server)
+
+    by_index = {company.duns for company, _, _ in planner.plan({"phone_fax": fragment}).iter_matches()}
+    # Narrowed by name first, so the phone criterion is applied as a filter
+    filtered = {company.duns for company, _, _ in
+                planner.plan({"company_name": "Apple", "phone_fax": fragment}).iter_matches()}
+
+    assert by_index == expected
+    assert filtered == expected & {APPLE_DUNS}
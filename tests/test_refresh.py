@@ -0,0 +1,122 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import mongomock_motor
+import pytest
+
+from hierarchy import HierarchyGraph
+from persistence import bulk_upsert_companies, content_hash, storage_document
+from refresh import ChangeFeed, DeltaRefresher, Lease
+
+APPLE = "804735132"
+
+
+def test_lease_has_one_holder_at_a_time():
+    async def scenario():
+        leases = mongomock_motor.AsyncMongoMockClient().db.leases
+        first = Lease(leases, "delta_refresh", "first", ttl=60)
+        second = Lease(leases, "delta_refresh", "second", ttl=60)
+        assert await first.acquire()
+        assert not await second.acquire()
+        # The holder renews its own lease
+        assert await first.acquire()
+        await first.release()
+        assert await second.acquire()
+        assert not await first.acquire()
+
+    asyncio.run(scenario())
+
+
+def test_other_processes_replay_refresh_changes(server):
+    stale = server.create_mock_company_data(APPLE)
+    fresh = stale.model_copy(deep=True)
+    fresh.corporate_hierarchy.parent = server.HierarchyMember(duns="999999999", primaryName="New Parent Holdings")
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient().db
+        document = storage_document(stale.model_dump(exclude={"search_criteria"}))
+        await db.cached_companies.insert_one({
+            **document,
+            "content_hash": content_hash(document),
+            "last_updated": datetime.now(timezone.utc) - timedelta(days=2),
+        })
+
+        graphs = {"leader": HierarchyGraph(), "follower": HierarchyGraph()}
+        changed = {"leader": [], "follower": []}
+        for graph in graphs.values():
+            graph.add_company(stale)
+        feeds = {name: ChangeFeed(db.company_changes, db.cached_companies, server.Company, graphs[name], origin=name,
+                                  on_change=changed[name].append) for name in graphs}
+
+        async def loader(duns):
+            return fresh
+
+        refreshers = {name: DeltaRefresher(
+            db.cached_companies, db.hierarchy_edges, loader, server.Company, graphs[name],
+            max_age=3600, on_change=changed[name].append,
+            lease=Lease(db.leases, "delta_refresh", name), feed=feeds[name],
+        ) for name in graphs}
+
+        assert await refreshers["leader"].lease.acquire()
+        assert not await refreshers["follower"].lease.acquire()
+        assert await refreshers["leader"].run_batch() == 1
+        assert await feeds["leader"].poll() == 0
+        assert await feeds["follower"].poll() == 1
+
+        for name, graph in graphs.items():
+            assert graph.node(APPLE)["parentDuns"] == "999999999", name
+            assert changed[name] == [APPLE], name
+        assert graphs["follower"].export() == graphs["leader"].export()
+
+    asyncio.run(scenario())
+
+
+def test_staleness_follows_the_source_not_searches(server):
+    now = datetime.now(timezone.utc)
+    searched, confirmed = (server.create_mock_company_data(duns) for duns in server.MOCK_COMPANY_DUNS[:2])
+    loaded = []
+
+    async def loader(duns):
+        loaded.append(duns)
+        return searched
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient().db.cached_companies
+        await bulk_upsert_companies(collection, [searched.model_dump(), confirmed.model_dump()])
+        # Fetched two days ago but searched just now, and the other way round
+        await collection.update_one({"duns": searched.duns}, {"$set": {"fetched_at": now - timedelta(days=2)}})
+        await collection.update_one({"duns": confirmed.duns}, {"$set": {"last_updated": now - timedelta(days=2)}})
+        fetched_before = (await collection.find_one({"duns": searched.duns}))["fetched_at"]
+        # A repeat search only touches the access fields
+        await bulk_upsert_companies(collection, [searched.model_dump()])
+        assert (await collection.find_one({"duns": searched.duns}))["fetched_at"] == fetched_before
+
+        refresher = DeltaRefresher(collection, None, loader, server.Company, HierarchyGraph(), max_age=3600)
+        assert (await refresher.stats())["backlog"] == 1
+        assert await refresher.run_batch() == 1
+        assert (await refresher.stats())["backlog"] == 0
+
+    asyncio.run(scenario())
+    assert loaded == [searched.duns]
+
+
+def test_manual_refresh_is_for_admins_and_respects_the_lease(server, api, analyst):
+    async def scenario():
+        async with api(*analyst) as analyst_client, api() as admin_client:
+            assert (await analyst_client.post("/api/refresh/run")).status_code == 403
+
+            response = await admin_client.post("/api/refresh/run")
+            assert response.status_code == 200
+            assert "selected" in response.json()
+            # Taken for that batch only, as this process runs no scheduler
+            assert not server.delta_refresher.lease.held
+            assert await server.db.leases.count_documents({"_id": "delta_refresh"}) == 0
+
+            other = Lease(server.db.leases, "delta_refresh", "other-process")
+            assert await other.acquire()
+            try:
+                assert (await admin_client.post("/api/refresh/run")).status_code == 409
+            finally:
+                await other.release()
+
+    asyncio.run(scenario())
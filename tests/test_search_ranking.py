@@ -0,0 +1,23 @@
+import asyncio
+
+APPLE = "804735132"
+
+
+def test_name_match_ranking_is_returned_but_not_stored(server, api):
+    async def scenario():
+        async with api() as client:
+            stored_ranking = server.company_catalog.get(APPLE).ranking_info.model_dump()
+            rankings = []
+            for name in ("Apple", "Aple Inc"):
+                server.response_cache.clear()
+                response = await client.post("/api/unified-search", json={"company_name": name})
+                result = next(company for company in response.json()["results"] if company["duns"] == APPLE)
+                rankings.append(result["ranking_info"])
+        # The write-behind queue is flushed on shutdown
+        return stored_ranking, rankings, await server.db.cached_companies.find_one({"duns": APPLE})
+
+    stored_ranking, rankings, document = asyncio.run(scenario())
+
+    assert rankings[0] != rankings[1]
+    assert document["ranking_info"] == stored_ranking
+    assert document["search_criteria"] == {"company_name": "Aple Inc", "exact_match": False}
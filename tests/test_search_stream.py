@@ -0,0 +1,60 @@
+import asyncio
+import gc
+import json
+import tracemalloc
+
+import pytest
+
+from benchmarks.synthetic import generate_companies
+
+
+@pytest.fixture
+def streaming_server(server, monkeypatch):
+    """Server with a synthetic catalog; persistence records batch sizes instead of writing."""
+    # Without their family trees the rows are of similar size, so the peak
+    # reflects how many are held at once rather than the largest one
+    companies = [company.model_copy(update={"corporate_hierarchy": None})
+                 for company in generate_companies(server, 6000, seed=7)]
+    server.company_catalog.reload(companies)
+    batches = []
+
+    async def persist_companies(batch):
+        batches.append(len(batch))
+
+    monkeypatch.setattr(server, "persist_companies", persist_companies)
+    monkeypatch.setattr(server, "PERSIST_BATCH_SIZE", 50)
+    yield server, batches
+    server.company_catalog.reload(server.load_catalog_companies())
+
+
+def stream_peak(server, monkeypatch, limit: int):
+    """(result lines, peak traced memory) of streaming a broad search capped at ``limit``."""
+    monkeypatch.setattr(server, "SEARCH_STREAM_MAX_RESULTS", limit)
+    criteria = server.CompanySearchCriteria(continent="North America")
+
+    async def consume():
+        count = 0
+        async for line in server.stream_search_results(criteria):
+            count += 1
+        return count - 1, json.loads(line)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        results, summary = asyncio.run(consume())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert summary["count"] == results
+    return results, peak
+
+
+def test_stream_peak_memory_stays_flat(streaming_server, monkeypatch):
+    server, batches = streaming_server
+    small_results, small_peak = stream_peak(server, monkeypatch, 200)
+    large_results, large_peak = stream_peak(server, monkeypatch, 100_000)
+
+    assert small_results == 200
+    assert large_results > 10 * small_results
+    assert large_peak < small_peak * 1.25
+    assert max(batches) == 50
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from catalog import CompanyCatalog, PrefixIndex
+
+APPLE = "804735132"
+
+
+def acme_catalog(server, count: int = 40) -> CompanyCatalog:
+    """``count`` "Acme NN" companies with a spread of confidence codes and sizes, plus name decoys."""
+    companies = [
+        server.Company(duns=f"1000000{n:02d}", company_name=f"Acme {n:02d}", employee_count=n * 10,
+                       ranking_info={"confidence_code": n % 4 + 6})
+        for n in range(count)
+    ]
+    companies.append(server.Company(duns="200000000", company_name="Zeta Corp", legal_name="Acme Holdings",
+                                    employee_count=1, ranking_info={"confidence_code": 10}))
+    companies.append(server.Company(duns="300000000", company_name="Acne Labs", employee_count=10 ** 6,
+                                    ranking_info={"confidence_code": 10}))
+    return CompanyCatalog(companies, model=server.Company)
+
+
+def expected_acme_order(count: int = 40):
+    # Confidence code first, then employee count
+    ranked = sorted(range(count), key=lambda n: (-(n % 4 + 6), -n * 10))
+    return ["200000000"] + [f"1000000{n:02d}" for n in ranked]
+
+
+@pytest.mark.parametrize("prefix", ["a", "ac", "acme", "ACME"])
+@pytest.mark.parametrize("limit", [1, 10, PrefixIndex.PRECOMPUTED_LIMIT, 30])
+def test_suggestions_are_ranked_and_limited(server, prefix, limit):
+    suggestions = acme_catalog(server).suggest(prefix, limit)
+    duns = [suggestion["duns"] for suggestion in suggestions]
+
+    if prefix in ("a", "ac"):
+        # The big "Acne Labs" has the top confidence code and outranks every Acme
+        assert duns[0] == "300000000"
+        duns = duns[1:]
+        limit -= 1
+    assert duns == expected_acme_order()[:limit]
+
+
+def test_legal_name_matches_once(server):
+    catalog = acme_catalog(server)
+
+    assert [suggestion["duns"] for suggestion in catalog.suggest("acme h")] == ["200000000"]
+    assert catalog.suggest("zeta")[0]["legal_name"] == "Acme Holdings"
+    # Company and legal name both start with "a", the company is listed once
+    duns = [suggestion["duns"] for suggestion in catalog.suggest("a", 50)]
+    assert len(duns) == len(set(duns)) == 42
+
+
+def test_no_suggestions_without_a_prefix_match(server):
+    catalog = acme_catalog(server)
+    assert catalog.suggest("acmz") == []
+    assert catalog.suggest("   ") == []
+
+
+def test_suggest_endpoint(api):
+    async def scenario():
+        async with api() as client:
+            found = await client.get("/api/suggest", params={"q": "App", "limit": 5})
+            too_many = await client.get("/api/suggest", params={"q": "App", "limit": 26})
+            return found, too_many
+
+    found, too_many = asyncio.run(scenario())
+
+    assert found.status_code == 200
+    assert found.headers["cache-control"] == "private, max-age=300"
+    body = found.json()
+    assert body["query"] == "App"
+    assert body["suggestions"][0] == {
+        "duns": APPLE, "company_name": "Apple Inc.", "legal_name": "Apple Inc.",
+        "city": "Cupertino", "country": "United States",
+    }
+    assert len(body["suggestions"]) <= 5
+    assert too_many.status_code == 422